@@ -1,7 +1,22 @@
+from pathlib import Path
+
 import streamlit as st
+import pandas as pd
+from finguard import store, warmup
+from finguard.dataset import register_upload, uploaded_datasets
 
 st.set_page_config(page_title="Giám sát Quỹ Tín dụng Nhân dân", layout="wide")
 
+
+# Nạp trước sklearn, matplotlib, seaborn ở nền, một lần cho mỗi tiến trình
+@st.cache_resource(show_spinner=False)
+def start_warmup():
+    return warmup.start()
+
+
+if warmup.ENABLED:
+    start_warmup()
+
 st.title("Ứng dụng Giám sát Quỹ Tín dụng Nhân dân")
 st.write("""
  
@@ -12,5 +27,50 @@ st.write("""
 4. **Phát hiện thất thoát tài sản**: Dùng Linear Regression để dự đoán và phát hiện thất thoát tài sản.
 5. **Kiểm tra tuân thủ an toàn vốn và tỷ lệ nợ xấu**
 
+Trang **Cảnh báo sớm toàn hệ thống** quét cả 4 tín hiệu rủi ro cho mọi Quỹ trong một lượt và xếp hạng chung.
+
 Vui lòng chọn bài toán từ menu bên trái để bắt đầu!
-""")
\ No newline at end of file
+""")
+
+# Tải dữ liệu dùng chung cho tất cả các trang
+st.header("Tải dữ liệu dùng chung")
+st.write("File tải lên tại đây chỉ được đọc một lần; mỗi trang tự dùng file có đủ các cột cần thiết.")
+shared_uploaded_files = st.file_uploader("Chọn các file CSV hoặc Parquet", type=["csv", "parquet"], accept_multiple_files=True, key="shared_upload")
+for shared_uploaded_file in shared_uploaded_files or []:
+    register_upload(shared_uploaded_file)
+
+shared_datasets = uploaded_datasets()
+if shared_datasets:
+    st.write("Dữ liệu đã tải lên trong phiên:")
+    st.table(pd.DataFrame({
+        "File": [d.name for d in shared_datasets],
+        "Số dòng": [len(d.frame) for d in shared_datasets],
+        "Bộ nhớ (MB)": [round(d.frame.memory_usage(deep=True).sum() / 1024 ** 2, 1) for d in shared_datasets],
+        "Bộ nhớ đỉnh khi đọc (MB)": [round(d.stats["peak_memory"] / 1024 ** 2, 1) if d.stats and "peak_memory" in d.stats else None for d in shared_datasets],
+        "Các cột": [", ".join(map(str, d.frame.columns)) for d in shared_datasets],
+    }))
+
+# Kho dữ liệu lịch sử: thêm file một lần, các trang đọc đúng lát Quỹ/tháng cần xem
+st.header("Kho dữ liệu lịch sử")
+st.write(f"Thêm file vào kho ({store.STORE_PATH}) một lần thay vì tải lại ở mỗi trang; các trang chỉ đọc các Quỹ và khoảng tháng được chọn. Dữ liệu chỉ được nối thêm, file đã thêm sẽ được bỏ qua.")
+if shared_uploaded_files:
+    store_file = st.selectbox("File cần thêm", shared_uploaded_files, format_func=lambda f: f.name, key="store_file")
+    store_name = st.text_input("Tên bộ dữ liệu trong kho", value=Path(store_file.name).stem, key=f"store_name_{store_file.file_id}")
+    if st.button("Thêm vào kho", key="store_append"):
+        store_rows = store.append_file(store_name, store_file, store_file.name)
+        if store_rows:
+            st.success(f"Đã thêm {store_rows:,} dòng vào {store_name}.")
+        else:
+            st.info(f"File {store_file.name} đã có trong {store_name}, không thêm lại.")
+
+store_datasets = store.list_datasets()
+if store_datasets:
+    st.table(pd.DataFrame({
+        "Bộ dữ liệu": [d.name for d in store_datasets],
+        "Số dòng": [d.rows for d in store_datasets],
+        "Số Quỹ": [d.funds for d in store_datasets],
+        "Số tháng": [len(d.periods) for d in store_datasets],
+        "Các cột": [", ".join(d.columns) for d in store_datasets],
+    }))
+else:
+    st.caption("Kho chưa có dữ liệu.")
@@ -0,0 +1 @@
+# Thư viện dùng chung cho các trang giám sát Quỹ Tín dụng Nhân dân
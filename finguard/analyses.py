@@ -0,0 +1,479 @@
+# Logic tính đặc trưng, huấn luyện và chấm điểm của 5 bài toán, không phụ thuộc Streamlit.
+# Dùng chung cho các trang (qua finguard.model_cache) và cho chạy lô (finguard.cli).
+# sklearn và joblib được import trong hàm huấn luyện (nạp mất khoảng một giây), nên mở trang
+# chỉ để xem bảng không phải chờ; finguard.warmup có thể nạp trước ở nền.
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from finguard import jobs, metrics, rules
+from finguard.features import (
+    ASSET_GAP,
+    BAD_DEBT_RATIO,
+    CAPITAL_USAGE_RATIO,
+    CAR,
+    CASH_CHANGE,
+    DEBT_EQUITY_RATIO,
+    DEPOSIT_GROWTH,
+    FUND_COLUMN,
+    FUNDING_USAGE_RATIO,
+    LIQUID_ASSET_RATIO,
+    LIQUIDITY_RATIO,
+    LOAN_GROWTH,
+    OVERDUE_LOAN_RATIO,
+    OVERDUE_SHORT_TERM_RATIO,
+    ewma,
+    rolling_volatility,
+    rolling_zscore,
+)
+from finguard.ingest import CHUNK_SIZE, is_parquet, iter_csv_chunks, iter_parquet_chunks, read_columns
+
+RISK_LEVELS = {0: "Thấp", 1: "Trung bình", 2: "Cao"}
+
+# IsolationForest trên dữ liệu lớn: số dòng tối đa để huấn luyện (mẫu ngẫu nhiên) và số dòng mỗi
+# khối khi chấm điểm
+FIT_SAMPLE_ROWS = 200_000
+SCORE_CHUNK_ROWS = 100_000
+
+# Kiểm định chéo Logistic Regression: lưới hệ số điều chuẩn C, số fold và giới hạn thời gian (giây)
+C_GRID = (0.01, 0.03, 0.1, 0.3, 1.0, 3.0, 10.0, 30.0, 100.0)
+CV_FOLDS = 5
+TUNING_BUDGET = 30.0
+
+# Cột đầu vào bắt buộc và đặc trưng của từng bài toán
+ANOMALY_COLUMNS = ["Tháng", "Dư nợ", "Tiền gửi", "Nợ quá hạn"]
+ANOMALY_FEATURES = [LOAN_GROWTH, DEPOSIT_GROWTH, OVERDUE_LOAN_RATIO, FUNDING_USAGE_RATIO]
+
+INSOLVENCY_COLUMNS = ["Quỹ", "Tiền mặt", "Nợ ngắn hạn", "Dòng tiền ròng", "Vốn chủ sở hữu", "Nợ quá hạn"]
+INSOLVENCY_FEATURES = [LIQUIDITY_RATIO, DEBT_EQUITY_RATIO, LIQUID_ASSET_RATIO, OVERDUE_SHORT_TERM_RATIO]
+
+CREDIT_RISK_COLUMNS = ["Quỹ", "Tổng dư nợ", "Nợ xấu", "Tổng tiền gửi", "Risk_Label"]
+CREDIT_RISK_FEATURES = [BAD_DEBT_RATIO, CAPITAL_USAGE_RATIO]
+
+ASSET_LOSS_COLUMNS = ["Tháng", "Tài sản sổ sách", "Tài sản thực tế", "Chi phí quản lý", "Giao dịch bên liên quan", "Tỷ lệ nợ khó đòi"]
+ASSET_LOSS_FEATURES = [ASSET_GAP, CASH_CHANGE]
+
+COMPLIANCE_COLUMNS = ["Quỹ", "Vốn chủ sở hữu", "Tài sản có rủi ro", "Nợ xấu", "Tổng dư nợ"]
+COMPLIANCE_FEATURES = [CAR, BAD_DEBT_RATIO]
+
+# Độ dài cửa sổ mặc định (số kỳ) của đặc trưng cửa sổ trượt
+ROLLING_WINDOW = 6
+EWMA_SPAN = 3
+
+
+# Đặc trưng cửa sổ trượt do người dùng chọn độ dài. Tên (và khóa) có độ dài cửa sổ nên Dataset
+# giữ riêng kết quả của từng cửa sổ: đổi một cửa sổ không tính lại các cửa sổ khác.
+def anomaly_rolling_features(zscore_window=ROLLING_WINDOW, ewma_span=EWMA_SPAN):
+    return [
+        rolling_zscore("Z-score dư nợ", "Dư nợ", zscore_window),
+        rolling_zscore("Z-score tiền gửi", "Tiền gửi", zscore_window),
+        ewma("EWMA biến động dư nợ", LOAN_GROWTH, ewma_span),
+        ewma("EWMA biến động tiền gửi", DEPOSIT_GROWTH, ewma_span),
+    ]
+
+
+def asset_loss_rolling_features(volatility_window=ROLLING_WINDOW):
+    return [rolling_volatility("Độ biến động tài sản thực tế", CASH_CHANGE, volatility_window)]
+
+
+# Số luồng cho phần song song: n_jobs nếu có, ngược lại phần CPU cố định của job nền đang chạy
+# (finguard.jobs); ngoài job nền (dòng lệnh, bench) là mọi CPU
+def _threads(n_jobs):
+    if n_jobs is not None:
+        return n_jobs
+    threads = jobs.threads()
+    return -1 if threads is None else threads
+
+
+def with_features(frame, prefix, features):
+    return frame.assign(**{f"{prefix}{f.name}": f.compute(frame) for f in features})
+
+
+def _take(X, rows):
+    return X.iloc[rows] if hasattr(X, "iloc") else X[rows]
+
+
+# Chỉ số các dòng dùng để huấn luyện: tất cả nếu không quá max_rows, ngược lại một mẫu ngẫu nhiên
+# (theo random_state, giữ thứ tự dòng) để cùng dữ liệu và seed luôn cho cùng mô hình
+def fit_sample(n_rows, max_rows, random_state):
+    if max_rows is None or n_rows <= max_rows:
+        return None
+    return np.sort(np.random.default_rng(random_state).choice(n_rows, max_rows, replace=False))
+
+
+# Huấn luyện IsolationForest trên tối đa max_fit_rows dòng; các cây được dựng song song trên n_jobs luồng.
+# Ngưỡng theo contamination được tính trên mẫu huấn luyện.
+def train_isolation_forest(X, contamination, random_state=42, max_fit_rows=FIT_SAMPLE_ROWS, n_jobs=None):
+    from sklearn.ensemble import IsolationForest
+
+    model = IsolationForest(contamination=contamination, random_state=random_state, n_jobs=_threads(n_jobs))
+    rows = fit_sample(len(X), max_fit_rows, random_state)
+    return model.fit(X if rows is None else _take(X, rows))
+
+
+# IsolationForest: trả về (mô hình, điểm bất thường, nhãn -1/1) trên toàn bộ X
+def fit_isolation_forest(X, contamination, random_state=42, max_fit_rows=FIT_SAMPLE_ROWS, n_jobs=None):
+    model = train_isolation_forest(X, contamination, random_state, max_fit_rows, n_jobs)
+    return (model,) + score_isolation_forest(model, X, n_jobs=n_jobs)
+
+
+# Trả về (điểm bất thường, nhãn -1/1) của một IsolationForest đã huấn luyện. Dữ liệu lớn được chấm
+# theo từng khối SCORE_CHUNK_ROWS dòng (giới hạn bộ nhớ tạm), các khối chạy song song trên n_jobs
+# luồng; điểm không phụ thuộc cách chia khối.
+def score_isolation_forest(model, X, chunk_rows=SCORE_CHUNK_ROWS, n_jobs=None):
+    if len(X) <= chunk_rows:
+        scores = model.decision_function(X)
+    else:
+        from joblib import Parallel, delayed
+
+        chunks = [slice(start, start + chunk_rows) for start in range(0, len(X), chunk_rows)]
+        parts = Parallel(n_jobs=_threads(n_jobs), prefer="threads")(
+            delayed(model.decision_function)(_take(X, chunk)) for chunk in chunks
+        )
+        scores = np.concatenate(parts)
+    # Giống IsolationForest.predict nhưng không phải tính lại điểm
+    return scores, np.where(scores < 0, -1, 1)
+
+
+# Chia chỉ số dòng theo Quỹ (không lặp Python trên từng dòng)
+def group_indices(keys):
+    codes, uniques = pd.factorize(np.asarray(keys))
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    return uniques, [order[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def _fit_isolation_forest_batch(groups, contamination, random_state):
+    results = []
+    for X in groups:
+        if len(X) < 2:
+            # Quỹ chỉ có một kỳ: không đủ dữ liệu để đánh giá bất thường
+            results.append((np.zeros(len(X)), np.ones(len(X), dtype=int)))
+        else:
+            # Các lô đã chạy song song nên mỗi mô hình chỉ dùng một luồng
+            results.append(fit_isolation_forest(X, contamination, random_state, n_jobs=1)[1:])
+    return results
+
+
+# Một IsolationForest cho mỗi Quỹ, các Quỹ được chia lô chạy song song trên nhiều tiến trình;
+# tiến độ theo số lô đã xong được báo cho job nền (finguard.jobs) nếu có.
+# Trả về (điểm bất thường, nhãn -1/1) theo đúng thứ tự dòng của X.
+def fit_isolation_forest_per_fund(X, funds, contamination, random_state=42, n_jobs=None):
+    from joblib import Parallel, delayed
+
+    X = np.asarray(X, dtype=float)
+    _, indices = group_indices(funds)
+    n_batches = min(len(indices), 64)
+    batches = [list(batch) for batch in np.array_split(np.arange(len(indices)), n_batches)]
+    results = Parallel(n_jobs=_threads(n_jobs), return_as="generator")(
+        delayed(_fit_isolation_forest_batch)([X[indices[i]] for i in batch], contamination, random_state) for batch in batches
+    )
+    scores = np.empty(len(X))
+    predictions = np.empty(len(X), dtype=int)
+    for done, (batch, batch_results) in enumerate(zip(batches, results), 1):
+        for i, (fund_scores, fund_predictions) in zip(batch, batch_results):
+            scores[indices[i]] = fund_scores
+            predictions[indices[i]] = fund_predictions
+        jobs.report(done / len(batches), f"{done}/{len(batches)} lô Quỹ")
+    return scores, predictions
+
+
+# StandardScaler: trả về (scaler, dữ liệu đã chuẩn hóa)
+def fit_standard_scaler(X):
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler()
+    return scaler, scaler.fit_transform(X)
+
+
+def fit_logistic_regression(X, y, **params):
+    from sklearn.linear_model import LogisticRegression
+
+    model = LogisticRegression(**params)
+    model.fit(X, y)
+    return model
+
+
+# LinearRegression: trả về (mô hình, giá trị dự đoán trên X)
+def fit_linear_regression(X, y):
+    from sklearn.linear_model import LinearRegression
+
+    model = LinearRegression()
+    model.fit(X, y)
+    return model, model.predict(X)
+
+
+CVFold = namedtuple("CVFold", ["X_train", "X_test", "y_train", "y_test"])
+CVResult = namedtuple("CVResult", ["table", "best_C", "n_splits", "complete"])
+
+
+# Chia fold phân tầng (giữ tỷ lệ các mức rủi ro trong mỗi fold); mỗi fold được chuẩn hóa bằng scaler
+# huấn luyện trên phần train của chính fold đó. Số fold giảm về số mẫu của lớp nhỏ nhất nếu cần.
+def cv_folds(X, y, n_splits=CV_FOLDS, random_state=42):
+    from sklearn.model_selection import StratifiedKFold
+    from sklearn.preprocessing import StandardScaler
+
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y)
+    n_splits = min(n_splits, np.unique(y, return_counts=True)[1].min())
+    if n_splits < 2:
+        raise ValueError("Mỗi mức rủi ro cần ít nhất 2 mẫu để kiểm định chéo")
+    folds = []
+    for train, test in StratifiedKFold(n_splits, shuffle=True, random_state=random_state).split(X, y):
+        scaler = StandardScaler().fit(X[train])
+        folds.append(CVFold(scaler.transform(X[train]), scaler.transform(X[test]), y[train], y[test]))
+    return folds
+
+
+# Huấn luyện một fold lần lượt theo C tăng dần, mỗi lần bắt đầu từ nghiệm của C trước (warm start).
+# Dừng khi quá deadline (time.time()), nhưng luôn xong ít nhất một giá trị C.
+def _fit_fold_path(fold, C_grid, deadline, labels, params):
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import accuracy_score, f1_score
+
+    model = LogisticRegression(warm_start=True, **params)
+    rows = []
+    for C in sorted(C_grid):
+        if rows and time.time() > deadline:
+            break
+        started = time.perf_counter()
+        model.set_params(C=C).fit(fold.X_train, fold.y_train)
+        predicted = model.predict(fold.X_test)
+        rows.append({
+            "C": C,
+            "accuracy": accuracy_score(fold.y_test, predicted),
+            "f1_macro": f1_score(fold.y_test, predicted, labels=labels, average="macro", zero_division=0),
+            "seconds": time.perf_counter() - started,
+        })
+    return rows
+
+
+# Kiểm định chéo trên lưới C: các fold chạy song song, trả về CVResult với bảng trung bình và độ lệch
+# chuẩn của accuracy/F1 macro theo C. best_C có F1 macro trung bình cao nhất trong các giá trị C đã
+# chạy đủ mọi fold; complete = False nếu hết time_budget giây trước khi xong cả lưới (giá trị C lặp lại
+# chỉ chạy một lần).
+def tune_logistic_regression(folds, C_grid=C_GRID, time_budget=TUNING_BUDGET, n_jobs=None, **params):
+    from joblib import Parallel, delayed
+
+    C_grid = sorted(set(C_grid))
+
+    labels = np.unique(np.concatenate([fold.y_train for fold in folds]))
+    deadline = time.time() + time_budget
+    results = Parallel(n_jobs=_threads(n_jobs), return_as="generator")(
+        delayed(_fit_fold_path)(fold, C_grid, deadline, labels, params) for fold in folds
+    )
+    records = []
+    for done, rows in enumerate(results, 1):
+        records.extend({"fold": done, **row} for row in rows)
+        jobs.report(done / len(folds), f"{done}/{len(folds)} fold")
+    table = pd.DataFrame(records).groupby("C").agg(
+        folds=("fold", "nunique"),
+        accuracy_mean=("accuracy", "mean"),
+        accuracy_std=("accuracy", "std"),
+        f1_macro_mean=("f1_macro", "mean"),
+        f1_macro_std=("f1_macro", "std"),
+        seconds=("seconds", "sum"),
+    )
+    finished = table[table["folds"] == len(folds)]
+    best_C = float((finished if len(finished) else table)["f1_macro_mean"].idxmax())
+    return CVResult(table.reset_index(), best_C, len(folds), len(finished) == len(C_grid))
+
+
+PerFundRegression = namedtuple("PerFundRegression", ["funds", "coef", "predictions", "mse"])
+
+
+# Hồi quy tuyến tính riêng cho từng Quỹ, giải tất cả trong một lần gọi đại số tuyến tính theo lô.
+# Ma trận thiết kế của các Quỹ được xếp thành mảng 3 chiều (Quỹ x tháng x hệ số), các tháng
+# thiếu được đệm bằng 0 nên không ảnh hưởng X'X và X'y. Dùng giả nghịch đảo để Quỹ có ít
+# tháng hơn số hệ số vẫn có nghiệm (nghiệm chuẩn nhỏ nhất).
+# coef[:, 0] là hệ số chặn; predictions theo đúng thứ tự dòng của X.
+def fit_linear_regression_per_fund(X, y, funds):
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    codes, uniques = pd.factorize(np.asarray(funds))
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    starts = np.searchsorted(sorted_codes, np.arange(len(uniques)))
+    positions = np.arange(len(order)) - starts[sorted_codes]
+    n_months = np.bincount(codes, minlength=len(uniques))
+
+    design = np.zeros((len(uniques), n_months.max(initial=0), X.shape[1] + 1))
+    target = np.zeros(design.shape[:2])
+    design[sorted_codes, positions, 0] = 1.0
+    design[sorted_codes, positions, 1:] = X[order]
+    target[sorted_codes, positions] = y[order]
+
+    xtx = np.einsum("ftk,ftj->fkj", design, design)
+    xty = np.einsum("ftk,ft->fk", design, target)
+    coef = np.einsum("fkj,fj->fk", np.linalg.pinv(xtx), xty)
+
+    fitted = np.einsum("ftk,fk->ft", design, coef)
+    predictions = np.empty(len(y))
+    predictions[order] = fitted[sorted_codes, positions]
+    mse = ((fitted - target) ** 2).sum(axis=1) / n_months
+    return PerFundRegression(uniques, coef, predictions, mse)
+
+
+# Bài toán 1: biến động bất thường.
+# Dữ liệu có cột Quỹ được xử lý theo dạng bảng: biến động tính theo từng Quỹ,
+# mô hình gộp chung (pooled) hoặc riêng từng Quỹ (per_fund).
+# artifacts: mô hình đã lưu trong kho (finguard.registry) để chấm điểm thay vì huấn luyện.
+# n_jobs: số luồng của Isolation Forest, hoặc số tiến trình cho mô hình riêng từng Quỹ (mặc định tất cả CPU).
+# Các bước features/fit/score được ghi bằng metrics.stage (finguard.bench đo qua các bước này).
+def run_anomaly(data, contamination=0.2, mode="pooled", artifacts=None, prefix="anomaly_", n_jobs=None):
+    with metrics.stage("features"):
+        data = with_features(data, prefix, ANOMALY_FEATURES).dropna()
+        X = data[[f"{prefix}{f.name}" for f in ANOMALY_FEATURES]]
+    if mode == "per_fund" and artifacts is None and FUND_COLUMN in data.columns:
+        # Mô hình riêng từng Quỹ: huấn luyện và chấm điểm trong cùng một lần gọi
+        with metrics.stage("fit"):
+            scores, predictions = fit_isolation_forest_per_fund(X, data[FUND_COLUMN], contamination, n_jobs=n_jobs)
+    else:
+        if artifacts is not None:
+            model = artifacts["model"]
+        else:
+            with metrics.stage("fit"):
+                model = train_isolation_forest(X, contamination, n_jobs=n_jobs)
+        with metrics.stage("score"):
+            scores, predictions = score_isolation_forest(model, X, n_jobs=n_jobs)
+    data[f"{prefix}Anomaly_Score"] = scores
+    data[f"{prefix}Anomaly"] = predictions
+    return data
+
+
+# Bài toán 2: mất khả năng thanh toán (thứ tự cột giống trang, để mô hình đã lưu dùng chung được)
+def insolvency_feature_columns(prefix="insolvency_"):
+    columns = [f"{prefix}{f.name}" for f in INSOLVENCY_FEATURES]
+    return columns[:3] + ["Dòng tiền ròng"] + columns[3:]
+
+
+def run_insolvency(data, contamination=0.2, threshold=-0.1, artifacts=None, prefix="insolvency_", n_jobs=None):
+    with metrics.stage("features"):
+        data = with_features(data, prefix, INSOLVENCY_FEATURES)
+        X = data[insolvency_feature_columns(prefix)]
+    if artifacts is not None:
+        scaler, model = artifacts["scaler"], artifacts["model"]
+    else:
+        with metrics.stage("fit"):
+            scaler, X_scaled = fit_standard_scaler(X)
+            model = train_isolation_forest(X_scaled, contamination, n_jobs=n_jobs)
+    with metrics.stage("score"):
+        scores, _ = score_isolation_forest(model, scaler.transform(X), n_jobs=n_jobs)
+    data[f"{prefix}Anomaly_Score"] = scores
+    data[f"{prefix}Risk"] = (scores < threshold).astype(int)
+    return data
+
+
+# Bài toán 3: rủi ro tín dụng
+def run_credit_risk(data, artifacts=None, prefix="credit_risk_"):
+    with metrics.stage("features"):
+        data = with_features(data, prefix, CREDIT_RISK_FEATURES)
+        X = data[[f"{prefix}{f.name}" for f in CREDIT_RISK_FEATURES]]
+    if artifacts is not None:
+        scaler, model = artifacts["scaler"], artifacts["model"]
+    else:
+        from sklearn.model_selection import train_test_split
+
+        with metrics.stage("fit"):
+            scaler, X_scaled = fit_standard_scaler(X)
+            X_train, _, y_train, _ = train_test_split(X_scaled, data["Risk_Label"], test_size=0.3, random_state=42)
+            model = fit_logistic_regression(X_train, y_train, multi_class="multinomial", max_iter=1000)
+    with metrics.stage("score"):
+        data[f"{prefix}Risk_Prediction"] = model.predict(scaler.transform(X))
+    data[f"{prefix}Risk_Level"] = data[f"{prefix}Risk_Prediction"].map(RISK_LEVELS)
+    return data
+
+
+# Dòng có mọi đặc trưng hữu hạn
+def _finite_rows(X):
+    return np.isfinite(X.to_numpy(dtype=float)).all(axis=1)
+
+
+# Chấm điểm hàng loạt Quỹ mới bằng scaler và mô hình đã huấn luyện (một lần predict_proba).
+# Dòng có tỷ lệ không hữu hạn (thiếu số liệu, mẫu số bằng 0) không được chấm điểm: xác suất và mức rủi ro để trống.
+def score_credit_risk(data, scaler, model, prefix="credit_risk_"):
+    data = with_features(data, prefix, CREDIT_RISK_FEATURES)
+    X = data[[f"{prefix}{f.name}" for f in CREDIT_RISK_FEATURES]]
+    valid = _finite_rows(X)
+    probabilities = np.full((len(X), len(model.classes_)), np.nan)
+    predictions = pd.Series(np.nan, index=data.index, dtype=object)
+    if valid.any():
+        probabilities[valid] = model.predict_proba(scaler.transform(X[valid]))
+        predictions[valid] = model.classes_[probabilities[valid].argmax(axis=1)]
+    for i, label in enumerate(model.classes_):
+        data[f"{prefix}P({RISK_LEVELS[label]})"] = probabilities[:, i]
+    data[f"{prefix}Risk_Prediction"] = predictions
+    data[f"{prefix}Risk_Level"] = predictions.map(RISK_LEVELS)
+    return data
+
+
+# Đọc và chấm điểm file CSV/Parquet lớn theo từng khối, không giữ toàn bộ file trong bộ nhớ.
+# Các cột đầu vào được kiểm tra trước khi đọc khối đầu tiên (ValueError nếu thiếu).
+def score_credit_risk_chunks(source, scaler, model, name=None, chunksize=CHUNK_SIZE, prefix="credit_risk_"):
+    required = list(dict.fromkeys(c for f in CREDIT_RISK_FEATURES for c in f.columns))
+    missing = [c for c in required if c not in read_columns(source, name)]
+    if missing:
+        raise ValueError(f"File thiếu các cột: {', '.join(missing)}")
+    iter_chunks = iter_parquet_chunks if is_parquet(name or source) else iter_csv_chunks
+    return (score_credit_risk(chunk, scaler, model, prefix) for chunk in iter_chunks(source, chunksize))
+
+
+# Bài toán 4: thất thoát tài sản
+# mode="per_fund": dữ liệu nhiều Quỹ được hồi quy riêng từng Quỹ (giải theo lô)
+def run_asset_loss(data, mode="pooled", artifacts=None, prefix="asset_loss_"):
+    with metrics.stage("features"):
+        data = with_features(data, prefix, ASSET_LOSS_FEATURES).dropna()
+        X = data[["Chi phí quản lý", "Giao dịch bên liên quan", "Tỷ lệ nợ khó đòi", f"{prefix}{CASH_CHANGE.name}"]]
+        y = data[f"{prefix}{ASSET_GAP.name}"]
+    # Huấn luyện hồi quy trả về luôn dự đoán trên dữ liệu huấn luyện
+    if mode == "per_fund" and artifacts is None and FUND_COLUMN in data.columns:
+        with metrics.stage("fit"):
+            predictions = fit_linear_regression_per_fund(X, y, data[FUND_COLUMN]).predictions
+    elif artifacts is not None:
+        with metrics.stage("score"):
+            predictions = artifacts["model"].predict(X)
+    else:
+        with metrics.stage("fit"):
+            _, predictions = fit_linear_regression(X, y)
+    data[f"{prefix}Dự đoán sai lệch"] = predictions
+    return data
+
+
+# Đánh giá bộ quy tắc tuân thủ và gắn các cột kết quả vào dữ liệu
+def apply_compliance_rules(data, rule_set, prefix="compliance_"):
+    result = rules.evaluate(data, rule_set)
+    data[f"{prefix}CAR_Compliance"] = result.compliant("CAR")
+    data[f"{prefix}Bad_Debt_Compliance"] = result.compliant("NPL")
+    data[f"{prefix}Violations"] = result.bitmask
+    data[f"{prefix}Overall_Compliance"] = result.bitmask == 0
+    return data, result
+
+
+# Bài toán 5: tuân thủ an toàn vốn, nợ xấu và các tỷ lệ an toàn khác (nếu dữ liệu có đủ cột)
+# Không có mô hình: bước score là đánh giá bộ quy tắc
+def run_compliance(data, car_threshold=8.0, bad_debt_threshold=3.0, prefix="compliance_"):
+    with metrics.stage("features"):
+        data = with_features(data, prefix, COMPLIANCE_FEATURES)
+    rule_set = rules.with_thresholds(rules.DEFAULT_RULES, {"CAR": car_threshold, "NPL": bad_debt_threshold})
+    with metrics.stage("score"):
+        data, _ = apply_compliance_rules(data, rule_set, prefix)
+    return data
+
+
+# has_model: bài toán có mô hình có thể lưu/nạp từ kho
+Analysis = namedtuple("Analysis", ["name", "prefix", "columns", "run", "has_model"])
+
+ANALYSES = {
+    "anomaly": Analysis("anomaly", "anomaly_", ANOMALY_COLUMNS, run_anomaly, True),
+    "insolvency": Analysis("insolvency", "insolvency_", INSOLVENCY_COLUMNS, run_insolvency, True),
+    "credit_risk": Analysis("credit_risk", "credit_risk_", CREDIT_RISK_COLUMNS, run_credit_risk, True),
+    "asset_loss": Analysis("asset_loss", "asset_loss_", ASSET_LOSS_COLUMNS, run_asset_loss, True),
+    "compliance": Analysis("compliance", "compliance_", COMPLIANCE_COLUMNS, run_compliance, False),
+}
+
+
+# Các bài toán có thể chạy trên một bảng dữ liệu (đủ cột đầu vào)
+def matching_analyses(columns):
+    return [a for a in ANALYSES.values() if set(a.columns).issubset(columns)]
@@ -0,0 +1,220 @@
+# Đo thời gian từng bước của 5 bài toán trên dữ liệu giả lập (finguard.synthetic).
+#
+#   python -m finguard.bench --funds 1000 10000 100000 -o bench_results/hom_nay.json
+#   python -m finguard.bench --baseline bench_results/truoc.json
+#
+# Các bước: ingest (đọc file CSV/Parquet), features, fit, score, threshold (chỉ mục ngưỡng
+# hoặc đánh giá lại quy tắc với ngưỡng mới) và render (vẽ biểu đồ ra PNG). features/fit/score
+# được đo bên trong chính các hàm run_* mà finguard.cli dùng, nên bench không lệch khỏi mã thật. Mỗi cấu hình chạy
+# --repeat lần và lấy thời gian nhỏ nhất. Kết quả ghi ra JSON; với --baseline, bước nào chậm
+# hơn quá --tolerance lần so với kết quả cũ bị báo hồi quy và lệnh trả về mã lỗi 1.
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+from finguard import metrics, plots, rules
+from finguard.analyses import (
+    apply_compliance_rules,
+    run_anomaly,
+    run_asset_loss,
+    run_compliance,
+    run_credit_risk,
+    run_insolvency,
+)
+from finguard.features import FUND_COLUMN, MONTH_COLUMN
+from finguard.ingest import EXPORT_FORMATS, export_bytes, export_format, read_table
+from finguard.score_index import ScoreIndex
+from finguard.synthetic import GENERATORS, generate
+
+STAGES = ("ingest", "features", "fit", "score", "threshold", "render")
+DEFAULT_FUNDS = (1000, 10000, 100000)
+RESULT_DIR = "bench_results"
+
+
+# Thao tác của thanh trượt ngưỡng: dựng chỉ mục, đếm, gắn cờ và đường cong
+def _threshold(scores, low, high):
+    index = ScoreIndex(scores)
+    index.count_below((low + high) / 2)
+    index.flags((low + high) / 2)
+    index.curve(low, high)
+
+
+# Mỗi bài toán chạy đúng hàm run_* của finguard.analyses (các bước features/fit/score do hàm đó ghi),
+# rồi đo thêm thao tác ngưỡng và vẽ biểu đồ như trên trang
+def bench_anomaly(data, mode="pooled", n_jobs=None, prefix="anomaly_"):
+    data = run_anomaly(data, 0.2, mode=mode, prefix=prefix, n_jobs=n_jobs)
+    with metrics.stage("threshold"):
+        _threshold(data[f"{prefix}Anomaly_Score"].to_numpy(), -0.5, 0.5)
+    with metrics.stage("render"):
+        plots.to_png(plots.timeline_scatter(
+            data[[MONTH_COLUMN, f"{prefix}Biến động dư nợ", f"{prefix}Anomaly"]],
+            y=f"{prefix}Biến động dư nợ", flag_column=f"{prefix}Anomaly", tick_column=MONTH_COLUMN,
+            title="Phát hiện biến động bất thường", xlabel="Tháng", ylabel="Biến động dư nợ (%)",
+        ))
+
+
+def bench_insolvency(data, n_jobs=None, prefix="insolvency_", **_):
+    data = run_insolvency(data, 0.2, prefix=prefix, n_jobs=n_jobs)
+    with metrics.stage("threshold"):
+        _threshold(data[f"{prefix}Anomaly_Score"].to_numpy(), -0.5, 0.0)
+    with metrics.stage("render"):
+        plots.to_png(plots.risk_scatter(
+            data[[FUND_COLUMN, f"{prefix}Tỷ lệ thanh khoản", "Dòng tiền ròng", f"{prefix}Risk", f"{prefix}Anomaly_Score"]],
+            x=f"{prefix}Tỷ lệ thanh khoản", y="Dòng tiền ròng", hue=f"{prefix}Risk", size=f"{prefix}Anomaly_Score",
+            label=FUND_COLUMN, flag_column=f"{prefix}Risk", flag_value=1, priority_column=f"{prefix}Anomaly_Score",
+            lowest_first=True, title="Phát hiện nguy cơ mất thanh khoản",
+        ))
+
+
+def bench_credit_risk(data, prefix="credit_risk_", **_):
+    data = run_credit_risk(data, prefix=prefix)
+    with metrics.stage("threshold"):
+        data[f"{prefix}Risk_Level"].value_counts()
+    with metrics.stage("render"):
+        plots.to_png(plots.risk_scatter(
+            data[[FUND_COLUMN, f"{prefix}Tỷ lệ nợ xấu", f"{prefix}Tỷ lệ sử dụng vốn", f"{prefix}Risk_Level"]],
+            x=f"{prefix}Tỷ lệ nợ xấu", y=f"{prefix}Tỷ lệ sử dụng vốn", hue=f"{prefix}Risk_Level", label=FUND_COLUMN,
+            flag_column=f"{prefix}Risk_Level", flag_value="Cao", priority_column=f"{prefix}Tỷ lệ nợ xấu",
+            palette="deep", title="Phân loại rủi ro tín dụng", legend_title="Mức rủi ro", label_offset=0.1,
+        ))
+
+
+def bench_asset_loss(data, mode="pooled", prefix="asset_loss_", **_):
+    data = run_asset_loss(data, mode=mode, prefix=prefix)
+    with metrics.stage("threshold"):
+        _threshold(data[f"{prefix}Dự đoán sai lệch"].to_numpy(), -10.0, 0.0)
+    with metrics.stage("render"):
+        plots.to_png(plots.actual_vs_predicted(
+            data[[MONTH_COLUMN, f"{prefix}Sai lệch tài sản", f"{prefix}Dự đoán sai lệch"]],
+            x=MONTH_COLUMN, actual=f"{prefix}Sai lệch tài sản", predicted=f"{prefix}Dự đoán sai lệch",
+            threshold=-5.0, title="Phát hiện thất thoát tài sản", xlabel="Tháng", ylabel="Sai lệch tài sản (%)",
+        ))
+
+
+# Tuân thủ không có mô hình: score là đánh giá bộ quy tắc, threshold là đánh giá lại với ngưỡng mới
+def bench_compliance(data, prefix="compliance_", **_):
+    data = run_compliance(data, prefix=prefix)
+    with metrics.stage("threshold"):
+        data, _ = apply_compliance_rules(data, rules.with_thresholds(rules.DEFAULT_RULES, {"CAR": 9.0, "NPL": 2.5}), prefix)
+    with metrics.stage("render"):
+        plots.to_png(plots.threshold_chart(
+            data[[FUND_COLUMN, f"{prefix}CAR", f"{prefix}CAR_Compliance"]], x=FUND_COLUMN, y=f"{prefix}CAR",
+            hue=f"{prefix}CAR_Compliance", threshold=9.0, threshold_label="Ngưỡng CAR (9.0%)",
+            title="Tỷ lệ an toàn vốn (CAR)", ylabel="CAR (%)",
+        ))
+
+
+BENCHMARKS = {
+    "anomaly": bench_anomaly,
+    "insolvency": bench_insolvency,
+    "credit_risk": bench_credit_risk,
+    "asset_loss": bench_asset_loss,
+    "compliance": bench_compliance,
+}
+
+
+# Một cấu hình (bài toán, số Quỹ): trả về {bước: giây nhỏ nhất qua các lần lặp}
+def run_case(name, funds, months=12, format="CSV", repeat=1, mode="pooled", seed=0, n_jobs=None):
+    frame, _ = generate(name, funds, months, seed=seed)
+    suffix, _ = EXPORT_FORMATS[format]
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / f"{name}{suffix}"
+        path.write_bytes(export_bytes(frame, format))
+        best = {}
+        for _ in range(repeat):
+            recorder = metrics.activate(metrics.Recorder(f"bench_{name}", log_path=None))
+            try:
+                with metrics.stage("ingest"):
+                    data, _, _ = read_table(path)
+                BENCHMARKS[name](data, mode=mode, n_jobs=n_jobs)
+            finally:
+                metrics.activate(None)
+            seconds = {}
+            for record in recorder.records:
+                seconds[record["stage"]] = seconds.get(record["stage"], 0.0) + record["wall_seconds"]
+            for stage, value in seconds.items():
+                best[stage] = min(best.get(stage, np.inf), value)
+    return {"analysis": name, "funds": funds, "rows": len(frame), "seconds": best}
+
+
+def environment():
+    return {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "sklearn": sklearn.__version__,
+        "cpus": os.cpu_count(),
+        "machine": platform.machine(),
+    }
+
+
+# So sánh với kết quả cũ: trả về các dòng (bài toán, Quỹ, bước, cũ, mới, tỷ lệ) chậm hơn tolerance lần
+def regressions(results, baseline, tolerance):
+    old = {(r["analysis"], r["funds"]): r["seconds"] for r in baseline["results"]}
+    slower = []
+    for result in results:
+        previous = old.get((result["analysis"], result["funds"]), {})
+        for stage, seconds in result["seconds"].items():
+            # Bỏ qua các bước quá nhanh, nơi nhiễu đo lớn hơn chênh lệch thật
+            if stage in previous and seconds > previous[stage] * tolerance and seconds > 0.05:
+                slower.append((result["analysis"], result["funds"], stage, previous[stage], seconds, seconds / previous[stage]))
+    return slower
+
+
+def format_table(results):
+    rows = [{"Bài toán": r["analysis"], "Quỹ": r["funds"], "Dòng": r["rows"], **{s: r["seconds"].get(s) for s in STAGES}} for r in results]
+    return pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.3f}", na_rep="-")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đo thời gian từng bước của các bài toán trên dữ liệu giả lập")
+    parser.add_argument("-n", "--funds", type=int, nargs="+", default=list(DEFAULT_FUNDS), help="Các quy mô số Quỹ")
+    parser.add_argument("-m", "--months", type=int, default=12, help="Số tháng của bài toán theo tháng")
+    parser.add_argument("-a", "--analysis", action="append", choices=sorted(GENERATORS), help="Chỉ đo bài toán này (có thể lặp lại)")
+    parser.add_argument("-f", "--format", type=export_format, choices=sorted(EXPORT_FORMATS), default="CSV", help="Định dạng file đầu vào")
+    parser.add_argument("--mode", choices=["pooled", "per_fund"], default="pooled", help="Mô hình gộp hoặc riêng từng Quỹ (anomaly, asset_loss)")
+    parser.add_argument("-j", "--jobs", type=int, help="Số luồng cho IsolationForest (dựng cây và chấm điểm theo khối)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Số lần lặp, lấy thời gian nhỏ nhất")
+    parser.add_argument("-o", "--output", help="File JSON kết quả (mặc định bench_results/<thời điểm>.json)")
+    parser.add_argument("--baseline", help="File JSON kết quả cũ để so sánh")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="Báo hồi quy khi chậm hơn số lần này")
+    args = parser.parse_args(argv)
+
+    results = []
+    for funds in args.funds:
+        for name in args.analysis or GENERATORS:
+            result = run_case(name, funds, args.months, args.format, args.repeat, args.mode, n_jobs=args.jobs)
+            results.append(result)
+            stages = ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in result["seconds"].items())
+            print(f"{name} [{funds:,} Quỹ, {result['rows']:,} dòng]: {stages}", file=sys.stderr)
+
+    output = Path(args.output or Path(RESULT_DIR) / f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    config = {"months": args.months, "format": args.format, "mode": args.mode, "repeat": args.repeat, "jobs": args.jobs}
+    output.write_text(json.dumps({"environment": environment(), "config": config, "results": results}, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(format_table(results))
+    print(f"Đã ghi kết quả: {output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        slower = regressions(results, baseline, args.tolerance)
+        for name, funds, stage, before, after, ratio in slower:
+            print(f"HỒI QUY {name} [{funds:,} Quỹ] {stage}: {before:.3f}s -> {after:.3f}s (x{ratio:.2f})", file=sys.stderr)
+        if slower:
+            return 1
+        print(f"Không có bước nào chậm hơn x{args.tolerance} so với {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
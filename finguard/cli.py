@@ -0,0 +1,122 @@
+# Chạy lô 5 bài toán trên một thư mục CSV/Parquet, không cần Streamlit.
+#
+#   python -m finguard.cli du_lieu/ -o ket_qua/ --workers 8 --format parquet
+#   python -m finguard.cli -s lich_su --last-periods 24 -o ket_qua/
+#
+# Mỗi cặp (file, bài toán) chạy trong một tiến trình riêng; kết quả ghi ra
+# <tên file>_<tiền tố>result.csv (hoặc .parquet) giống nút "Tải xuống kết quả" trên các trang.
+# -s đọc một bộ dữ liệu trong kho (finguard.store) thay cho file; chỉ lát Quỹ/tháng được chọn được đọc.
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from finguard import registry, store
+from finguard.analyses import ANALYSES, matching_analyses
+from finguard.features import FUND_COLUMN, MONTH_COLUMN
+from finguard.ingest import EXPORT_FORMATS, export_bytes, export_format, read_columns, read_table
+
+INPUT_PATTERNS = ("*.csv", "*.parquet")
+
+
+# Nguồn dữ liệu của task: đường dẫn file hoặc StoreQuery (lát dữ liệu trong kho)
+def load_source(source):
+    if isinstance(source, store.StoreQuery):
+        return store.read_query(source)
+    data, _, _ = read_table(source)
+    return data
+
+
+def source_name(source):
+    return source.name if isinstance(source, store.StoreQuery) else Path(source).stem
+
+
+def source_label(source):
+    return f"kho:{source.name}" if isinstance(source, store.StoreQuery) else source
+
+
+# use_saved: chấm điểm bằng phiên bản mới nhất trong kho mô hình thay vì huấn luyện lại
+def run_task(path, analysis_name, output_dir, params=None, use_saved=False, model_dir=None, format="CSV"):
+    analysis = ANALYSES[analysis_name]
+    start = time.perf_counter()
+    params = dict(params or {})
+    if use_saved and analysis.has_model:
+        params["artifacts"], _ = registry.load_model(analysis.name, root=model_dir)
+    data = load_source(path)
+    result = analysis.run(data, **params)
+    suffix, _ = EXPORT_FORMATS[format]
+    output_path = Path(output_dir) / f"{source_name(path)}_{analysis.prefix}result{suffix}"
+    output_path.write_bytes(export_bytes(result, format))
+    return str(output_path), len(result), time.perf_counter() - start
+
+
+# input_dir có thể None khi chỉ đọc từ kho; store_queries: các lát dữ liệu trong kho
+def plan_tasks(input_dir, analysis_names=None, store_queries=()):
+    sources = []
+    if input_dir is not None:
+        paths = sorted(path for pattern in INPUT_PATTERNS for path in Path(input_dir).glob(pattern))
+        sources += [(str(path), read_columns(path)) for path in paths]
+    for query in store_queries:
+        info = store.info(query.name)
+        sources.append((query, [*info.columns, *([FUND_COLUMN] if info.funds else []), *([MONTH_COLUMN] if info.periods else [])]))
+    tasks = []
+    for source, columns in sources:
+        for analysis in matching_analyses(columns):
+            if analysis_names is None or analysis.name in analysis_names:
+                tasks.append((source, analysis.name))
+    return tasks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chạy lô các bài toán giám sát Quỹ Tín dụng Nhân dân")
+    parser.add_argument("input_dir", nargs="?", help="Thư mục chứa các file CSV hoặc Parquet")
+    parser.add_argument("-s", "--store-dataset", action="append", default=[], help="Đọc bộ dữ liệu này trong kho (có thể lặp lại)")
+    parser.add_argument("--fund", action="append", default=[], help="Kho: chỉ đọc Quỹ này (có thể lặp lại)")
+    parser.add_argument("--last-periods", type=int, help="Kho: chỉ đọc số tháng gần nhất này")
+    parser.add_argument("-o", "--output-dir", default="results", help="Thư mục ghi kết quả")
+    parser.add_argument("-a", "--analysis", action="append", choices=sorted(ANALYSES), help="Chỉ chạy bài toán này (có thể lặp lại)")
+    parser.add_argument("--anomaly-mode", choices=["pooled", "per_fund"], default="pooled", help="Dữ liệu nhiều Quỹ: mô hình gộp hoặc riêng từng Quỹ")
+    parser.add_argument("--asset-loss-mode", choices=["pooled", "per_fund"], default="pooled", help="Dữ liệu nhiều Quỹ: hồi quy chung hoặc riêng từng Quỹ")
+    parser.add_argument("--use-saved", action="store_true", help="Dùng mô hình mới nhất trong kho thay vì huấn luyện lại")
+    parser.add_argument("--model-dir", default=registry.MODEL_DIR, help="Thư mục kho mô hình")
+    parser.add_argument("-f", "--format", type=export_format, choices=sorted(EXPORT_FORMATS), default="CSV", help="Định dạng file kết quả")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="Số tiến trình song song")
+    parser.add_argument("-j", "--jobs", type=int, help="Số luồng của mỗi task cho Isolation Forest (mặc định chia đều CPU cho các tiến trình)")
+    args = parser.parse_args(argv)
+    if args.input_dir is None and not args.store_dataset:
+        parser.error("cần thư mục dữ liệu hoặc ít nhất một --store-dataset")
+
+    store_queries = [store.StoreQuery(name, funds=tuple(args.fund), last_periods=args.last_periods) for name in args.store_dataset]
+    tasks = plan_tasks(args.input_dir, args.analysis, store_queries)
+    if not tasks:
+        print("Không tìm thấy file CSV/Parquet phù hợp với bài toán nào.", file=sys.stderr)
+        return 1
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # Mỗi tiến trình chỉ dùng phần CPU của mình để các task chạy song song không tranh nhau;
+    # một task duy nhất dùng mọi CPU
+    threads_per_worker = args.jobs or max(1, (os.cpu_count() or 1) // min(args.workers, len(tasks)))
+    params = {
+        "anomaly": {"mode": args.anomaly_mode, "n_jobs": threads_per_worker},
+        "insolvency": {"n_jobs": threads_per_worker},
+        "asset_loss": {"mode": args.asset_loss_mode},
+    }
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(run_task, path, name, args.output_dir, params.get(name), args.use_saved, args.model_dir, args.format): (path, name) for path, name in tasks}
+        for future in as_completed(futures):
+            path, name = futures[future]
+            try:
+                output_path, rows, elapsed = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"LỖI {source_label(path)} [{name}]: {e}", file=sys.stderr)
+            else:
+                print(f"{source_label(path)} [{name}] -> {output_path} ({rows} dòng, {elapsed:.2f}s)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import time
+
+import streamlit as st
+
+from finguard import metrics, store
+from finguard.features import ALL_FEATURES, FUND_COLUMN, MONTH_COLUMN
+from finguard.ingest import read_table
+from finguard.metrics import timed
+
+# Khóa lưu sổ đăng ký dữ liệu trong session_state
+REGISTRY_KEY = "finguard_datasets"
+
+
+# Một bộ dữ liệu đã đọc; đặc trưng dẫn xuất được tính khi cần và ghi nhớ theo cột.
+# features: đặc trưng đã tính sẵn khi đọc theo khối; stats: thống kê đọc (số dòng, bộ nhớ...);
+# key: khóa nhận biết nguồn dữ liệu (file tải lên, bộ dữ liệu trong kho hoặc dữ liệu mẫu).
+class Dataset:
+    def __init__(self, name, frame, source, features=None, stats=None, key=None):
+        self.name = name
+        self.frame = frame
+        self.source = source
+        self.key = key
+        self.stats = stats
+        self._features = dict(features or {})
+
+    def feature(self, feature):
+        if feature.key not in self._features:
+            self._features[feature.key] = feature.compute(self.frame)
+        return self._features[feature.key]
+
+    # Trả về bản sao dữ liệu kèm các cột đặc trưng có tiền tố của trang
+    @timed("features")
+    def with_features(self, prefix, features):
+        return self.frame.assign(**{f"{prefix}{f.name}": self.feature(f) for f in features})
+
+    def has_columns(self, columns):
+        return set(columns).issubset(self.frame.columns)
+
+
+def get_registry():
+    if REGISTRY_KEY not in st.session_state:
+        st.session_state[REGISTRY_KEY] = {}
+    return st.session_state[REGISTRY_KEY]
+
+
+# Đọc file tải lên (CSV hoặc Parquet) đúng một lần cho mỗi phiên, theo từng khối với kiểu dữ liệu gọn.
+# columns: chỉ đọc các cột này; None là đọc tất cả (file dùng chung từ Home).
+# Bộ nhớ đỉnh khi đọc chỉ được đo khi trang bật đo bộ nhớ từng bước.
+def register_upload(uploaded_file, columns=None):
+    registry = get_registry()
+    key = f"upload:{uploaded_file.file_id}"
+    if key not in registry:
+        recorder = metrics.active()
+        measure_memory = recorder is not None and recorder.trace_memory
+        frame, features, stats = read_table(
+            uploaded_file, uploaded_file.name, ALL_FEATURES, columns=columns, measure_memory=measure_memory
+        )
+        registry[key] = Dataset(uploaded_file.name, frame, "upload", features, stats, key=key)
+    return registry[key]
+
+
+def register_sample(name, loader):
+    registry = get_registry()
+    key = f"sample:{name}"
+    if key not in registry:
+        registry[key] = Dataset(name, loader(), "sample", key=key)
+    return registry[key]
+
+
+# Lát dữ liệu đọc từ kho cho một trang; chỉ giữ lát gần nhất của mỗi trang và đọc lại khi lát
+# thay đổi hoặc bộ dữ liệu có thêm dòng
+def register_store(name, query):
+    registry = get_registry()
+    key = f"store:{name}"
+    version = (query, store.info(query.name).rows)
+    dataset = registry.get(key)
+    if dataset is None or dataset.stats["version"] != version:
+        start = time.perf_counter()
+        frame = store.read_query(query)
+        stats = {
+            "format": "store",
+            "version": version,
+            "rows": len(frame),
+            "seconds": time.perf_counter() - start,
+            "memory": int(frame.memory_usage(deep=True).sum()),
+        }
+        registry[key] = Dataset(query.name, frame, "store", stats=stats, key=f"store:{query.name}")
+    return registry[key]
+
+
+# Chọn dữ liệu cho trang: file tải lên tại trang, lát dữ liệu trong kho, file dùng chung từ Home có đủ cột,
+# hoặc dữ liệu mẫu. File tải lên tại trang và kho chỉ được đọc các cột bắt buộc, các cột tùy chọn của trang,
+# Quỹ và Tháng.
+@timed("ingest")
+def resolve_dataset(uploaded_file, required_columns, sample_name, sample_loader, optional_columns=(), store_query=None):
+    if uploaded_file is not None:
+        return register_upload(uploaded_file, [*required_columns, *optional_columns, FUND_COLUMN, MONTH_COLUMN])
+    if store_query is not None:
+        return register_store(sample_name, store_query._replace(columns=(*required_columns, *optional_columns)))
+    for dataset in reversed(list(get_registry().values())):
+        if dataset.source == "upload" and dataset.has_columns(required_columns):
+            return dataset
+    return register_sample(sample_name, sample_loader)
+
+
+def uploaded_datasets():
+    return [d for d in get_registry().values() if d.source == "upload"]
@@ -0,0 +1,379 @@
+# Quét cảnh báo sớm toàn hệ thống: 4 tín hiệu rủi ro của mọi Quỹ trong một lượt, xếp hạng chung.
+#
+#   python -m finguard.early_warning du_lieu/he_thong.parquet -o canh_bao.csv
+#   python -m finguard.early_warning -s lich_su --use-saved --sla 300
+#
+# - Mỗi Quỹ được đánh giá trên tháng gần nhất (tháng trước đó chỉ dùng cho biến động tiền mặt).
+# - Các tỷ lệ (nợ xấu, CAR, thanh khoản...) được tính một lần trên bảng tháng gần nhất và dùng
+#   chung cho mọi tín hiệu và cho bảng kết quả.
+# - Tín hiệu: điểm mất thanh khoản (Isolation Forest), mức rủi ro tín dụng (Logistic Regression),
+#   dự đoán sai lệch tài sản (hồi quy tuyến tính), số quy tắc tuân thủ bị vi phạm. Tín hiệu thiếu
+#   cột đầu vào được bỏ qua.
+# - Mô hình được huấn luyện ở lần quét đầu (hoặc nạp từ kho mô hình) rồi giữ nguyên; các lần quét
+#   sau chỉ tính lại những Quỹ có hai tháng cuối thay đổi. Xếp hạng (rank) làm lại trên toàn bộ
+#   các Quỹ và không cần quét lại khi chỉ đổi trọng số hoặc ngưỡng cờ.
+# - Lần quét vượt SWEEP_SLA giây được báo (dòng lệnh trả về mã lỗi 1).
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from finguard import jobs, metrics, registry, rules, store
+from finguard.analyses import (
+    ASSET_LOSS_COLUMNS,
+    COMPLIANCE_COLUMNS,
+    CREDIT_RISK_COLUMNS,
+    CREDIT_RISK_FEATURES,
+    INSOLVENCY_COLUMNS,
+    INSOLVENCY_FEATURES,
+    RISK_LEVELS,
+    fit_linear_regression,
+    fit_logistic_regression,
+    fit_standard_scaler,
+    insolvency_feature_columns,
+    score_isolation_forest,
+    train_isolation_forest,
+)
+from finguard.features import ASSET_GAP, BAD_DEBT_RATIO, CAR, CASH_CHANGE, FUND_COLUMN, LIQUIDITY_RATIO, MONTH_COLUMN, panel_order
+from finguard.ingest import export_bytes, is_parquet, read_table
+
+SWEEP_SLA = float(os.environ.get("FINGUARD_SWEEP_SLA", 300))
+
+SIGNALS = {
+    "insolvency": "Mất khả năng thanh toán",
+    "credit_risk": "Rủi ro tín dụng",
+    "asset_loss": "Thất thoát tài sản",
+    "compliance": "Tuân thủ",
+}
+WEIGHTS = {"insolvency": 0.3, "credit_risk": 0.3, "asset_loss": 0.2, "compliance": 0.2}
+INSOLVENCY_THRESHOLD = -0.1
+ASSET_LOSS_THRESHOLD = -5.0
+# Số quy tắc vi phạm để thành phần tuân thủ đạt mức tối đa
+COMPLIANCE_SATURATION = 2
+
+# Cột đầu vào của từng tín hiệu (nhãn rủi ro chỉ cần khi phải huấn luyện mô hình tín dụng)
+SIGNAL_COLUMNS = {
+    "insolvency": INSOLVENCY_COLUMNS,
+    "credit_risk": [c for c in CREDIT_RISK_COLUMNS if c != "Risk_Label"],
+    "asset_loss": ASSET_LOSS_COLUMNS,
+    "compliance": COMPLIANCE_COLUMNS,
+}
+# Đặc trưng (theo tên cột trên các trang) của mô hình trong kho mà quét dùng lại được
+ASSET_LOSS_MODEL_COLUMNS = ["Chi phí quản lý", "Giao dịch bên liên quan", "Tỷ lệ nợ khó đòi", f"asset_loss_{CASH_CHANGE.name}"]
+SIGNAL_FEATURES = {
+    "insolvency": insolvency_feature_columns("insolvency_"),
+    "credit_risk": [f"credit_risk_{f.name}" for f in CREDIT_RISK_FEATURES],
+    "asset_loss": ASSET_LOSS_MODEL_COLUMNS,
+}
+# Tỷ lệ dùng chung giữa các tín hiệu mà quy tắc tuân thủ cũng cần
+SHARED_RATIOS = (LIQUIDITY_RATIO, CAR, *CREDIT_RISK_FEATURES)
+
+# Cột của bảng tín hiệu
+SCORE = "Điểm mất thanh khoản"
+RISK_LEVEL = "Mức rủi ro tín dụng"
+EXPECTED_RISK = "Rủi ro tín dụng kỳ vọng"
+PREDICTED_GAP = "Dự đoán sai lệch"
+VIOLATIONS = "Số vi phạm"
+VIOLATED_RULES = "Quy tắc vi phạm"
+COMPOSITE = "Điểm rủi ro tổng hợp"
+ALERTS = "Số cảnh báo"
+RANK = "Hạng"
+
+# signals: bảng tín hiệu thô (một dòng mỗi Quỹ); changed: số Quỹ được tính lại trong lần quét này
+SweepResult = namedtuple("SweepResult", "signals changed funds seconds skipped")
+
+
+# Hai dòng cuối theo cột Tháng của từng Quỹ, không phụ thuộc thứ tự dòng trong file
+def recent_rows(data):
+    if FUND_COLUMN not in data.columns:
+        raise ValueError("Dữ liệu toàn hệ thống cần cột Quỹ")
+    order = panel_order(data)
+    ordered = data if order is None else data.iloc[order]
+    return ordered.groupby(FUND_COLUMN, sort=False, observed=True).tail(2)
+
+
+# Dấu vân tay hai dòng cuối của từng Quỹ, để biết Quỹ nào có dữ liệu mới
+def fund_fingerprints(recent):
+    funds = recent[FUND_COLUMN].astype(str).to_numpy()
+    hashes = pd.Series(pd.util.hash_pandas_object(recent, index=False).to_numpy(), index=funds)
+    grouped = hashes.groupby(level=0, sort=False)
+    first, last = grouped.first(), grouped.last()
+    return pd.Series(first.to_numpy() * np.uint64(1_000_003) + last.to_numpy(), index=first.index.rename(FUND_COLUMN))
+
+
+# Dòng có đặc trưng hữu hạn (tỷ lệ chia cho 0 không được chấm điểm)
+def _finite(X):
+    return np.isfinite(np.asarray(X, dtype=float)).all(axis=1)
+
+
+class EarlyWarning:
+    # artifacts: {tín hiệu: artifacts của mô hình trong kho} dùng thay cho huấn luyện
+    def __init__(self, contamination=0.1, car_threshold=8.0, bad_debt_threshold=3.0, artifacts=None, random_state=42):
+        self.contamination = contamination
+        self.rule_set = rules.with_thresholds(rules.DEFAULT_RULES, {"CAR": car_threshold, "NPL": bad_debt_threshold})
+        self.random_state = random_state
+        self.models = dict(artifacts or {})
+        self.signals = None
+        self.fingerprints = None
+        self.skipped = {}
+        self.sweeps = 0
+        self._lock = threading.Lock()
+
+    # Khóa không ghi được ra file trạng thái
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def sweep(self, data):
+        with self._lock:
+            return self._sweep(data)
+
+    def _sweep(self, data):
+        started = time.perf_counter()
+        recent = recent_rows(data)
+        fingerprints = fund_fingerprints(recent)
+        if self.fingerprints is None or self.signals is None:
+            changed = fingerprints.index
+        else:
+            previous = self.fingerprints.reindex(fingerprints.index, fill_value=0)
+            changed = fingerprints.index[previous.to_numpy() != fingerprints.to_numpy()]
+
+        kept = self.signals.index.intersection(fingerprints.index.difference(changed)) if self.signals is not None else []
+        parts = [self.signals.loc[kept]] if len(kept) else []
+        if len(changed):
+            funds = recent[FUND_COLUMN].astype(str)
+            parts.append(self._compute(recent[funds.isin(changed).to_numpy()]))
+        self.signals = pd.concat(parts).reindex(fingerprints.index) if parts else None
+        self.fingerprints = fingerprints
+        self.sweeps += 1
+        return SweepResult(self.signals, len(changed), len(fingerprints), time.perf_counter() - started, dict(self.skipped))
+
+    # Tính 4 tín hiệu cho các Quỹ trong recent (hai dòng cuối của mỗi Quỹ)
+    def _compute(self, recent):
+        funds = recent[FUND_COLUMN].astype(str)
+        is_latest = ~funds.duplicated(keep="last").to_numpy()
+        latest = recent[is_latest]
+        signals = pd.DataFrame(index=pd.Index(funds[is_latest].to_numpy(), name=FUND_COLUMN))
+        if MONTH_COLUMN in latest.columns:
+            signals[MONTH_COLUMN] = latest[MONTH_COLUMN].astype(str).to_numpy()
+
+        # Tỷ lệ dùng chung: mỗi đặc trưng tính đúng một lần cho mọi tín hiệu
+        computed = {}
+
+        def feature(f, frame=latest, rows=None):
+            if f.key not in computed:
+                values = f.compute(frame)
+                computed[f.key] = (values if rows is None else values[rows]).to_numpy(dtype=float)
+            return computed[f.key]
+
+        with metrics.stage("features", rows=len(recent)):
+            for f in (LIQUIDITY_RATIO, BAD_DEBT_RATIO, CAR, ASSET_GAP):
+                if set(f.columns).issubset(latest.columns):
+                    signals[f.name] = feature(f)
+            if set(CASH_CHANGE.columns).issubset(recent.columns):
+                feature(CASH_CHANGE, recent, is_latest)
+
+        self.skipped = {}
+        steps = [
+            ("insolvency", self._insolvency),
+            ("credit_risk", self._credit_risk),
+            ("asset_loss", self._asset_loss),
+            ("compliance", self._compliance),
+        ]
+        for i, (name, step) in enumerate(steps):
+            jobs.report(i / len(steps), SIGNALS[name])
+            missing = [c for c in SIGNAL_COLUMNS[name] if c not in recent.columns]
+            if missing:
+                self.skipped[name] = "thiếu cột " + ", ".join(missing)
+                continue
+            with metrics.stage("score", signal=name, rows=len(latest)):
+                reason = step(latest, feature, signals)
+            if reason:
+                self.skipped[name] = reason
+        jobs.report(1.0)
+        return signals
+
+    def _insolvency(self, latest, feature, signals):
+        X = pd.DataFrame({f"insolvency_{f.name}": feature(f) for f in INSOLVENCY_FEATURES}, index=signals.index)
+        X["Dòng tiền ròng"] = latest["Dòng tiền ròng"].to_numpy(dtype=float)
+        X = X[SIGNAL_FEATURES["insolvency"]]
+        valid = _finite(X)
+        if "insolvency" not in self.models:
+            scaler, X_scaled = fit_standard_scaler(X[valid])
+            model = train_isolation_forest(X_scaled, self.contamination, self.random_state)
+            self.models["insolvency"] = {"scaler": scaler, "model": model}
+        artifacts = self.models["insolvency"]
+        scores = np.full(len(X), np.nan)
+        if valid.any():
+            scores[valid], _ = score_isolation_forest(artifacts["model"], artifacts["scaler"].transform(X[valid]))
+        signals[SCORE] = scores
+
+    def _credit_risk(self, latest, feature, signals):
+        X = pd.DataFrame({f"credit_risk_{f.name}": feature(f) for f in CREDIT_RISK_FEATURES}, index=signals.index)
+        valid = _finite(X)
+        if "credit_risk" not in self.models:
+            if "Risk_Label" not in latest.columns:
+                return "chưa có mô hình trong kho và dữ liệu không có cột Risk_Label để huấn luyện"
+            scaler, X_scaled = fit_standard_scaler(X[valid])
+            model = fit_logistic_regression(X_scaled, latest["Risk_Label"][valid], multi_class="multinomial", max_iter=1000)
+            self.models["credit_risk"] = {"scaler": scaler, "model": model}
+        artifacts = self.models["credit_risk"]
+        levels = np.full(len(X), np.nan)
+        expected = np.full(len(X), np.nan)
+        if valid.any():
+            model = artifacts["model"]
+            probabilities = model.predict_proba(artifacts["scaler"].transform(X[valid]))
+            levels[valid] = model.classes_[probabilities.argmax(axis=1)]
+            # Mức rủi ro kỳ vọng chia cho mức cao nhất: 0 (chắc chắn Thấp) tới 1 (chắc chắn Cao)
+            expected[valid] = probabilities @ model.classes_ / max(RISK_LEVELS)
+        signals[RISK_LEVEL] = pd.Series(levels, index=signals.index).map(RISK_LEVELS)
+        signals[EXPECTED_RISK] = expected
+
+    def _asset_loss(self, latest, feature, signals):
+        X = pd.DataFrame({c: latest[c].to_numpy(dtype=float) for c in ASSET_LOSS_MODEL_COLUMNS[:3]}, index=signals.index)
+        X[ASSET_LOSS_MODEL_COLUMNS[3]] = feature(CASH_CHANGE)
+        y = feature(ASSET_GAP)
+        valid = _finite(X) & np.isfinite(y)
+        if "asset_loss" not in self.models:
+            if valid.sum() < 2:
+                return "cần ít nhất hai tháng dữ liệu cho mỗi Quỹ"
+            model, _ = fit_linear_regression(X[valid], y[valid])
+            self.models["asset_loss"] = {"model": model}
+        predictions = np.full(len(X), np.nan)
+        if valid.any():
+            predictions[valid] = self.models["asset_loss"]["model"].predict(X[valid])
+        signals[PREDICTED_GAP] = predictions
+
+    # Quy tắc có cùng tử số và mẫu số với một tỷ lệ dùng chung (CAR, nợ xấu, tiền mặt, dư nợ/tiền gửi)
+    # lấy tỷ lệ đó thay vì tính lại từ cột gốc
+    def _compliance(self, latest, feature, signals):
+        known = {f.columns: feature(f) for f in SHARED_RATIOS if set(f.columns).issubset(latest.columns)}
+        result = rules.evaluate(latest, self.rule_set, known=known)
+        signals[VIOLATIONS] = result.violations.sum(axis=1)
+        names = np.full(len(latest), "", dtype=object)
+        for i, rule in enumerate(result.rules):
+            names = names + np.where(result.violations[:, i], rule.code + " ", "")
+        signals[VIOLATED_RULES] = [name.strip() for name in names]
+
+    # Ghi ra file tạm rồi đổi tên để không để lại file trạng thái dở dang
+    def save(self, path):
+        import joblib
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        joblib.dump(self, tmp_path)
+        tmp_path.replace(path)
+
+    @staticmethod
+    def load(path):
+        import joblib
+
+        return joblib.load(path)
+
+
+def state_path():
+    return Path(registry.MODEL_DIR) / "early_warning" / "state.joblib"
+
+
+# Mô hình mới nhất trong kho của các tín hiệu, nếu được huấn luyện trên đúng các đặc trưng mà quét dùng
+def saved_artifacts(model_dir=None):
+    artifacts = {}
+    for name, features in SIGNAL_FEATURES.items():
+        versions = registry.list_versions(name, model_dir)
+        if versions and versions[-1]["features"] == features:
+            artifacts[name], _ = registry.load_model(name, versions[-1]["version"], model_dir)
+    return artifacts
+
+
+# Bảng xếp hạng: mỗi tín hiệu thành một thành phần trong [0, 1] (điểm mất thanh khoản và dự đoán
+# sai lệch theo thứ hạng trong toàn hệ thống), điểm tổng hợp là trung bình có trọng số của các
+# thành phần có giá trị; cờ cảnh báo theo ngưỡng của từng trang.
+def rank(signals, weights=WEIGHTS, insolvency_threshold=INSOLVENCY_THRESHOLD, asset_loss_threshold=ASSET_LOSS_THRESHOLD):
+    table = signals.copy()
+    components = {}
+    flags = {}
+    if SCORE in table:
+        components["insolvency"] = (-table[SCORE]).rank(pct=True)
+        flags["insolvency"] = table[SCORE] < insolvency_threshold
+    if EXPECTED_RISK in table:
+        components["credit_risk"] = table[EXPECTED_RISK]
+        flags["credit_risk"] = table[RISK_LEVEL] == RISK_LEVELS[max(RISK_LEVELS)]
+    if PREDICTED_GAP in table:
+        components["asset_loss"] = (-table[PREDICTED_GAP]).rank(pct=True)
+        flags["asset_loss"] = table[PREDICTED_GAP] < asset_loss_threshold
+    if VIOLATIONS in table:
+        components["compliance"] = np.minimum(table[VIOLATIONS], COMPLIANCE_SATURATION) / COMPLIANCE_SATURATION
+        flags["compliance"] = table[VIOLATIONS] > 0
+
+    weighted = np.zeros(len(table))
+    total = np.zeros(len(table))
+    for name, component in components.items():
+        available = component.notna().to_numpy()
+        weighted += np.where(available, component.fillna(0).to_numpy() * weights[name], 0.0)
+        total += available * weights[name]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        table[COMPOSITE] = weighted / total
+    for name, flag in flags.items():
+        table[f"Cờ {SIGNALS[name].lower()}"] = flag
+    table[ALERTS] = sum(flag.astype(int) for flag in flags.values()) if flags else 0
+    table = table.sort_values([COMPOSITE, ALERTS], ascending=False, na_position="last", kind="stable").reset_index()
+    table.insert(0, RANK, np.arange(1, len(table) + 1))
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quét cảnh báo sớm toàn hệ thống Quỹ Tín dụng Nhân dân")
+    parser.add_argument("input", nargs="?", help="File CSV hoặc Parquet dữ liệu toàn hệ thống")
+    parser.add_argument("-s", "--store-dataset", help="Đọc bộ dữ liệu này trong kho (hai tháng gần nhất) thay cho file")
+    parser.add_argument("-o", "--output", default="early_warning.csv", help="File kết quả .csv hoặc .parquet")
+    parser.add_argument("--state", default=None, help="File trạng thái (mặc định trong thư mục kho mô hình)")
+    parser.add_argument("--use-saved", action="store_true", help="Dùng mô hình mới nhất trong kho thay vì huấn luyện")
+    parser.add_argument("--contamination", type=float, default=0.1, help="Tỷ lệ bất thường của mô hình mất thanh khoản")
+    parser.add_argument("--sla", type=float, default=SWEEP_SLA, help="Thời gian tối đa (giây) của một lần quét")
+    parser.add_argument("--refit", action="store_true", help="Bỏ trạng thái cũ: huấn luyện lại và tính lại mọi Quỹ")
+    args = parser.parse_args(argv)
+    if (args.input is None) == (args.store_dataset is None):
+        parser.error("cần đúng một trong hai: file dữ liệu hoặc --store-dataset")
+
+    path = Path(args.state) if args.state else state_path()
+    if path.exists() and not args.refit:
+        warning = EarlyWarning.load(path)
+    else:
+        artifacts = saved_artifacts() if args.use_saved else None
+        warning = EarlyWarning(args.contamination, artifacts=artifacts)
+
+    started = time.perf_counter()
+    if args.store_dataset:
+        data = store.read(args.store_dataset, last_periods=2)
+    else:
+        data, _, _ = read_table(args.input)
+    result = warning.sweep(data)
+    table = rank(result.signals)
+    Path(args.output).write_bytes(export_bytes(table, "Parquet" if is_parquet(args.output) else "CSV"))
+    warning.save(path)
+    elapsed = time.perf_counter() - started
+
+    for name, reason in result.skipped.items():
+        print(f"Bỏ qua tín hiệu {SIGNALS[name]}: {reason}", file=sys.stderr)
+    status = "OK" if elapsed <= args.sla else "VƯỢT"
+    print(
+        f"{status} {result.funds} Quỹ ({result.changed} Quỹ tính lại), {int((table[ALERTS] > 0).sum())} Quỹ có cảnh báo; "
+        f"{elapsed:.2f}s / {args.sla:.0f}s -> {args.output}"
+    )
+    return 0 if status == "OK" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
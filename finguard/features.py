@@ -0,0 +1,259 @@
+# Định nghĩa các đặc trưng dẫn xuất dùng chung cho các trang.
+# Mỗi đặc trưng có khóa riêng (tên + các cột đầu vào) để hai trang cùng dùng
+# một công thức (ví dụ Tỷ lệ nợ xấu) chỉ phải tính một lần.
+import re
+
+import numpy as np
+import pandas as pd
+
+# Cột khóa của dữ liệu bảng (nhiều Quỹ x nhiều tháng)
+FUND_COLUMN = "Quỹ"
+MONTH_COLUMN = "Tháng"
+
+
+class Feature:
+    def __init__(self, name, columns, compute):
+        self.name = name
+        self.columns = tuple(columns)
+        self.compute = compute
+
+    @property
+    def key(self):
+        return (self.name, self.columns)
+
+
+# Tỷ lệ phần trăm giữa hai cột
+def ratio(name, numerator, denominator):
+    return Feature(name, (numerator, denominator), lambda df: df[numerator] / df[denominator] * 100)
+
+
+# Khóa thời gian của một nhãn Tháng: "Tháng 3" -> 3, "2024-03" -> 20240300, "15/03/2024" -> 20240315.
+# None nếu nhãn không có số.
+def period_key(label):
+    numbers = re.findall(r"\d+", str(label))
+    if not numbers:
+        return None
+    years = [i for i, n in enumerate(numbers) if len(n) == 4]
+    if not years:
+        return int(numbers[0])
+    rest = [int(n) for i, n in enumerate(numbers) if i != years[0]]
+    # Năm đứng cuối (dd/mm/yyyy, mm/yyyy): tháng là số ngay trước năm
+    if years[0] > 0:
+        rest.reverse()
+    month, day = (rest + [0, 0])[:2]
+    return int(numbers[years[0]]) * 10000 + month * 100 + day
+
+
+# Khóa sắp xếp theo thời gian của cột Tháng (số, ngày tháng hoặc nhãn như trên). Nếu có nhãn
+# không đọc được, dùng thứ tự xuất hiện của các nhãn.
+def period_keys(values):
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=float)
+    # Chỉ đọc mỗi nhãn một lần (cột Tháng thường là categorical với vài chục giá trị)
+    codes, uniques = pd.factorize(values)
+    keys = [period_key(label) for label in uniques]
+    if any(key is None for key in keys):
+        return codes
+    return np.append(np.asarray(keys, dtype=np.int64), -1)[codes]
+
+
+# Thứ tự dòng theo (Quỹ, Tháng): các dòng của một Quỹ liền nhau và theo thời gian, sắp xếp ổn định.
+# None nếu bảng đã đúng thứ tự đó (trường hợp thường gặp, không phải xếp lại).
+def panel_order(df):
+    keys = []
+    if MONTH_COLUMN in df.columns:
+        keys.append(period_keys(df[MONTH_COLUMN]))
+    if FUND_COLUMN in df.columns:
+        keys.append(pd.factorize(df[FUND_COLUMN])[0])
+    if not keys or len(df) < 2:
+        return None
+    order = np.lexsort(keys)
+    if (order == np.arange(len(df))).all():
+        return None
+    return order
+
+
+# Đưa kết quả tính trên bảng đã xếp theo panel_order về thứ tự dòng ban đầu
+def _restore(values, order, index):
+    values = np.asarray(values)
+    if order is not None:
+        unsorted = np.empty_like(values)
+        unsorted[order] = values
+        values = unsorted
+    return pd.Series(values, index=index)
+
+
+# Biến động (%) so với kỳ trước; với dữ liệu nhiều Quỹ, so với kỳ trước của chính Quỹ đó.
+# Kỳ trước xác định theo cột Tháng, không theo thứ tự dòng trong file.
+def growth(name, column):
+    def compute(df):
+        order = panel_order(df)
+        ordered = df if order is None else df.iloc[order]
+        if FUND_COLUMN in df.columns:
+            # shift theo nhóm được vector hóa hoàn toàn (groupby.pct_change lặp Python trên từng nhóm)
+            previous = ordered.groupby(FUND_COLUMN, sort=False, observed=True)[column].shift()
+            change = (ordered[column] / previous - 1) * 100
+        else:
+            change = ordered[column].pct_change() * 100
+        return _restore(change.to_numpy(dtype=float), order, df.index)
+
+    return Feature(name, (column,), compute)
+
+
+# Vị trí dòng đầu tiên của Quỹ chứa mỗi dòng, trên bảng đã xếp theo (Quỹ, Tháng).
+# Trả về (thứ tự xếp lại hoặc None nếu đã đúng thứ tự, vị trí dòng đầu nhóm của từng dòng đã xếp).
+def _group_starts(df):
+    order = panel_order(df)
+    if FUND_COLUMN not in df.columns:
+        return order, np.zeros(len(df), dtype=np.int64)
+    funds = df[FUND_COLUMN] if order is None else df[FUND_COLUMN].iloc[order]
+    codes = pd.factorize(funds)[0]
+    new_group = np.empty(len(codes), dtype=bool)
+    new_group[:1] = True
+    new_group[1:] = codes[1:] != codes[:-1]
+    positions = np.arange(len(codes))
+    return order, np.maximum.accumulate(np.where(new_group, positions, 0))
+
+
+# Tổng, tổng bình phương và số giá trị hợp lệ trong cửa sổ window dòng gần nhất của từng Quỹ,
+# tính từ tổng tích lũy: mỗi bước O(1) dù cửa sổ dài bao nhiêu. Giá trị được trừ trung bình
+# của Quỹ trước khi cộng dồn để tổng bình phương không mất chính xác trên chuỗi dài.
+def _rolling_moments(values, starts, window):
+    valid = ~np.isnan(values)
+    counts = np.bincount(starts, weights=valid, minlength=len(values))
+    sums = np.bincount(starts, weights=np.where(valid, values, 0.0), minlength=len(values))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        centered = np.where(valid, values - (sums / counts)[starts], 0.0)
+    cum = np.concatenate([[0.0], np.cumsum(centered)])
+    cum_sq = np.concatenate([[0.0], np.cumsum(centered * centered)])
+    cum_n = np.concatenate([[0], np.cumsum(valid)])
+    end = np.arange(1, len(values) + 1)
+    begin = np.maximum(end - window, starts)
+    n = cum_n[end] - cum_n[begin]
+    total = cum[end] - cum[begin]
+    total_sq = cum_sq[end] - cum_sq[begin]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / n
+        var = np.maximum(total_sq - total * mean, 0.0) / (n - 1)
+    var[n < 2] = np.nan
+    return centered, mean, np.sqrt(var)
+
+
+# Áp dụng hàm tính trên từng Quỹ (các dòng đã xếp theo thời gian) rồi trả kết quả về thứ tự dòng ban đầu
+def _per_fund(df, series, compute):
+    order, starts = _group_starts(df)
+    values = series.to_numpy(dtype=float)
+    if order is not None:
+        values = values[order]
+    return _restore(compute(values, starts), order, df.index)
+
+
+# Z-score của giá trị so với trung bình và độ lệch chuẩn window kỳ gần nhất của chính Quỹ đó
+# (gồm kỳ hiện tại). Các kỳ đầu dùng cửa sổ ngắn hơn; cửa sổ không biến động cho z-score 0.
+def rolling_zscore(name, column, window):
+    def compute(values, starts):
+        centered, mean, std = _rolling_moments(values, starts, window)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            z = (centered - mean) / std
+        z[std == 0] = 0.0
+        z[np.isnan(values)] = np.nan
+        return z
+
+    return Feature(f"{name} ({window} kỳ)", (column,), lambda df: _per_fund(df, df[column], compute))
+
+
+# Độ lệch chuẩn của biến động (%) trong window kỳ gần nhất của từng Quỹ
+def rolling_volatility(name, change, window):
+    def compute(values, starts):
+        return _rolling_moments(values, starts, window)[2]
+
+    return Feature(f"{name} ({window} kỳ)", change.columns, lambda df: _per_fund(df, change.compute(df), compute))
+
+
+# Trung bình trượt hàm mũ (EWMA, chu kỳ span) của biến động (%) trong từng Quỹ, theo thứ tự Tháng.
+# Cập nhật đệ quy O(1) mỗi kỳ; groupby.ewm chạy một lượt Cython cho mọi Quỹ.
+def ewma(name, change, span):
+    def compute(df):
+        order = panel_order(df)
+        ordered = df if order is None else df.iloc[order]
+        values = change.compute(ordered).reset_index(drop=True)
+        if FUND_COLUMN not in df.columns:
+            smoothed = values.ewm(span=span, adjust=False).mean()
+        else:
+            funds = ordered[FUND_COLUMN].reset_index(drop=True)
+            smoothed = values.groupby(funds, sort=False, observed=True).ewm(span=span, adjust=False).mean()
+            smoothed = smoothed.droplevel(0).sort_index()
+        return _restore(smoothed.to_numpy(dtype=float), order, df.index)
+
+    return Feature(f"{name} ({span} kỳ)", change.columns, compute)
+
+
+# Nối các dòng mới sau dòng cuối cùng của từng Quỹ ở lô trước, để biến động của dòng đầu
+# mỗi Quỹ trong lô mới được tính so với kỳ trước đó (các đặc trưng tự xếp dòng theo Tháng).
+# Trả về (bảng đã nối, số dòng nối thêm ở đầu, dòng có Tháng muộn nhất của từng Quỹ).
+def carry_forward(last_rows, new_rows):
+    carried = 0 if last_rows is None else len(last_rows)
+    combined = new_rows if last_rows is None else pd.concat([last_rows, new_rows], ignore_index=True)
+    combined = combined.reset_index(drop=True)
+    order = panel_order(combined)
+    ordered = combined if order is None else combined.iloc[order]
+    if FUND_COLUMN in combined.columns:
+        last_rows = ordered.groupby(FUND_COLUMN, sort=False, observed=True).tail(1)
+    else:
+        last_rows = ordered.tail(1)
+    return combined, carried, last_rows.reset_index(drop=True)
+
+
+# Các đặc trưng tính được từ những cột đã có
+def available_features(features, columns):
+    return [f for f in features if set(f.columns).issubset(columns)]
+
+
+# Bài toán 1: biến động bất thường
+LOAN_GROWTH = growth("Biến động dư nợ", "Dư nợ")
+DEPOSIT_GROWTH = growth("Biến động tiền gửi", "Tiền gửi")
+OVERDUE_LOAN_RATIO = ratio("Tỷ lệ nợ quá hạn", "Nợ quá hạn", "Dư nợ")
+FUNDING_USAGE_RATIO = ratio("Tỷ lệ sử dụng vốn huy động", "Dư nợ", "Tiền gửi")
+
+# Bài toán 2: mất khả năng thanh toán
+LIQUIDITY_RATIO = ratio("Tỷ lệ thanh khoản", "Tiền mặt", "Nợ ngắn hạn")
+DEBT_EQUITY_RATIO = ratio("Tỷ lệ nợ/vốn", "Nợ ngắn hạn", "Vốn chủ sở hữu")
+LIQUID_ASSET_RATIO = Feature(
+    "Tỷ lệ tài sản thanh khoản",
+    ("Tiền mặt", "Nợ ngắn hạn"),
+    lambda df: df["Tiền mặt"] / (df["Tiền mặt"] + df["Nợ ngắn hạn"]) * 100,
+)
+OVERDUE_SHORT_TERM_RATIO = ratio("Tỷ lệ nợ quá hạn", "Nợ quá hạn", "Nợ ngắn hạn")
+
+# Bài toán 3 và 5: rủi ro tín dụng, tuân thủ
+BAD_DEBT_RATIO = ratio("Tỷ lệ nợ xấu", "Nợ xấu", "Tổng dư nợ")
+CAPITAL_USAGE_RATIO = ratio("Tỷ lệ sử dụng vốn", "Tổng dư nợ", "Tổng tiền gửi")
+CAR = ratio("CAR", "Vốn chủ sở hữu", "Tài sản có rủi ro")
+
+# Bài toán 4: thất thoát tài sản
+ASSET_GAP = Feature(
+    "Sai lệch tài sản",
+    ("Tài sản thực tế", "Tài sản sổ sách"),
+    lambda df: (df["Tài sản thực tế"] - df["Tài sản sổ sách"]) / df["Tài sản sổ sách"] * 100,
+)
+CASH_CHANGE = growth("Biến động tiền mặt", "Tài sản thực tế")
+
+
+ALL_FEATURES = [
+    LOAN_GROWTH,
+    DEPOSIT_GROWTH,
+    OVERDUE_LOAN_RATIO,
+    FUNDING_USAGE_RATIO,
+    LIQUIDITY_RATIO,
+    DEBT_EQUITY_RATIO,
+    LIQUID_ASSET_RATIO,
+    OVERDUE_SHORT_TERM_RATIO,
+    BAD_DEBT_RATIO,
+    CAPITAL_USAGE_RATIO,
+    CAR,
+    ASSET_GAP,
+    CASH_CHANGE,
+]
@@ -0,0 +1,232 @@
+# Chấm điểm tăng dần theo tháng: chỉ xử lý các dòng mới được thêm vào.
+#
+# Trạng thái giữ dòng quan sát cuối cùng của mỗi Quỹ (để tính biến động so với
+# tháng trước) và trạng thái mô hình:
+#   - Biến động bất thường: IsolationForest đã huấn luyện + cửa sổ đặc trưng gần nhất,
+#     huấn luyện lại sau mỗi refit_every lần cập nhật.
+#   - Thất thoát tài sản: thống kê đủ của phương trình chuẩn (X'X, X'y, y'y, n) nên hệ số
+#     hồi quy bằng đúng kết quả huấn luyện trên toàn bộ lịch sử, nhưng chi phí mỗi lần
+#     cập nhật chỉ tỷ lệ với số dòng mới.
+# Một lần cập nhật hoặc thành công trọn vẹn hoặc không thay đổi trạng thái. Mọi phiên của
+# tiến trình dùng chung một trạng thái (shared_state) để không ghi đè lô của nhau.
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from finguard import registry
+from finguard.analyses import (
+    ANOMALY_FEATURES,
+    ASSET_LOSS_FEATURES,
+    score_isolation_forest,
+    train_isolation_forest,
+    with_features,
+)
+from finguard.features import ASSET_GAP, CASH_CHANGE, carry_forward
+
+
+# Trạng thái được lưu cạnh các phiên bản mô hình trong kho
+def state_path(name):
+    return Path(registry.MODEL_DIR) / name / "incremental.joblib"
+
+
+class IncrementalState:
+    # Danh sách đặc trưng là thuộc tính lớp để không bị ghi vào file trạng thái
+    features = []
+
+    def __init__(self, prefix, refit_every):
+        self.prefix = prefix
+        self.refit_every = refit_every
+        self.last_rows = None
+        self.rows_seen = 0
+        self.updates = 0
+        self.updates_since_fit = 0
+        self.seen_batches = set()
+
+    # Tính đặc trưng cho các dòng mới, nối sau dòng cuối của từng Quỹ ở lần cập nhật trước.
+    # Trả về (các dòng có đủ đặc trưng, dòng cuối mới của từng Quỹ); chưa thay đổi trạng thái.
+    def _features(self, new_rows):
+        combined, carried, last_rows = carry_forward(self.last_rows, new_rows)
+        featured = with_features(combined, self.prefix, self.features).iloc[carried:]
+        featured.index = new_rows.index
+        return featured.dropna(), last_rows
+
+    # batch_id (ví dụ file_id của file tải lên) giúp bỏ qua một lô đã xử lý.
+    # Lô không có dòng nào đủ đặc trưng (ví dụ mỗi Quỹ một dòng ở lần đầu) chỉ cập nhật dòng cuối
+    # của từng Quỹ và trả về bảng rỗng.
+    def update(self, new_rows, batch_id=None):
+        if batch_id is not None and batch_id in self.seen_batches:
+            return None
+        data, last_rows = self._features(new_rows)
+        # _update chỉ ghi vào trạng thái sau khi mọi bước có thể lỗi đã xong
+        scored = self._update(data)
+        self.last_rows = last_rows
+        self.rows_seen += len(new_rows)
+        self.updates += 1
+        if batch_id is not None:
+            self.seen_batches.add(batch_id)
+        return scored
+
+    def _advance_fit(self, refit):
+        self.updates_since_fit = 0 if refit else self.updates_since_fit + 1
+
+    @property
+    def funds(self):
+        return 0 if self.last_rows is None else len(self.last_rows)
+
+    # Ghi ra file tạm rồi đổi tên để không để lại file trạng thái dở dang
+    def save(self, path):
+        import joblib
+
+        path = Path(path)
+        tmp_path = path.with_suffix(".tmp")
+        joblib.dump(self, tmp_path)
+        tmp_path.replace(path)
+
+    @staticmethod
+    def load(path):
+        import joblib
+
+        return joblib.load(path)
+
+
+class IncrementalAnomaly(IncrementalState):
+    features = ANOMALY_FEATURES
+
+    def __init__(self, contamination=0.2, refit_every=12, window=24_000, random_state=42, prefix="anomaly_"):
+        super().__init__(prefix, refit_every)
+        self.contamination = contamination
+        self.window = window
+        self.random_state = random_state
+        self.model = None
+        self.history = None
+
+    def _update(self, data):
+        columns = [f"{self.prefix}{f.name}" for f in self.features]
+        X = data[columns].to_numpy()
+        # Cửa sổ đặc trưng gần nhất, chỉ dùng khi huấn luyện lại
+        history = X if self.history is None else np.vstack([self.history, X])[-self.window :]
+        model = self.model
+        refit = len(history) > 0 and (model is None or self.updates_since_fit + 1 >= self.refit_every)
+        if refit:
+            model = train_isolation_forest(history, self.contamination, self.random_state)
+        if len(X):
+            scores, predictions = score_isolation_forest(model, X)
+        else:
+            scores, predictions = np.empty(0), np.empty(0, dtype=int)
+        self.history, self.model = history, model
+        if model is not None:
+            self._advance_fit(refit)
+        data[f"{self.prefix}Anomaly_Score"] = scores
+        data[f"{self.prefix}Anomaly"] = predictions
+        return data
+
+
+class IncrementalAssetLoss(IncrementalState):
+    features = ASSET_LOSS_FEATURES
+
+    def __init__(self, refit_every=1, prefix="asset_loss_"):
+        super().__init__(prefix, refit_every)
+        self.columns = ["Chi phí quản lý", "Giao dịch bên liên quan", "Tỷ lệ nợ khó đòi", f"{prefix}{CASH_CHANGE.name}"]
+        k = len(self.columns) + 1
+        self.xtx = np.zeros((k, k))
+        self.xty = np.zeros(k)
+        self.yty = 0.0
+        self.n = 0
+        self.coef = None
+
+    def _design(self, data):
+        X = data[self.columns].to_numpy(dtype=float)
+        return np.column_stack([np.ones(len(X)), X])
+
+    @staticmethod
+    def _solve(xtx, xty):
+        try:
+            return np.linalg.solve(xtx, xty)
+        except np.linalg.LinAlgError:
+            return np.linalg.pinv(xtx) @ xty
+
+    def _update(self, data):
+        X = self._design(data)
+        y = data[f"{self.prefix}{ASSET_GAP.name}"].to_numpy(dtype=float)
+        xtx, xty = self.xtx + X.T @ X, self.xty + X.T @ y
+        n = self.n + len(y)
+        coef = self.coef
+        refit = n > 0 and (coef is None or self.updates_since_fit + 1 >= self.refit_every)
+        if refit:
+            coef = self._solve(xtx, xty)
+        predictions = X @ coef if coef is not None else np.full(len(y), np.nan)
+        self.xtx, self.xty, self.n, self.coef = xtx, xty, n, coef
+        self.yty += float(y @ y)
+        if coef is not None:
+            self._advance_fit(refit)
+        data[f"{self.prefix}Dự đoán sai lệch"] = predictions
+        return data
+
+    # MSE trên toàn bộ lịch sử, tính từ thống kê đủ
+    @property
+    def mse(self):
+        if not self.n:
+            return float("nan")
+        b = self.coef
+        return float((self.yty - 2 * b @ self.xty + b @ self.xtx @ b) / self.n)
+
+
+# Trạng thái trên đĩa dùng chung cho mọi phiên của tiến trình. Cập nhật chạy dưới khóa và đọc lại
+# file nếu tiến trình khác đã ghi, để các lô của nhiều người dùng không ghi đè lên nhau.
+class SharedState:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.state = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        if not self.path.exists():
+            return
+        mtime = self.path.stat().st_mtime_ns
+        if mtime != self._mtime:
+            self.state = IncrementalState.load(self.path)
+            self._mtime = mtime
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.state.save(self.path)
+        self._mtime = self.path.stat().st_mtime_ns
+
+    def get(self):
+        with self._lock:
+            self._refresh()
+            return self.state
+
+    # Khởi tạo lại từ lịch sử; trạng thái cũ được giữ nếu lịch sử lỗi
+    def reset(self, state, history):
+        with self._lock:
+            state.update(history)
+            self.state = state
+            self._save()
+            return state
+
+    # Cập nhật bằng các dòng mới; None nếu chưa khởi tạo hoặc lô đã được xử lý
+    def update(self, new_rows, batch_id=None, refit_every=None):
+        with self._lock:
+            self._refresh()
+            if self.state is None:
+                return None
+            if refit_every is not None:
+                self.state.refit_every = refit_every
+            scored = self.state.update(new_rows, batch_id)
+            if scored is not None:
+                self._save()
+            return scored
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_state(name):
+    with _shared_lock:
+        if name not in _shared:
+            _shared[name] = SharedState(state_path(name))
+        return _shared[name]
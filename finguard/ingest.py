@@ -0,0 +1,135 @@
+# Đọc CSV/Parquet theo từng khối với kiểu dữ liệu gọn, và ghi kết quả ra CSV/Parquet.
+#
+# - Mỗi khối có kích thước giới hạn; bảng thô float64/object đầy đủ không bao giờ được tạo ra.
+# - Cột số nguyên được hạ xuống kiểu nhỏ nhất; cột số thực chỉ xuống float32 khi mọi giá trị
+#   sai lệch không quá FLOAT32_ATOL (số tiền lớn giữ float64).
+# - Mã Quỹ và Tháng được chuyển sang categorical ngay trên từng khối.
+# - Đặc trưng dẫn xuất được tính một lần trên bảng đã ghép (các dòng của một Quỹ có thể nằm ở
+#   nhiều khối và không theo thứ tự Tháng) và trả về cùng dữ liệu để không phải tính lại.
+# - Parquet chỉ đọc các cột được yêu cầu (columns); các cột khác không được giải nén.
+import contextlib
+import io
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from finguard import metrics
+from finguard.features import FUND_COLUMN, MONTH_COLUMN, available_features
+
+CHUNK_SIZE = 100_000
+CATEGORICAL_COLUMNS = (FUND_COLUMN, MONTH_COLUMN)
+
+# Sai số tuyệt đối tối đa khi hạ float64 xuống float32: dưới nửa đơn vị của chữ số thập phân thứ hai,
+# nên làm tròn 2 chữ số vẫn ra đúng giá trị gốc. float32 chỉ có ~7 chữ số có nghĩa, nên số tiền
+# từ khoảng 65.000 trở lên giữ float64.
+FLOAT32_ATOL = 0.005
+
+# Định dạng xuất: (đuôi file, kiểu MIME)
+EXPORT_FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+
+# Tên định dạng xuất không phân biệt hoa thường, để dòng lệnh nhận cả "--format parquet"
+def export_format(name):
+    for key in EXPORT_FORMATS:
+        if key.lower() == str(name).lower():
+            return key
+    raise ValueError(f"định dạng không hỗ trợ: {name}")
+
+
+def downcast(series):
+    if pd.api.types.is_float_dtype(series) and series.dtype != np.float32:
+        values = series.to_numpy()
+        compact = values.astype(np.float32)
+        with np.errstate(over="ignore", invalid="ignore"):
+            if np.allclose(compact, values, rtol=0, atol=FLOAT32_ATOL, equal_nan=True):
+                return pd.Series(compact, index=series.index, name=series.name)
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast="integer")
+    return series
+
+
+def compact(frame):
+    return frame.apply(lambda column: column.astype("category") if column.name in CATEGORICAL_COLUMNS else downcast(column))
+
+
+# Ghép các khối; cột categorical được hợp nhất danh mục để không bị chuyển về object
+def _concat(chunks):
+    if not chunks:
+        return pd.DataFrame()
+    categorical = [c for c in CATEGORICAL_COLUMNS if c in chunks[0].columns]
+    frame = pd.concat([chunk.drop(columns=categorical) for chunk in chunks], ignore_index=True)
+    for position, column in enumerate(categorical):
+        values = pd.api.types.union_categoricals([chunk[column].astype("category") for chunk in chunks])
+        frame.insert(min(position, len(frame.columns)), column, values)
+    return frame.reindex(columns=chunks[0].columns) if set(chunks[0].columns) == set(frame.columns) else frame
+
+
+def is_parquet(name):
+    return Path(str(name)).suffix.lower() in (".parquet", ".pq")
+
+
+# Các cột của file; với Parquet chỉ đọc schema, với CSV chỉ đọc dòng tiêu đề
+def read_columns(source, name=None):
+    if is_parquet(name or source):
+        import pyarrow.parquet as pq
+
+        return list(pq.read_schema(source).names)
+    columns = pd.read_csv(source, nrows=0).columns
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return list(columns)
+
+
+# columns: chỉ đọc các cột này (bỏ qua tên không có trong file); None là đọc tất cả
+def iter_parquet_chunks(source, chunksize=CHUNK_SIZE, columns=None):
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(source)
+    if columns is not None:
+        columns = [c for c in parquet_file.schema_arrow.names if c in set(columns)]
+    for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+        yield batch.to_pandas()
+
+
+def iter_csv_chunks(source, chunksize=CHUNK_SIZE, columns=None):
+    wanted = None if columns is None else set(columns)
+    usecols = None if wanted is None else (lambda column: column in wanted)
+    yield from pd.read_csv(source, chunksize=chunksize, usecols=usecols)
+
+
+# Trả về (dữ liệu gọn, {khóa đặc trưng: Series}, thống kê đọc).
+# name: tên file dùng để nhận biết định dạng (mặc định là source khi source là đường dẫn).
+# features: các đặc trưng cần tính sẵn (bỏ qua đặc trưng thiếu cột đầu vào).
+# measure_memory: đo bộ nhớ đỉnh bằng tracemalloc (làm chậm việc đọc vài lần), chỉ bật khi cần.
+def read_table(source, name=None, features=(), chunksize=CHUNK_SIZE, columns=None, measure_memory=False):
+    iter_chunks = iter_parquet_chunks if is_parquet(name or source) else iter_csv_chunks
+    stats = {"format": "Parquet" if iter_chunks is iter_parquet_chunks else "CSV", "rows": 0, "chunks": 0, "default_memory": 0}
+    chunks = []
+    start = time.perf_counter()
+    with metrics.trace_peak(stats, "peak_memory") if measure_memory else contextlib.nullcontext():
+        for chunk in iter_chunks(source, chunksize, columns):
+            stats["default_memory"] += int(chunk.memory_usage(deep=True).sum())
+            chunks.append(compact(chunk))
+            stats["rows"] += len(chunk)
+            stats["chunks"] += 1
+        frame = _concat(chunks)
+        computed = {feature.key: downcast(feature.compute(frame)) for feature in available_features(features, frame.columns)}
+    stats["memory"] = int(frame.memory_usage(deep=True).sum())
+    stats["seconds"] = time.perf_counter() - start
+    return frame, computed, stats
+
+
+# Mã hóa kết quả để tải xuống; chỉ gọi khi người dùng thật sự yêu cầu file
+def export_bytes(frame, format="CSV"):
+    if format == "Parquet":
+        buffer = io.BytesIO()
+        frame.to_parquet(buffer, index=False)
+        return buffer.getvalue()
+    return frame.to_csv(index=False).encode("utf-8")
+
@@ -0,0 +1,172 @@
+# Chạy huấn luyện và chấm điểm ở luồng nền, dùng chung cho mọi phiên của tiến trình.
+#
+# - Số job chạy đồng thời bị giới hạn (MAX_WORKERS) để nhiều người dùng chung một máy chủ
+#   không tranh nhau CPU; các job khác chờ trong hàng đợi.
+# - Các yêu cầu giống hệt nhau (cùng khóa) đang chờ hoặc đang chạy dùng chung một job, kể cả
+#   từ các phiên khác nhau.
+# - Mỗi phiên giữ một job cho mỗi "ô" (ví dụ loại mô hình); khi phiên gửi yêu cầu mới cho cùng
+#   ô (kéo thanh trượt lần nữa), job cũ bị hủy nếu chưa chạy và không phiên nào khác cần.
+#   Job đang chạy không dừng giữa chừng được (sklearn không hỗ trợ), nó chạy xong và kết quả
+#   vẫn được lưu vào bộ nhớ đệm mô hình.
+# - Hàm chạy trong job báo tiến độ bằng report(); ngoài job report() không làm gì.
+# Không phụ thuộc Streamlit; phần chờ và hiển thị tiến độ nằm ở finguard.model_cache.
+import concurrent.futures
+import os
+import threading
+import time
+
+MAX_WORKERS = int(os.environ.get("FINGUARD_JOB_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+
+_current = threading.local()
+
+
+class Job:
+    def __init__(self, key, label=None):
+        self.key = key
+        self.label = label
+        self.future = None
+        self.owners = set()
+        # Các ô (phiên, loại) đang trỏ tới job này; được gỡ khi job xong để không giữ kết quả
+        self.slots = set()
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.finished = None
+        self.progress = None
+        self.message = None
+        self.threads = None
+
+    @property
+    def status(self):
+        if self.future.cancelled():
+            return "cancelled"
+        if self.future.done():
+            return "failed" if self.future.exception() is not None else "done"
+        return "running" if self.started is not None else "queued"
+
+    def elapsed(self):
+        end = self.finished or time.perf_counter()
+        return end - (self.started or self.submitted)
+
+    # Chờ tối đa timeout giây; True nếu job đã xong (kể cả lỗi hoặc bị hủy)
+    def wait(self, timeout=None):
+        try:
+            self.future.exception(timeout)
+        except concurrent.futures.CancelledError:
+            pass
+        except concurrent.futures.TimeoutError:
+            return False
+        return True
+
+    def result(self):
+        return self.future.result()
+
+    def report(self, fraction, message=None):
+        self.progress = min(max(float(fraction), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+
+# Số luồng job đang chạy trên luồng hiện tại được dùng cho phần song song bên trong; None ngoài job
+# (khi đó tiến trình dùng được mọi CPU)
+def threads():
+    job = getattr(_current, "job", None)
+    return job.threads if job is not None else None
+
+
+# Báo tiến độ của job đang chạy trên luồng hiện tại
+def report(fraction, message=None):
+    job = getattr(_current, "job", None)
+    if job is not None:
+        job.report(fraction, message)
+
+
+class JobManager:
+    def __init__(self, max_workers=MAX_WORKERS):
+        self.max_workers = max_workers
+        self.submitted = 0
+        self.deduplicated = 0
+        self.cancelled = 0
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="finguard-job")
+        self._jobs = {}
+        self._slots = {}
+        # Hủy future gọi _forget ngay trên luồng đang giữ khóa
+        self._lock = threading.RLock()
+
+    # Số luồng cho phần song song bên trong (joblib) của mỗi job: phần CPU cố định của một worker, để
+    # max_workers job chạy cùng lúc không dùng quá số CPU (job đã chạy không giảm được số luồng)
+    @property
+    def threads_per_job(self):
+        return max(1, (os.cpu_count() or 1) // self.max_workers)
+
+    # Gửi fn (không tham số) chạy nền; trả về job đang có cùng khóa nếu chưa xong.
+    # owner/slot: phiên và ô gửi yêu cầu, để hủy job cũ của cùng ô khi yêu cầu thay đổi.
+    def submit(self, key, fn, owner=None, slot=None, label=None):
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not job.future.done():
+                self.deduplicated += 1
+            else:
+                job = Job(key, label)
+                job.future = self._executor.submit(self._run, job, fn)
+                self._jobs[key] = job
+                job.future.add_done_callback(lambda _, job=job: self._forget(job))
+                self.submitted += 1
+            if owner is not None:
+                job.owners.add(owner)
+                previous = self._slots.get((owner, slot))
+                self._slots[(owner, slot)] = job
+                job.slots.add((owner, slot))
+                if previous is not None and previous is not job:
+                    previous.slots.discard((owner, slot))
+                    self._release(previous, owner)
+                if job.future.done():
+                    # Job đã xong trước khi được gắn vào ô (callback đã chạy)
+                    self._forget(job)
+        return job
+
+    def _run(self, job, fn):
+        job.started = time.perf_counter()
+        job.threads = self.threads_per_job
+        _current.job = job
+        try:
+            return fn()
+        finally:
+            _current.job = None
+            job.finished = time.perf_counter()
+
+    def _release(self, job, owner):
+        job.owners.discard(owner)
+        if not job.owners and job.future.cancel():
+            self.cancelled += 1
+
+    # Job xong (kể cả lỗi hoặc bị hủy): bỏ khỏi danh sách job và các ô, để kết quả chỉ còn được
+    # giữ bởi bộ nhớ đệm mô hình và các phiên đang chờ nó
+    def _forget(self, job):
+        with self._lock:
+            if self._jobs.get(job.key) is job:
+                del self._jobs[job.key]
+            for slot_key in job.slots:
+                if self._slots.get(slot_key) is job:
+                    del self._slots[slot_key]
+            job.slots.clear()
+            job.owners.clear()
+
+    # Vị trí của job trong hàng đợi (1 là job tiếp theo được chạy); 0 nếu đã chạy
+    def queue_position(self, job):
+        if job.started is not None:
+            return 0
+        with self._lock:
+            queued = sorted((j for j in self._jobs.values() if j.started is None and not j.future.done()), key=lambda j: j.submitted)
+        return next((i for i, j in enumerate(queued, 1) if j is job), 0)
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            "running": sum(job.started is not None for job in jobs),
+            "queued": sum(job.started is None for job in jobs),
+            "max_workers": self.max_workers,
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "cancelled": self.cancelled,
+        }
@@ -0,0 +1,156 @@
+# Đo thời gian thực, thời gian CPU và bộ nhớ của từng bước xử lý, ghi ra nhật ký JSON lines.
+#
+# Mỗi lần chạy trang tạo một Recorder và kích hoạt nó cho luồng đang chạy; các hàm dùng chung
+# (đọc dữ liệu, tính đặc trưng, huấn luyện, vẽ...) được bọc bằng stage()/timed() nên tự ghi
+# lại mà trang không phải truyền Recorder đi khắp nơi. Không có Recorder nào được kích hoạt
+# (ví dụ chạy lô bằng finguard.cli) thì stage() không làm gì.
+#
+# Mỗi bước ghi một dòng vào LOG_PATH:
+#   {"time": ..., "page": ..., "session": ..., "run": ..., "stage": "fit", "wall_seconds": ...,
+#    "cpu_seconds": ..., "max_rss_bytes": ..., "peak_memory_bytes": ... (khi đo bộ nhớ), ...}
+# Bước lấy kết quả từ bộ nhớ đệm mô hình có "cached": true (false khi phải huấn luyện); khi tổng hợp
+# thời gian huấn luyện cần tách các bước này ra.
+# cpu_seconds là thời gian CPU của luồng chạy bước (không gồm các phiên khác, job nền hay tiến
+# trình con của joblib). max_rss_bytes là mức bộ nhớ cao nhất của cả tiến trình tới thời điểm đó
+# (dùng để chọn cỡ container); peak_memory_bytes là bộ nhớ đỉnh do Python cấp phát trong bước, đo
+# bằng tracemalloc (trace_peak) nên chỉ bật khi cần vì làm chậm xử lý. Các bước không lồng nhau được
+# đo chính xác nhất; bước lồng bên trong đặt lại mốc bộ nhớ đỉnh của bước ngoài.
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+LOG_PATH = os.environ.get("FINGUARD_METRICS_LOG", "logs/metrics.jsonl")
+
+_active = threading.local()
+_log_lock = threading.Lock()
+# tracemalloc là bộ đo chung của cả tiến trình: mỗi lúc chỉ một luồng được đo
+_trace_lock = threading.RLock()
+
+
+def max_rss_bytes():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả về KB, macOS trả về byte
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+# Đo bộ nhớ đỉnh (byte) do Python cấp phát trong đoạn mã bên trong; result[key] được điền khi kết thúc.
+# Khi luồng khác đang đo thì bỏ qua (không điền) thay vì đặt lại hay dừng phép đo của luồng đó.
+@contextlib.contextmanager
+def trace_peak(result, key):
+    if not _trace_lock.acquire(blocking=False):
+        yield
+        return
+    try:
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            result[key] = tracemalloc.get_traced_memory()[1] - baseline
+            if started:
+                tracemalloc.stop()
+    finally:
+        _trace_lock.release()
+
+
+class Recorder:
+    def __init__(self, page, session=None, trace_memory=False, log_path=LOG_PATH):
+        self.page = page
+        self.session = session
+        self.run = uuid.uuid4().hex[:12]
+        self.trace_memory = trace_memory
+        self.log_path = Path(log_path) if log_path else None
+        self.records = []
+        # Trường của các bước đang mở (trong cùng), để annotate() bổ sung khi đã biết kết quả
+        self._open = []
+
+    @contextlib.contextmanager
+    def stage(self, name, **fields):
+        fields = dict(fields)
+        self._open.append(fields)
+        memory = {}
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            with trace_peak(memory, "peak_memory_bytes") if self.trace_memory else contextlib.nullcontext():
+                yield
+        finally:
+            self._open.pop()
+            record = {
+                "time": datetime.now().isoformat(timespec="milliseconds"),
+                "page": self.page,
+                "session": self.session,
+                "run": self.run,
+                "stage": name,
+                "wall_seconds": time.perf_counter() - wall,
+                "cpu_seconds": time.thread_time() - cpu,
+                "max_rss_bytes": max_rss_bytes(),
+                **fields,
+                **memory,
+            }
+            self.records.append(record)
+            self._write(record)
+
+    def _write(self, record):
+        if self.log_path is None:
+            return
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with _log_lock:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as log:
+                log.write(line + "\n")
+
+
+# Kích hoạt Recorder cho luồng hiện tại (mỗi lần chạy trang là một luồng của Streamlit)
+def activate(recorder):
+    _active.recorder = recorder
+    return recorder
+
+
+def active():
+    return getattr(_active, "recorder", None)
+
+
+@contextlib.contextmanager
+def stage(name, **fields):
+    recorder = active()
+    if recorder is None:
+        yield
+        return
+    with recorder.stage(name, **fields):
+        yield
+
+
+# Thêm trường vào bước trong cùng đang mở, ví dụ annotate(cached=True) khi kết quả lấy từ bộ nhớ đệm
+def annotate(**fields):
+    recorder = active()
+    if recorder is not None and recorder._open:
+        recorder._open[-1].update(fields)
+
+
+# Bọc hàm thành một bước: @timed("fit")
+def timed(name):
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name, function=function.__name__):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
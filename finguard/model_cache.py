@@ -0,0 +1,286 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from finguard import analyses, metrics, registry
+from finguard.jobs import JobManager
+from finguard.metrics import timed
+from finguard.score_index import ScoreIndex
+
+# Số mô hình tối đa giữ trong bộ nhớ đệm (loại bỏ theo LRU)
+MAX_ENTRIES = 64
+# Chờ job nền ngắn hơn thời gian này thì không hiện thanh tiến độ
+PROGRESS_DELAY = 0.2
+
+_MISSING = object()
+
+
+# Dấu vân tay nội dung của ma trận đặc trưng (và nhãn nếu có)
+def fingerprint(*arrays):
+    h = hashlib.sha1()
+    for arr in arrays:
+        if isinstance(arr, (pd.DataFrame, pd.Series)):
+            if isinstance(arr, pd.DataFrame):
+                h.update("|".join(map(str, arr.columns)).encode())
+            h.update(pd.util.hash_pandas_object(arr, index=False).values.tobytes())
+        else:
+            arr = np.ascontiguousarray(arr)
+            h.update(f"{arr.shape}{arr.dtype}".encode())
+            h.update(arr.tobytes())
+    return h.hexdigest()
+
+
+class ModelCache:
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(kind, data_key, params):
+        return (kind, data_key, tuple(sorted((k, repr(v)) for k, v in params.items())))
+
+    # Trả về kết quả đã huấn luyện nếu có, ngược lại default (không huấn luyện).
+    # Bước đang đo (metrics) được đánh dấu cached để nhật ký tách lần dùng lại khỏi lần huấn luyện.
+    def get(self, kind, data_key, params, default=None):
+        key = self.key(kind, data_key, params)
+        with self._lock:
+            if key not in self._entries:
+                metrics.annotate(cached=False)
+                return default
+            metrics.annotate(cached=True)
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    # Trả về kết quả đã huấn luyện nếu có, ngược lại gọi fit_fn và lưu lại
+    def get_or_fit(self, kind, data_key, params, fit_fn):
+        key = self.key(kind, data_key, params)
+        with self._lock:
+            if key in self._entries:
+                metrics.annotate(cached=True)
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            metrics.annotate(cached=False)
+            self.misses += 1
+        result = fit_fn()
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def discard(self, kind, data_key, params):
+        with self._lock:
+            self._entries.pop(self.key(kind, data_key, params), None)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "max_entries": self.max_entries}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Bộ nhớ đệm dùng chung cho mọi phiên và mọi lần chạy lại trang
+@st.cache_resource
+def get_model_cache():
+    return ModelCache()
+
+
+# Hàng đợi job nền dùng chung cho mọi phiên, giới hạn số job chạy đồng thời
+@st.cache_resource
+def get_job_manager():
+    return JobManager()
+
+
+# Chờ job xong, hiện thanh tiến độ nếu lâu. Mỗi lần cập nhật thanh tiến độ là một lệnh Streamlit,
+# nên khi người dùng đổi tham số thì lần chạy trang này bị ngắt ngay thay vì chờ job xong.
+def wait_for_job(job):
+    if not job.wait(PROGRESS_DELAY):
+        manager = get_job_manager()
+        status = st.empty()
+        while not job.wait(0.25):
+            position = manager.queue_position(job)
+            if position:
+                text = f"{job.label}: đang chờ (thứ {position} trong hàng đợi, tối đa {manager.max_workers} job chạy cùng lúc)"
+            else:
+                text = f"{job.label}: đang chạy {job.elapsed():.0f} giây" + (f" ({job.message})" if job.message else "")
+            status.progress(job.progress or 0.0, text=text)
+        status.empty()
+    return job.result()
+
+
+# Lấy kết quả từ bộ nhớ đệm; nếu chưa có thì huấn luyện trong job nền (lưu vào bộ nhớ đệm khi xong,
+# kể cả khi phiên đã chuyển sang tham số khác) và chờ. Mỗi phiên giữ một job cho mỗi loại mô hình:
+# yêu cầu mới hủy job cũ còn trong hàng đợi; yêu cầu giống hệt từ phiên khác dùng chung job.
+def _get_or_fit_in_background(kind, data_key, params, fit_fn, label):
+    cache = get_model_cache()
+    result = cache.get(kind, data_key, params, _MISSING)
+    if result is not _MISSING:
+        return result
+    ctx = get_script_run_ctx()
+    job = get_job_manager().submit(
+        cache.key(kind, data_key, params),
+        lambda: cache.get_or_fit(kind, data_key, params, fit_fn),
+        owner=ctx.session_id if ctx is not None else None,
+        slot=kind,
+        label=label,
+    )
+    return wait_for_job(job)
+
+
+@timed("fit")
+def fit_isolation_forest(X, contamination, random_state=42, max_fit_rows=analyses.FIT_SAMPLE_ROWS):
+    params = {"contamination": contamination, "random_state": random_state, "max_fit_rows": max_fit_rows}
+    return _get_or_fit_in_background(
+        "isolation_forest",
+        fingerprint(X),
+        params,
+        lambda: analyses.fit_isolation_forest(X, contamination, random_state, max_fit_rows),
+        "Huấn luyện Isolation Forest",
+    )
+
+
+@timed("fit")
+def fit_isolation_forest_per_fund(X, funds, contamination, random_state=42):
+    params = {"contamination": contamination, "random_state": random_state}
+    # Số tiến trình lấy theo phần CPU cố định của job nền (jobs.threads_per_job)
+    return _get_or_fit_in_background(
+        "isolation_forest_per_fund",
+        fingerprint(X, funds),
+        params,
+        lambda: analyses.fit_isolation_forest_per_fund(X, funds, contamination, random_state),
+        "Huấn luyện Isolation Forest cho từng Quỹ",
+    )
+
+
+@timed("fit")
+def fit_linear_regression_per_fund(X, y, funds):
+    return _get_or_fit_in_background(
+        "linear_regression_per_fund", fingerprint(X, y, funds), {}, lambda: analyses.fit_linear_regression_per_fund(X, y, funds),
+        "Huấn luyện hồi quy tuyến tính cho từng Quỹ",
+    )
+
+
+@timed("fit")
+def fit_standard_scaler(X):
+    return _get_or_fit_in_background(
+        "standard_scaler", fingerprint(X), {}, lambda: analyses.fit_standard_scaler(X), "Chuẩn hóa dữ liệu"
+    )
+
+
+@timed("fit")
+def fit_logistic_regression(X, y, **params):
+    return _get_or_fit_in_background(
+        "logistic_regression", fingerprint(X, y), params, lambda: analyses.fit_logistic_regression(X, y, **params),
+        "Huấn luyện Logistic Regression",
+    )
+
+
+@timed("fit")
+def fit_linear_regression(X, y):
+    return _get_or_fit_in_background(
+        "linear_regression", fingerprint(X, y), {}, lambda: analyses.fit_linear_regression(X, y), "Huấn luyện hồi quy tuyến tính"
+    )
+
+
+# Các fold kiểm định chéo đã chia và chuẩn hóa, dùng lại khi chỉ đổi lưới C hoặc giới hạn thời gian
+def cv_folds(X, y, n_splits, random_state=42):
+    params = {"n_splits": n_splits, "random_state": random_state}
+    return _get_or_fit_in_background(
+        "cv_folds", fingerprint(X, y), params, lambda: analyses.cv_folds(X, y, n_splits, random_state), "Chia fold kiểm định chéo"
+    )
+
+
+# Kết quả dừng giữa chừng vì hết time_budget không được giữ lại: lần chạy sau (máy rảnh hơn)
+# được thử lại cả lưới thay vì nhận mãi kết quả thiếu
+@timed("fit")
+def tune_logistic_regression(X, y, C_grid, n_splits, time_budget, **params):
+    folds = cv_folds(X, y, n_splits)
+    data_key = fingerprint(X, y)
+    cv_params = {"C_grid": tuple(sorted(set(C_grid))), "n_splits": n_splits, "time_budget": time_budget, **params}
+    result = _get_or_fit_in_background(
+        "logistic_regression_cv", data_key, cv_params,
+        lambda: analyses.tune_logistic_regression(folds, C_grid, time_budget, **params),
+        "Kiểm định chéo Logistic Regression",
+    )
+    if not result.complete:
+        get_model_cache().discard("logistic_regression_cv", data_key, cv_params)
+    return result
+
+
+# Quét cảnh báo sớm toàn hệ thống trong job nền; warning giữ mô hình và tín hiệu của lần quét trước
+# nên chỉ các Quỹ có dữ liệu mới được tính lại. params: tham số đã dùng để tạo warning.
+@timed("sweep")
+def sweep_early_warning(warning, data, params):
+    return _get_or_fit_in_background(
+        "early_warning", fingerprint(data), params, lambda: warning.sweep(data), "Quét cảnh báo sớm toàn hệ thống"
+    )
+
+
+# Chỉ mục điểm đã sắp xếp, dựng một lần cho mỗi kết quả chấm điểm
+@timed("threshold")
+def score_index(scores):
+    return get_model_cache().get_or_fit("score_index", fingerprint(scores), {}, lambda: ScoreIndex(scores))
+
+
+# Hiển thị số lần trúng/trượt bộ nhớ đệm và hàng đợi job nền ở thanh bên
+def show_cache_stats():
+    stats = get_model_cache().stats()
+    jobs = get_job_manager().stats()
+    st.sidebar.caption(
+        f"Bộ nhớ đệm mô hình: {stats['hits']} lần dùng lại, {stats['misses']} lần huấn luyện, "
+        f"{stats['entries']}/{stats['max_entries']} mô hình. "
+        f"Job nền: {jobs['running']}/{jobs['max_workers']} đang chạy, {jobs['queued']} đang chờ, "
+        f"{jobs['deduplicated']} yêu cầu dùng chung, {jobs['cancelled']} bị hủy"
+    )
+
+
+# Chọn nguồn mô hình ở thanh bên: huấn luyện trên dữ liệu hiện tại hoặc nạp một phiên bản đã lưu.
+# Mặc định chọn phiên bản đã lưu được huấn luyện trên đúng dữ liệu và tham số hiện tại, nếu có.
+# Nếu có features, chỉ liệt kê các phiên bản được huấn luyện trên đúng các đặc trưng đó.
+# Trả về (artifacts, meta) của phiên bản được chọn hoặc None.
+def select_saved_model(name, data_key, params, features=None):
+    versions = [
+        meta["version"] for meta in registry.list_versions(name) if features is None or meta["features"] == list(features)
+    ]
+    matching = registry.find_version(name, data_key, params)
+    options = [None] + versions
+    version = st.sidebar.selectbox(
+        "Mô hình",
+        options,
+        index=options.index(matching) if matching else 0,
+        format_func=lambda v: "Huấn luyện trên dữ liệu hiện tại" if v is None else f"Phiên bản {v} đã lưu",
+        key=f"{name}_model_version",
+    )
+    if version is None:
+        return None
+    return registry.load_model(name, version)
+
+
+# Chấm điểm X bằng một phiên bản đã lưu, kết quả được giữ trong bộ nhớ đệm như khi huấn luyện
+@timed("score")
+def score_saved_model(saved, X, score_fn):
+    _, meta = saved
+    return _get_or_fit_in_background(
+        f"{meta['name']}@{meta['version']}", fingerprint(X), {}, score_fn, f"Chấm điểm bằng phiên bản {meta['version']}"
+    )
+
+
+def save_model_button(name, artifacts, features, data_key, params=None, model_metrics=None):
+    if st.sidebar.button("Lưu mô hình vào kho", key=f"{name}_save_model"):
+        meta = registry.save_model(name, artifacts, features, data_key, params=params, metrics=model_metrics)
+        st.sidebar.success(f"Đã lưu phiên bản {meta['version']} vào {registry.MODEL_DIR}/{name}")
@@ -0,0 +1,186 @@
+# Biểu đồ dùng chung, tự đổi cách vẽ theo số điểm dữ liệu.
+#
+# - Ít điểm: vẽ từng điểm và ghi tên mọi Quỹ như trước.
+# - Nhiều điểm (> DENSITY_THRESHOLD): nền là mật độ hexbin của toàn bộ dữ liệu, chỉ vẽ đè các
+#   điểm bị gắn cờ (tối đa MAX_HIGHLIGHTS) và chỉ ghi tên TOP_K_LABELS điểm nổi bật nhất.
+# - Trục theo từng Quỹ/từng tháng được thay bằng biểu đồ tổng hợp (phân phối, trung bình theo tháng).
+#
+# Các hàm vẽ không dùng Streamlit và không dùng trạng thái chung của pyplot, trả về Figure.
+# matplotlib và seaborn chỉ được import khi vẽ (nạp mất khoảng hai giây); ảnh đã vẽ được
+# finguard.widgets ghi nhớ nên các lần chạy lại không cần tới chúng.
+import io
+
+import numpy as np
+import pandas as pd
+
+DENSITY_THRESHOLD = 2_000
+LABEL_ALL_THRESHOLD = 50
+# Trên ngưỡng này không ghi nhãn trục cho từng Quỹ/từng tháng (mỗi nhãn tốn thời gian vẽ)
+TICK_THRESHOLD = 100
+MAX_TICKS = 20
+TOP_K_LABELS = 20
+MAX_HIGHLIGHTS = 1_000
+HEXBIN_GRIDSIZE = 60
+
+
+def to_png(fig, dpi=200):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=dpi, bbox_inches="tight")
+    return buffer.getvalue()
+
+
+def _new_axes(figsize):
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    return fig, fig.subplots()
+
+
+def is_large(frame):
+    return len(frame) > DENSITY_THRESHOLD
+
+
+# Vị trí k dòng nổi bật nhất: trong các dòng bị gắn cờ (hoặc tất cả nếu không có dòng nào),
+# xếp theo priority giảm dần; lowest_first đảo chiều (ví dụ điểm bất thường càng thấp càng nổi bật)
+def top_positions(flagged, priority, k, lowest_first=False):
+    priority = np.asarray(priority, dtype=float)
+    if lowest_first:
+        priority = -priority
+    priority = np.where(np.isnan(priority), -np.inf, priority)
+    candidates = np.flatnonzero(flagged)
+    if len(candidates) == 0:
+        candidates = np.arange(len(priority))
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(-priority[candidates], k - 1)[:k]]
+    return candidates[np.argsort(-priority[candidates], kind="stable")]
+
+
+def _hue_kwargs(frame, hue):
+    if pd.api.types.is_numeric_dtype(frame[hue]):
+        return {"hue_norm": (frame[hue].min(), frame[hue].max())}
+    return {"hue_order": sorted(frame[hue].dropna().unique())}
+
+
+def _label_points(ax, frame, positions, x, y, label, offset):
+    rows = frame.iloc[positions]
+    for x_value, y_value, text in zip(rows[x], rows[y], rows[label]):
+        ax.text(x_value + offset, y_value, text, fontsize=9)
+
+
+# Trục là thứ tự dòng; chỉ ghi nhãn (tháng) ở tối đa MAX_TICKS vị trí
+def _sparse_ticks(ax, labels):
+    from matplotlib.ticker import FuncFormatter, MaxNLocator
+
+    labels = np.asarray(labels, dtype=str)
+    ax.xaxis.set_major_locator(MaxNLocator(MAX_TICKS, integer=True))
+    ax.xaxis.set_major_formatter(FuncFormatter(lambda value, _: labels[int(value)] if 0 <= value < len(labels) else ""))
+
+
+def _set_labels(ax, title, xlabel, ylabel):
+    ax.set_title(title)
+    if xlabel is not None:
+        ax.set_xlabel(xlabel)
+    if ylabel is not None:
+        ax.set_ylabel(ylabel)
+
+
+# Biểu đồ phân tán rủi ro: dòng bị gắn cờ khi flag_column == flag_value, mức nổi bật theo priority_column
+def risk_scatter(
+    frame, x, y, hue, label, flag_column, flag_value, priority_column, title,
+    lowest_first=False, size=None, palette="coolwarm", xlabel=None, ylabel=None, legend_title=None, label_offset=0.5,
+):
+    import seaborn as sns
+
+    fig, ax = _new_axes((10, 6))
+    flagged = (frame[flag_column] == flag_value).to_numpy()
+    if not is_large(frame):
+        sizes = {"size": size, "sizes": (50, 200)} if size is not None else {"s": 100, "alpha": 1.0}
+        sns.scatterplot(x=x, y=y, hue=hue, data=frame, palette=palette, ax=ax, **sizes)
+        labelled = np.arange(len(frame)) if len(frame) <= LABEL_ALL_THRESHOLD else top_positions(flagged, frame[priority_column], TOP_K_LABELS, lowest_first)
+        _label_points(ax, frame, labelled, x, y, label, label_offset)
+    else:
+        ax.hexbin(frame[x], frame[y], gridsize=HEXBIN_GRIDSIZE, bins="log", cmap="Greys", mincnt=1)
+        highlighted = top_positions(flagged, frame[priority_column], MAX_HIGHLIGHTS, lowest_first) if flagged.any() else []
+        sns.scatterplot(x=x, y=y, hue=hue, data=frame.iloc[highlighted], palette=palette, s=30, ax=ax, **_hue_kwargs(frame, hue))
+        _label_points(ax, frame, top_positions(flagged, frame[priority_column], TOP_K_LABELS, lowest_first), x, y, label, label_offset)
+        title = f"{title} ({len(frame):,} điểm; nền: mật độ, điểm màu: {min(int(flagged.sum()), MAX_HIGHLIGHTS):,} điểm bị gắn cờ)"
+    _set_labels(ax, title, xlabel, ylabel)
+    if legend_title is not None and ax.get_legend() is not None:
+        ax.legend(title=legend_title)
+    return fig
+
+
+# Giá trị của từng Quỹ so với ngưỡng; nhiều Quỹ thì vẽ phân phối giá trị thay vì một cột mỗi Quỹ
+def threshold_chart(frame, x, y, hue, threshold, threshold_label, title, ylabel):
+    import seaborn as sns
+
+    fig, ax = _new_axes((10, 5))
+    if len(frame) <= TICK_THRESHOLD:
+        sns.scatterplot(x=x, y=y, hue=hue, data=frame, ax=ax, palette="coolwarm", s=100, alpha=1.0)
+        ax.axhline(y=threshold, color="r", linestyle="--", label=threshold_label)
+        ax.tick_params(axis="x", rotation=45)
+        ax.set_ylabel(ylabel)
+        ax.legend()
+    else:
+        # histplot tự tạo chú thích theo hue; đường ngưỡng được ghi chú trực tiếp trên trục
+        sns.histplot(x=y, hue=hue, data=frame, ax=ax, palette="coolwarm", bins=50, multiple="stack")
+        ax.axvline(x=threshold, color="r", linestyle="--")
+        ax.annotate(threshold_label, (threshold, 1), xycoords=("data", "axes fraction"), xytext=(4, -12), textcoords="offset points", color="r")
+        ax.set_xlabel(ylabel)
+        ax.set_ylabel("Số Quỹ")
+        title = f"{title} (phân phối {len(frame):,} Quỹ)"
+    ax.set_title(title)
+    return fig
+
+
+# Giá trị theo thời gian, điểm bất thường tô màu theo flag_column (-1/1)
+def timeline_scatter(frame, y, flag_column, tick_column, title, xlabel, ylabel):
+    fig, ax = _new_axes((10, 6))
+    if len(frame) <= TICK_THRESHOLD:
+        ax.scatter(frame.index, frame[y], c=frame[flag_column], cmap="coolwarm", vmin=-1, vmax=1, s=100)
+        ax.set_xticks(frame.index)
+        ax.set_xticklabels(frame[tick_column], rotation=45)
+        _set_labels(ax, title, xlabel, ylabel)
+        return fig
+    positions = np.arange(len(frame))
+    _sparse_ticks(ax, frame[tick_column])
+    if not is_large(frame):
+        ax.scatter(positions, frame[y], c=frame[flag_column], cmap="coolwarm", vmin=-1, vmax=1, s=30)
+    else:
+        ax.hexbin(positions, frame[y], gridsize=HEXBIN_GRIDSIZE, bins="log", cmap="Greys", mincnt=1)
+        flagged = (frame[flag_column] == -1).to_numpy()
+        highlighted = top_positions(flagged, frame[y].abs(), MAX_HIGHLIGHTS) if flagged.any() else []
+        ax.scatter(positions[highlighted], frame[y].to_numpy()[highlighted], c="tab:red", s=20)
+        title = f"{title} ({len(frame):,} điểm; nền: mật độ, điểm đỏ: bất thường)"
+    _set_labels(ax, title, xlabel, ylabel)
+    return fig
+
+
+# Thực tế và dự đoán theo tháng; dữ liệu nhiều Quỹ (hoặc rất dài) được gộp thành trung bình
+# theo tháng kèm dải phân vị 10%-90% của giá trị thực tế
+def actual_vs_predicted(frame, x, actual, predicted, threshold, title, xlabel, ylabel):
+    fig, ax = _new_axes((10, 6))
+    if len(frame) <= TICK_THRESHOLD and not frame[x].duplicated().any():
+        ax.plot(frame[x], frame[actual], "b-o", label="Thực tế")
+        ax.plot(frame[x], frame[predicted], "g--o", label="Dự đoán")
+    else:
+        grouped = frame.groupby(x, sort=False, observed=True)
+        means = grouped[[actual, predicted]].mean()
+        band = grouped[actual].quantile([0.1, 0.9]).unstack()
+        labels = means.index
+        if len(means) > DENSITY_THRESHOLD:
+            # Chuỗi rất dài: gộp các tháng liền nhau để số điểm vẽ không vượt DENSITY_THRESHOLD
+            buckets = np.arange(len(means)) // -(-len(means) // DENSITY_THRESHOLD)
+            means, band = means.groupby(buckets).mean(), band.groupby(buckets).agg({0.1: "min", 0.9: "max"})
+            labels = labels[np.unique(buckets, return_index=True)[1]]
+        positions = np.arange(len(means))
+        _sparse_ticks(ax, labels)
+        ax.fill_between(positions, band[0.1], band[0.9], color="b", alpha=0.15, label="Thực tế (10%-90%)")
+        ax.plot(positions, means[actual], "b-", label="Thực tế (trung bình)")
+        ax.plot(positions, means[predicted], "g--", label="Dự đoán (trung bình)")
+        title = f"{title} (trung bình theo tháng của {len(frame):,} dòng)"
+    ax.axhline(y=threshold, color="r", linestyle="--", label=f"Ngưỡng ({threshold}%)")
+    ax.legend()
+    _set_labels(ax, title, xlabel, ylabel)
+    ax.tick_params(axis="x", rotation=45)
+    return fig
@@ -0,0 +1,104 @@
+# Kho mô hình cục bộ trên đĩa, có phiên bản.
+#
+#   models/<tên>/<phiên bản>/artifacts.joblib   các đối tượng đã huấn luyện (scaler, mô hình)
+#   models/<tên>/<phiên bản>/meta.json          đặc trưng, dấu vân tay dữ liệu huấn luyện, tham số, chỉ số
+#
+# Mảng NumPy trong artifacts được nạp bằng memory-map nên nạp lại gần như tức thì
+# và nhiều tiến trình dùng chung một bản trên đĩa.
+import functools
+import json
+import os
+import time
+from pathlib import Path
+
+
+MODEL_DIR = os.environ.get("FINGUARD_MODEL_DIR", "models")
+
+
+def _model_dir(name, root=None):
+    return Path(root or MODEL_DIR) / name
+
+
+# Chuẩn hóa tham số về dạng JSON để so sánh với tham số đã lưu
+def normalize_params(params):
+    return json.loads(json.dumps(params or {}, sort_keys=True, default=str))
+
+
+def list_versions(name, root=None):
+    directory = _model_dir(name, root)
+    if not directory.is_dir():
+        return []
+    versions = []
+    for meta_path in sorted(directory.glob("*/meta.json")):
+        with open(meta_path, encoding="utf-8") as f:
+            versions.append(json.load(f))
+    return sorted(versions, key=lambda meta: meta["version"])
+
+
+def save_model(name, artifacts, features, fingerprint, params=None, metrics=None, root=None):
+    import joblib
+    import sklearn
+
+    directory = _model_dir(name, root)
+    directory.mkdir(parents=True, exist_ok=True)
+    existing = [int(p.name) for p in directory.iterdir() if p.is_dir() and p.name.isdigit()]
+    version = max(existing, default=0) + 1
+    # Hai lần lưu cùng lúc có thể chọn cùng số phiên bản: mkdir không ghi đè thư mục đã có, nên lần
+    # tạo sau thử số tiếp theo
+    while True:
+        version_dir = directory / f"{version:04d}"
+        try:
+            version_dir.mkdir()
+            break
+        except FileExistsError:
+            version += 1
+    # Không nén để có thể nạp bằng memory-map
+    joblib.dump(artifacts, version_dir / "artifacts.joblib")
+    meta = {
+        "name": name,
+        "version": version,
+        "features": list(features),
+        "fingerprint": fingerprint,
+        "params": normalize_params(params),
+        "metrics": normalize_params(metrics),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "sklearn_version": sklearn.__version__,
+    }
+    # meta.json được ghi sau cùng và đổi tên một lần, để list_versions không đọc phiên bản dở dang
+    tmp_path = version_dir / "meta.json.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    tmp_path.replace(version_dir / "meta.json")
+    return meta
+
+
+# Mỗi phiên bản chỉ được nạp từ đĩa một lần trong mỗi tiến trình
+@functools.lru_cache(maxsize=32)
+def _load_version(name, version, root):
+    import joblib
+
+    version_dir = _model_dir(name, root) / f"{version:04d}"
+    with open(version_dir / "meta.json", encoding="utf-8") as f:
+        meta = json.load(f)
+    return joblib.load(version_dir / "artifacts.joblib", mmap_mode="r"), meta
+
+
+# Trả về (artifacts, meta); phiên bản None = mới nhất
+def load_model(name, version=None, root=None):
+    versions = [meta["version"] for meta in list_versions(name, root)]
+    if not versions:
+        raise FileNotFoundError(f"Chưa có mô hình '{name}' trong kho {Path(root or MODEL_DIR)}")
+    if version is None:
+        version = versions[-1]
+    elif version not in versions:
+        raise FileNotFoundError(f"Không có phiên bản {version} của mô hình '{name}'")
+    return _load_version(name, version, root)
+
+
+# Phiên bản mới nhất được huấn luyện trên đúng dữ liệu và tham số này (nếu có)
+def find_version(name, fingerprint, params=None, root=None):
+    params = normalize_params(params)
+    for meta in reversed(list_versions(name, root)):
+        if meta["fingerprint"] == fingerprint and meta["params"] == params:
+            return meta["version"]
+    return None
@@ -0,0 +1,147 @@
+# Bộ quy tắc tuân thủ khai báo dạng dữ liệu, đánh giá vector hóa trên toàn bộ bảng.
+#
+# Mỗi quy tắc là một tỷ lệ (tử số / mẫu số * 100) so với ngưỡng tối thiểu (">=")
+# hoặc tối đa ("<="). Tử số/mẫu số là tên cột hoặc tuple các cột được cộng lại.
+# Các quy tắc được biên dịch thành ma trận (dòng x quy tắc) và đánh giá trong
+# một lượt NumPy; kết quả là mặt nạ bit vi phạm cho từng dòng và số vi phạm theo quy tắc.
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+Rule = namedtuple("Rule", ["code", "name", "numerator", "denominator", "op", "threshold"])
+
+# Các tỷ lệ an toàn tham khảo theo quy định của Ngân hàng Nhà nước đối với Quỹ tín dụng nhân dân.
+# Ngưỡng là giá trị mặc định, người dùng có thể điều chỉnh trên trang.
+DEFAULT_RULES = [
+    Rule("CAR", "Tỷ lệ an toàn vốn", "Vốn chủ sở hữu", "Tài sản có rủi ro", ">=", 8.0),
+    Rule("NPL", "Tỷ lệ nợ xấu", "Nợ xấu", "Tổng dư nợ", "<=", 3.0),
+    Rule("OVERDUE", "Tỷ lệ nợ quá hạn", "Nợ quá hạn", "Tổng dư nợ", "<=", 5.0),
+    Rule("LIQ_RESERVE", "Tỷ lệ dự trữ thanh khoản", "Tài sản có tính thanh khoản cao", "Tổng nợ phải trả", ">=", 10.0),
+    Rule("SOLVENCY_30D", "Khả năng chi trả trong 30 ngày", "Tài sản thanh khoản 30 ngày", "Nợ phải trả 30 ngày", ">=", 50.0),
+    Rule("CASH", "Tỷ lệ tiền mặt trên nợ ngắn hạn", "Tiền mặt", "Nợ ngắn hạn", ">=", 10.0),
+    Rule("LDR", "Tỷ lệ dư nợ cho vay so với tổng tiền gửi", "Tổng dư nợ", "Tổng tiền gửi", "<=", 100.0),
+    Rule("ST_FOR_LT", "Tỷ lệ vốn ngắn hạn cho vay trung, dài hạn", "Vốn ngắn hạn cho vay trung dài hạn", "Tiền gửi ngắn hạn", "<=", 30.0),
+    Rule("SINGLE_BORROWER", "Giới hạn cho vay một khách hàng", "Dư nợ khách hàng lớn nhất", "Vốn chủ sở hữu", "<=", 15.0),
+    Rule("RELATED_PARTY", "Giới hạn cho vay bên liên quan", "Dư nợ bên liên quan", "Vốn chủ sở hữu", "<=", 15.0),
+    Rule("TOP10_BORROWERS", "Tập trung dư nợ 10 khách hàng lớn nhất", "Dư nợ 10 khách hàng lớn nhất", "Tổng dư nợ", "<=", 30.0),
+    Rule("FIXED_ASSETS", "Tỷ lệ đầu tư tài sản cố định", "Tài sản cố định", "Vốn chủ sở hữu", "<=", 50.0),
+    Rule("BORROWED_FUNDS", "Tỷ lệ vốn vay trên tổng nguồn vốn", "Vốn vay", ("Tổng tiền gửi", "Vốn vay", "Vốn chủ sở hữu"), "<=", 30.0),
+    Rule("LEVERAGE", "Vốn chủ sở hữu trên tổng tài sản", "Vốn chủ sở hữu", "Tổng tài sản", ">=", 5.0),
+    Rule("PROVISION", "Tỷ lệ trích lập dự phòng trên nợ xấu", "Dự phòng rủi ro", "Nợ xấu", ">=", 100.0),
+]
+
+# Số dòng xử lý mỗi lượt để giới hạn bộ nhớ của ma trận trung gian
+CHUNK_SIZE = 1_000_000
+
+
+# Kết quả đánh giá: bit thứ i của bitmask ứng với quy tắc thứ i trong danh sách truyền vào
+class RuleResult:
+    def __init__(self, rules, positions, skipped, ratios, violations, bitmask):
+        self.rules = rules
+        self.positions = positions
+        self.skipped = skipped
+        self.ratios = ratios
+        self.violations = violations
+        self.bitmask = bitmask
+
+    def _column(self, code):
+        for i, rule in enumerate(self.rules):
+            if rule.code == code:
+                return i
+        raise KeyError(code)
+
+    def compliant(self, code):
+        return ~self.violations[:, self._column(code)]
+
+    def ratio(self, code):
+        return self.ratios[:, self._column(code)]
+
+    @property
+    def counts(self):
+        return pd.DataFrame({
+            "Bit": self.positions,
+            "Mã": [rule.code for rule in self.rules],
+            "Quy tắc": [rule.name for rule in self.rules],
+            "Điều kiện": [f"{rule.op} {rule.threshold:g}%" for rule in self.rules],
+            "Số vi phạm": self.violations.sum(axis=0),
+        })
+
+
+def _columns(spec):
+    return (spec,) if isinstance(spec, str) else tuple(spec)
+
+
+def _operand(frame, spec):
+    values = frame[list(_columns(spec))].to_numpy(dtype=float)
+    return values.sum(axis=1)
+
+
+# Tỷ lệ (%) của một quy tắc trên khối bắt đầu ở dòng start; dùng tỷ lệ đã tính sẵn nếu có
+def _ratio(chunk, rule, start, known):
+    key = (rule.numerator, rule.denominator)
+    if key in known:
+        return np.asarray(known[key], dtype=float)[start : start + len(chunk)]
+    return _operand(chunk, rule.numerator) / _operand(chunk, rule.denominator) * 100
+
+
+# Tất cả các cột mà các quy tắc có thể cần
+def rule_columns(rules):
+    return list(dict.fromkeys(c for rule in rules for spec in (rule.numerator, rule.denominator) for c in _columns(spec)))
+
+
+# Tách các quy tắc đánh giá được (đủ cột, kèm vị trí bit) và các quy tắc bị bỏ qua
+def applicable_rules(rules, columns):
+    columns = set(columns)
+    active, positions, skipped = [], [], []
+    for position, rule in enumerate(rules):
+        needed = set(_columns(rule.numerator)) | set(_columns(rule.denominator))
+        if needed.issubset(columns):
+            active.append(rule)
+            positions.append(position)
+        else:
+            skipped.append(rule)
+    return active, positions, skipped
+
+
+# Thay ngưỡng của các quy tắc theo mã, ví dụ {"CAR": 9.0}
+def with_thresholds(rules, thresholds):
+    return [rule._replace(threshold=float(thresholds.get(rule.code, rule.threshold))) for rule in rules]
+
+
+# known: {(tử số, mẫu số): tỷ lệ (%) của mọi dòng} đã tính ở nơi khác (ví dụ đặc trưng dùng chung),
+# để quy tắc cùng tử số và mẫu số không tính lại từ cột gốc
+def evaluate(frame, rules=DEFAULT_RULES, chunk_size=CHUNK_SIZE, known=None):
+    if len(rules) > 64:
+        raise ValueError("Mặt nạ bit chỉ hỗ trợ tối đa 64 quy tắc")
+    known = known or {}
+    rules, positions, skipped = applicable_rules(rules, frame.columns)
+    n = len(frame)
+    thresholds = np.array([rule.threshold for rule in rules], dtype=float)
+    # +1: ngưỡng tối thiểu (vi phạm khi tỷ lệ < ngưỡng), -1: ngưỡng tối đa (vi phạm khi tỷ lệ > ngưỡng)
+    signs = np.array([1.0 if rule.op == ">=" else -1.0 for rule in rules])
+    weights = np.left_shift(np.uint64(1), np.array(positions, dtype=np.uint64))
+
+    ratios = np.empty((n, len(rules)))
+    violations = np.empty((n, len(rules)), dtype=bool)
+    bitmask = np.zeros(n, dtype=np.uint64)
+    for start in range(0, max(n, 1), chunk_size):
+        chunk = frame.iloc[start : start + chunk_size]
+        if rules and len(chunk):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                chunk_ratios = np.column_stack([_ratio(chunk, rule, start, known) for rule in rules])
+            # Tỷ lệ không xác định (NaN, ví dụ 0/0) được tính là vi phạm
+            chunk_violations = ~((chunk_ratios - thresholds) * signs >= 0)
+            ratios[start : start + len(chunk)] = chunk_ratios
+            violations[start : start + len(chunk)] = chunk_violations
+            bitmask[start : start + len(chunk)] = (chunk_violations * weights).sum(axis=1, dtype=np.uint64)
+    return RuleResult(rules, positions, skipped, ratios, violations, bitmask)
+
+
+def rules_to_frame(rules):
+    return pd.DataFrame({
+        "Mã": [rule.code for rule in rules],
+        "Quy tắc": [rule.name for rule in rules],
+        "Điều kiện": [rule.op for rule in rules],
+        "Ngưỡng (%)": [rule.threshold for rule in rules],
+    })
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+
+# Chỉ mục điểm đã sắp xếp: đếm/lọc theo ngưỡng bằng tìm kiếm nhị phân thay vì quét toàn bộ bảng
+class ScoreIndex:
+    def __init__(self, scores):
+        scores = np.asarray(scores, dtype=float)
+        self.size = len(scores)
+        self.order = np.argsort(scores, kind="stable")
+        self.sorted_scores = scores[self.order]
+
+    # Số dòng có điểm < threshold
+    def count_below(self, threshold):
+        return int(np.searchsorted(self.sorted_scores, threshold, side="left"))
+
+    # Vị trí (theo thứ tự dòng gốc) các dòng có điểm < threshold, điểm thấp nhất trước
+    def below(self, threshold):
+        return self.order[: self.count_below(threshold)]
+
+    # Cột cờ 0/1 cho toàn bộ bảng
+    def flags(self, threshold):
+        flags = np.zeros(self.size, dtype=int)
+        flags[self.below(threshold)] = 1
+        return flags
+
+    # Đường cong số dòng bị gắn cờ theo ngưỡng, dùng để vẽ cạnh thanh trượt
+    def curve(self, low, high, num=101):
+        thresholds = np.linspace(low, high, num)
+        counts = np.searchsorted(self.sorted_scores, thresholds, side="left")
+        return pd.DataFrame({"Ngưỡng": thresholds, "Số dòng bị gắn cờ": counts}).set_index("Ngưỡng")
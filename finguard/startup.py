@@ -0,0 +1,93 @@
+# Đo thời gian khởi động nguội của từng trang và so với ngân sách.
+#
+#   python -m finguard.startup
+#   python -m finguard.startup --page Home.py -r 5
+#
+# Mỗi lần đo chạy trang (với dữ liệu mẫu) trong một tiến trình Python mới, như lần mở trang đầu
+# tiên trên một bản sao vừa khởi động: thời gian tính từ lúc bắt đầu chạy trang (không gồm nạp
+# Streamlit) tới khi trang chạy xong, kèm các thư viện nặng đã bị nạp. Lấy thời gian nhỏ nhất
+# qua --repeat lần; trang nào vượt ngân sách nhân --scale thì lệnh trả về mã lỗi 1.
+# --warm nạp trước thư viện nặng (finguard.warmup) trước khi bắt đầu đo, như khi trang được mở
+# sau Home.py.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Ngân sách khởi động nguội (giây). Các trang huấn luyện mô hình và vẽ biểu đồ trên dữ liệu mẫu
+# nên phải nạp sklearn/matplotlib/seaborn; các trang trong LIGHT_PAGES không được nạp thư viện nặng.
+STARTUP_BUDGETS = {
+    "Home.py": 1.0,
+    "pages/Biến động bất thường.py": 4.0,
+    "pages/Cảnh báo sớm toàn hệ thống.py": 4.0,
+    "pages/Khả năng thanh toán.py": 4.0,
+    "pages/Mức độ rủi ro tín dụng.py": 4.0,
+    "pages/Thất thoát tài sản.py": 4.0,
+    "pages/Tuân thủ quy định.py": 4.0,
+}
+LIGHT_PAGES = ("Home.py",)
+# pyarrow không có ở đây vì Streamlit luôn nạp nó để hiển thị bảng
+HEAVY_PACKAGES = ("sklearn", "matplotlib", "seaborn", "scipy", "joblib")
+
+# Chạy trong tiến trình con: argv[1] là đường dẫn trang, argv[3] == "1" là nạp trước
+_CHILD = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+
+if sys.argv[3] == "1":
+    from finguard import warmup
+    warmup.warm_up()
+
+started = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=300).run()
+seconds = time.perf_counter() - started
+heavy = sorted({name.split(".")[0] for name in sys.modules} & set(sys.argv[2].split(",")))
+print(json.dumps({"seconds": seconds, "heavy": heavy, "errors": [str(e.value) for e in at.exception]}))
+"""
+
+
+def measure(page, repeat=3, warm=False):
+    env = dict(os.environ, FINGUARD_WARMUP="0")
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # Không ghi nhật ký đo của các lần chạy thử vào nhật ký thật
+        env["FINGUARD_METRICS_LOG"] = str(Path(tmp) / "metrics.jsonl")
+        for _ in range(repeat):
+            output = subprocess.run(
+                [sys.executable, "-c", _CHILD, page, ",".join(HEAVY_PACKAGES), "1" if warm else "0"],
+                cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+            ).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+    best = min(runs, key=lambda run: run["seconds"])
+    return {"page": page, "seconds": best["seconds"], "heavy": best["heavy"], "errors": best["errors"]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đo thời gian khởi động nguội của từng trang")
+    parser.add_argument("-p", "--page", action="append", choices=sorted(STARTUP_BUDGETS), help="Chỉ đo trang này (có thể lặp lại)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Số lần lặp, lấy thời gian nhỏ nhất")
+    parser.add_argument("--warm", action="store_true", help="Nạp trước thư viện nặng như sau khi mở Home.py")
+    parser.add_argument("--scale", type=float, default=1.0, help="Nhân ngân sách với hệ số này (máy chậm hơn)")
+    args = parser.parse_args(argv)
+
+    over_budget = False
+    for page in args.page or STARTUP_BUDGETS:
+        result = measure(page, args.repeat, args.warm)
+        budget = STARTUP_BUDGETS[page] * args.scale
+        heavy_loaded = page in LIGHT_PAGES and result["heavy"] and not args.warm
+        status = "OK" if result["seconds"] <= budget and not result["errors"] and not heavy_loaded else "VƯỢT"
+        over_budget |= status != "OK"
+        heavy = ", ".join(result["heavy"]) or "không"
+        print(f"{status:5} {page}: {result['seconds']:.2f}s / {budget:.2f}s; thư viện nặng đã nạp: {heavy}")
+        for error in result["errors"]:
+            print(f"      lỗi: {error}", file=sys.stderr)
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
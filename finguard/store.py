@@ -0,0 +1,375 @@
+# Kho dữ liệu lịch sử cục bộ (SQLite), chỉ thêm dòng, có chỉ mục theo Quỹ và Tháng.
+#
+#   python -m finguard.store append lich_su du_lieu/2023.csv du_lieu/2024.parquet
+#   python -m finguard.store list
+#   python -m finguard.store query lich_su --fund "Quỹ 12" --last 24 -o quy_12.csv
+#
+# - Mỗi bộ dữ liệu là một bảng; Quỹ và Tháng được lưu thành mã số nguyên (bảng funds/periods)
+#   với chỉ mục (Quỹ, Tháng) và (Tháng, Quỹ), nên đọc "Quỹ X trong 24 tháng gần nhất" hay
+#   "mọi Quỹ trong tháng P" chỉ duyệt đúng các dòng đó, không phụ thuộc độ dài lịch sử.
+# - Các tháng được xếp theo thời gian đọc từ nhãn (lưu cùng nhãn trong bảng periods), không theo thứ tự
+#   thêm vào; nếu có nhãn không đọc được thì dùng thứ tự xuất hiện lần đầu khi thêm dữ liệu.
+# - Thêm dữ liệu chỉ nối dòng mới; cột mới được thêm vào bảng, cột thiếu để trống. Một file đã
+#   thêm (cùng nội dung) được bỏ qua nếu thêm lại.
+# - Chỉ đọc các cột được yêu cầu; kết quả có cùng dạng với finguard.ingest.read_table
+#   (Quỹ/Tháng categorical, cột số kiểu gọn), xếp theo Quỹ rồi Tháng.
+# Đổi vị trí file bằng biến môi trường FINGUARD_STORE.
+import argparse
+import contextlib
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from finguard.features import FUND_COLUMN, MONTH_COLUMN, period_key
+from finguard.ingest import CHUNK_SIZE, compact, export_bytes, is_parquet, iter_csv_chunks, iter_parquet_chunks
+
+STORE_PATH = os.environ.get("FINGUARD_STORE", "data/finguard.sqlite")
+
+# Các file kho đã được kiểm tra cột key của bảng periods trong tiến trình này
+_migrated = set()
+_migrated_lock = threading.Lock()
+
+# Thông tin một bộ dữ liệu: số dòng (tăng sau mỗi lần thêm nên dùng làm phiên bản), các cột dữ liệu,
+# số Quỹ và danh sách Tháng theo thứ tự
+StoreInfo = namedtuple("StoreInfo", "name rows columns funds periods")
+# Lát dữ liệu cần đọc: funds là tuple tên Quỹ (rỗng là tất cả); start/end là Tháng đầu/cuối;
+# last_periods là số Tháng gần nhất (ưu tiên hơn start/end)
+StoreQuery = namedtuple("StoreQuery", "name columns funds start end last_periods", defaults=(None, (), None, None, None))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS datasets (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, rows INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE IF NOT EXISTS funds (dataset INTEGER NOT NULL, id INTEGER NOT NULL, label TEXT NOT NULL, PRIMARY KEY (dataset, id));
+CREATE TABLE IF NOT EXISTS periods (dataset INTEGER NOT NULL, id INTEGER NOT NULL, label TEXT NOT NULL, key INTEGER, PRIMARY KEY (dataset, id));
+CREATE TABLE IF NOT EXISTS ingests (dataset INTEGER NOT NULL, source TEXT NOT NULL, rows INTEGER NOT NULL, appended_at TEXT NOT NULL, PRIMARY KEY (dataset, source));
+"""
+
+
+def _quote(identifier):
+    return '"' + str(identifier).replace('"', '""') + '"'
+
+
+def _table(dataset_id):
+    return f"rows_{dataset_id}"
+
+
+# Mở kết nối (mỗi lần gọi một kết nối, dùng được từ nhiều luồng/tiến trình).
+# create=False: trả về None nếu kho chưa có, để các trang chỉ đọc không tạo file.
+@contextlib.contextmanager
+def connect(path=None, create=True):
+    path = Path(path or STORE_PATH)
+    if not create and not path.exists():
+        yield None
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(path)
+    try:
+        # WAL: các trang vẫn đọc được trong lúc đang thêm dữ liệu
+        con.execute("PRAGMA journal_mode=WAL")
+        con.executescript(_SCHEMA)
+        with con:
+            with _migrated_lock:
+                if path.resolve() not in _migrated:
+                    _add_period_keys(con)
+                    _migrated.add(path.resolve())
+            yield con
+    finally:
+        con.close()
+
+
+# Kho tạo trước khi có khóa thời gian của Tháng: thêm cột key và đọc khóa từ các nhãn đã lưu
+def _add_period_keys(con):
+    if "key" in {row[1] for row in con.execute("PRAGMA table_info(periods)")}:
+        return
+    con.execute("ALTER TABLE periods ADD COLUMN key INTEGER")
+    labels = con.execute("SELECT dataset, id, label FROM periods").fetchall()
+    con.executemany("UPDATE periods SET key = ? WHERE dataset = ? AND id = ?", [(period_key(label), d, i) for d, i, label in labels])
+
+
+# con là None khi kho chưa có file (connect(create=False))
+def _dataset_id(con, name, create=False):
+    row = None if con is None else con.execute("SELECT id FROM datasets WHERE name = ?", (name,)).fetchone()
+    if row is not None:
+        return row[0]
+    if not create:
+        raise KeyError(f"Không có bộ dữ liệu '{name}' trong kho {STORE_PATH}")
+    dataset_id = con.execute("INSERT INTO datasets (name) VALUES (?)", (name,)).lastrowid
+    table = _table(dataset_id)
+    con.execute(f"CREATE TABLE {table} (_fund INTEGER, _period INTEGER)")
+    con.execute(f"CREATE INDEX {table}_fund_period ON {table} (_fund, _period)")
+    con.execute(f"CREATE INDEX {table}_period_fund ON {table} (_period, _fund)")
+    return dataset_id
+
+
+def _data_columns(con, dataset_id):
+    return [row[1] for row in con.execute(f"PRAGMA table_info({_table(dataset_id)})") if not row[1].startswith("_")]
+
+
+def _labels(con, kind, dataset_id):
+    return [row[0] for row in con.execute(f"SELECT label FROM {kind} WHERE dataset = ? ORDER BY id", (dataset_id,))]
+
+
+# Các Tháng theo thời gian: (nhãn theo thứ tự thời gian, vị trí theo thời gian của từng mã Tháng,
+# khóa thời gian đã sắp xếp). Có nhãn không đọc được khóa thì dùng thứ tự mã (thứ tự thêm vào), như
+# features.period_keys, và khóa là None.
+def _periods(con, dataset_id):
+    rows = con.execute("SELECT id, label, key FROM periods WHERE dataset = ? ORDER BY id", (dataset_id,)).fetchall()
+    keys = None
+    if all(key is not None for _, _, key in rows):
+        rows.sort(key=lambda row: row[2])
+        keys = [row[2] for row in rows]
+    ranks = np.empty(len(rows), dtype=np.int64)
+    ranks[[row[0] for row in rows]] = np.arange(len(rows))
+    return [row[1] for row in rows], ranks, keys
+
+
+# Điều kiện SQL (kèm tham số) chọn các Tháng trong khoảng, không phụ thuộc số Tháng trong kho.
+# Bộ dữ liệu có khóa thời gian: start/end được đọc thành khóa nên không cần có trong kho. Dùng thứ tự
+# thêm vào: mã Tháng chính là vị trí, start/end phải là nhãn có trong kho.
+def _period_filter(dataset_id, labels, keys, start, end, last_periods):
+    if keys is None:
+        def position(label):
+            if str(label) not in labels:
+                raise ValueError(f"Không có Tháng '{label}' trong bộ dữ liệu")
+            return labels.index(str(label))
+
+        if last_periods:
+            first, last = max(len(labels) - int(last_periods), 0), len(labels) - 1
+        else:
+            first = 0 if start is None else position(start)
+            last = len(labels) - 1 if end is None else position(end)
+        return "_period BETWEEN ? AND ?", [first, last]
+
+    def key(label):
+        value = period_key(label)
+        if value is None:
+            raise ValueError(f"Không đọc được Tháng '{label}'")
+        return value
+
+    if not keys:
+        return "0", []
+    if last_periods:
+        low, high = keys[max(len(keys) - int(last_periods), 0)], keys[-1]
+    else:
+        low = keys[0] if start is None else key(start)
+        high = keys[-1] if end is None else key(end)
+    return "_period IN (SELECT id FROM periods WHERE dataset = ? AND key BETWEEN ? AND ?)", [dataset_id, low, high]
+
+
+# Mã số của từng giá trị Quỹ/Tháng; giá trị mới được cấp mã tiếp theo theo thứ tự xuất hiện.
+# Tháng mới được lưu kèm khóa thời gian đọc từ nhãn.
+def _codes(con, kind, dataset_id, values):
+    labels = values.astype(str).where(values.notna())
+    known = {label: i for i, label in enumerate(_labels(con, kind, dataset_id))}
+    new = [label for label in pd.unique(labels.dropna()) if label not in known]
+    if new:
+        rows = [(dataset_id, len(known) + i, label) for i, label in enumerate(new)]
+        if kind == "periods":
+            con.executemany("INSERT INTO periods (dataset, id, label, key) VALUES (?, ?, ?, ?)", [(*row, period_key(row[2])) for row in rows])
+        else:
+            con.executemany(f"INSERT INTO {kind} (dataset, id, label) VALUES (?, ?, ?)", rows)
+        known.update({label: len(known) + i for i, label in enumerate(new)})
+    return labels.map(known)
+
+
+def _sql_type(series):
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+        return "INTEGER"
+    if pd.api.types.is_numeric_dtype(series):
+        return "REAL"
+    return "TEXT"
+
+
+def _append_frame(con, dataset_id, frame):
+    if frame.empty:
+        return 0
+    table = _table(dataset_id)
+    existing = set(_data_columns(con, dataset_id))
+    columns = [c for c in frame.columns if c not in (FUND_COLUMN, MONTH_COLUMN)]
+    for column in columns:
+        if column not in existing:
+            con.execute(f"ALTER TABLE {table} ADD COLUMN {_quote(column)} {_sql_type(frame[column])}")
+    values = {
+        "_fund": _codes(con, "funds", dataset_id, frame[FUND_COLUMN]) if FUND_COLUMN in frame else None,
+        "_period": _codes(con, "periods", dataset_id, frame[MONTH_COLUMN]) if MONTH_COLUMN in frame else None,
+    }
+    values.update({column: frame[column] for column in columns})
+    rows = pd.DataFrame({name: column for name, column in values.items() if column is not None})
+    rows = rows.astype(object).where(rows.notna(), None)
+    placeholders = ", ".join("?" * len(rows.columns))
+    con.executemany(
+        f"INSERT INTO {table} ({', '.join(map(_quote, rows.columns))}) VALUES ({placeholders})",
+        rows.itertuples(index=False, name=None),
+    )
+    con.execute("UPDATE datasets SET rows = rows + ? WHERE id = ?", (len(rows), dataset_id))
+    return len(rows)
+
+
+def _record_ingest(con, dataset_id, source, rows):
+    con.execute(
+        "INSERT INTO ingests (dataset, source, rows, appended_at) VALUES (?, ?, ?, ?)",
+        (dataset_id, source, rows, time.strftime("%Y-%m-%dT%H:%M:%S")),
+    )
+
+
+def _already_ingested(con, dataset_id, source):
+    return con.execute("SELECT 1 FROM ingests WHERE dataset = ? AND source = ?", (dataset_id, source)).fetchone() is not None
+
+
+# Thêm các dòng của frame vào bộ dữ liệu name (tạo mới nếu chưa có). source: khóa nhận biết
+# nguồn dữ liệu; nguồn đã thêm trước đó được bỏ qua. Trả về số dòng đã thêm.
+def append(name, frame, source=None, path=None):
+    with connect(path) as con:
+        dataset_id = _dataset_id(con, name, create=True)
+        if source is not None and _already_ingested(con, dataset_id, source):
+            return 0
+        rows = _append_frame(con, dataset_id, frame)
+        if source is not None:
+            _record_ingest(con, dataset_id, source, rows)
+    return rows
+
+
+# Dấu vân tay nội dung của file (đường dẫn hoặc file tải lên)
+def content_key(source):
+    h = hashlib.sha1()
+    if hasattr(source, "getvalue"):
+        h.update(source.getvalue())
+    else:
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()
+
+
+# Thêm một file CSV/Parquet theo từng khối, trong một giao dịch (lỗi giữa chừng không để lại dòng nào).
+# File có cùng nội dung đã thêm trước đó được bỏ qua. Trả về số dòng đã thêm.
+def append_file(name, source, file_name=None, chunksize=CHUNK_SIZE, path=None):
+    key = content_key(source)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    iter_chunks = iter_parquet_chunks if is_parquet(file_name or source) else iter_csv_chunks
+    with connect(path) as con:
+        dataset_id = _dataset_id(con, name, create=True)
+        if _already_ingested(con, dataset_id, key):
+            return 0
+        rows = sum(_append_frame(con, dataset_id, chunk) for chunk in iter_chunks(source, chunksize))
+        _record_ingest(con, dataset_id, key, rows)
+    return rows
+
+
+def list_datasets(path=None):
+    with connect(path, create=False) as con:
+        if con is None:
+            return []
+        return [info(name, path) for (name,) in con.execute("SELECT name FROM datasets ORDER BY name").fetchall()]
+
+
+def info(name, path=None):
+    with connect(path, create=False) as con:
+        dataset_id = _dataset_id(con, name)
+        rows = con.execute("SELECT rows FROM datasets WHERE id = ?", (dataset_id,)).fetchone()[0]
+        funds = con.execute("SELECT COUNT(*) FROM funds WHERE dataset = ?", (dataset_id,)).fetchone()[0]
+        return StoreInfo(name, rows, _data_columns(con, dataset_id), funds, _periods(con, dataset_id)[0])
+
+
+# Các Quỹ/Tháng dưới dạng categorical; chỉ giữ các giá trị có trong lát dữ liệu
+def _categorical(codes, labels):
+    codes = codes.fillna(-1).to_numpy(dtype=np.int64)
+    return pd.Categorical.from_codes(codes, categories=labels).remove_unused_categories()
+
+
+# Đọc một lát dữ liệu; điều kiện Quỹ/Tháng được đẩy xuống SQLite và dùng chỉ mục.
+# columns: chỉ đọc các cột này (bỏ qua tên không có trong kho); None là đọc tất cả.
+# ValueError nếu start/end không đọc được thành Tháng.
+def read(name, columns=None, funds=(), start=None, end=None, last_periods=None, path=None):
+    with connect(path, create=False) as con:
+        dataset_id = _dataset_id(con, name)
+        available = _data_columns(con, dataset_id)
+        selected = available if columns is None else [c for c in available if c in set(columns)]
+        fund_labels = _labels(con, "funds", dataset_id)
+        period_labels, period_ranks, period_keys = _periods(con, dataset_id)
+
+        where, params = [], []
+        if funds:
+            fund_ids = {label: i for i, label in enumerate(fund_labels)}
+            ids = [fund_ids[str(f)] for f in funds if str(f) in fund_ids]
+            where.append(f"_fund IN ({', '.join('?' * len(ids))})" if ids else "0")
+            params.extend(ids)
+        if last_periods or start is not None or end is not None:
+            condition, condition_params = _period_filter(dataset_id, period_labels, period_keys, start, end, last_periods)
+            where.append(condition)
+            params.extend(condition_params)
+
+        sql = f"SELECT _fund, _period{''.join(', ' + _quote(c) for c in selected)} FROM {_table(dataset_id)}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY _fund, _period, rowid"
+        frame = pd.read_sql_query(sql, con, params=params)
+
+    # Xếp lại Tháng của từng Quỹ theo thời gian (sắp xếp ổn định, giữ thứ tự thêm vào trong cùng Tháng)
+    frame["_period"] = frame["_period"].map(pd.Series(period_ranks))
+    periods = frame["_period"].fillna(-1).to_numpy(dtype=float)
+    order = np.lexsort([periods, frame["_fund"].fillna(-1).to_numpy(dtype=float)])
+    frame = frame.iloc[order].reset_index(drop=True)
+    result = compact(frame[selected])
+    if fund_labels:
+        result.insert(0, FUND_COLUMN, _categorical(frame["_fund"], fund_labels))
+    if period_labels:
+        result.insert(1 if fund_labels else 0, MONTH_COLUMN, _categorical(frame["_period"], period_labels))
+    return result
+
+
+def read_query(query, path=None):
+    return read(query.name, query.columns, query.funds, query.start, query.end, query.last_periods, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kho dữ liệu lịch sử cục bộ của các Quỹ")
+    parser.add_argument("--store", default=STORE_PATH, help="File kho SQLite")
+    commands = parser.add_subparsers(dest="command", required=True)
+    append_parser = commands.add_parser("append", help="Thêm các file CSV/Parquet vào một bộ dữ liệu")
+    append_parser.add_argument("name", help="Tên bộ dữ liệu")
+    append_parser.add_argument("files", nargs="+", help="Các file CSV hoặc Parquet (thứ tự bất kỳ)")
+    commands.add_parser("list", help="Liệt kê các bộ dữ liệu")
+    query_parser = commands.add_parser("query", help="Đọc một lát dữ liệu")
+    query_parser.add_argument("name", help="Tên bộ dữ liệu")
+    query_parser.add_argument("--fund", action="append", default=[], help="Chỉ đọc Quỹ này (có thể lặp lại)")
+    query_parser.add_argument("--start", help="Tháng đầu tiên")
+    query_parser.add_argument("--end", help="Tháng cuối cùng")
+    query_parser.add_argument("--last", type=int, help="Số tháng gần nhất")
+    query_parser.add_argument("-c", "--column", action="append", help="Chỉ đọc cột này (có thể lặp lại)")
+    query_parser.add_argument("-o", "--output", help="Ghi ra file .csv hoặc .parquet thay vì in ra màn hình")
+    args = parser.parse_args(argv)
+
+    if args.command == "append":
+        for file in args.files:
+            started = time.perf_counter()
+            rows = append_file(args.name, file, path=args.store)
+            status = f"thêm {rows} dòng" if rows else "đã có trong kho, bỏ qua"
+            print(f"{file} -> {args.name}: {status} ({time.perf_counter() - started:.2f}s)")
+    elif args.command == "list":
+        for dataset in list_datasets(args.store):
+            periods = f"{dataset.periods[0]} - {dataset.periods[-1]}" if dataset.periods else "không có cột Tháng"
+            print(f"{dataset.name}: {dataset.rows} dòng, {dataset.funds} Quỹ, {len(dataset.periods)} tháng ({periods}); cột: {', '.join(dataset.columns)}")
+    else:
+        started = time.perf_counter()
+        frame = read(args.name, args.column, args.fund, args.start, args.end, args.last, path=args.store)
+        elapsed = time.perf_counter() - started
+        if args.output:
+            format = "Parquet" if is_parquet(args.output) else "CSV"
+            Path(args.output).write_bytes(export_bytes(frame, format))
+        else:
+            print(frame.to_string(max_rows=50))
+        print(f"{len(frame)} dòng ({elapsed:.2f}s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
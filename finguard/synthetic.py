@@ -0,0 +1,194 @@
+# Sinh dữ liệu giả lập cùng cấu trúc với dữ liệu mẫu của 5 trang, ở quy mô tùy chọn.
+#
+#   python -m finguard.synthetic -n 10000 -m 24 -o du_lieu/ --format parquet
+#
+# Mỗi hàm sinh trả về (dữ liệu, nhãn) với nhãn là mảng bool đánh dấu các dòng được cài bất
+# thường; nhãn để riêng để các cột giống hệt dữ liệu mẫu. Cùng seed cho cùng kết quả.
+# Bài toán theo tháng (anomaly, asset_loss) sinh funds x months dòng; các bài toán còn lại
+# sinh một dòng mỗi Quỹ, hoặc funds x months dòng kèm cột Tháng khi months > 1.
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from finguard.features import FUND_COLUMN, MONTH_COLUMN
+from finguard.ingest import EXPORT_FORMATS, export_bytes, export_format
+
+ANOMALY_RATE = 0.02
+PANEL_SCHEMAS = ("anomaly", "asset_loss")
+
+
+# Cột Quỹ/Tháng dạng categorical cho funds x months dòng (Quỹ trước, tháng tăng dần)
+def _index_columns(funds, months, with_fund=True, with_month=True):
+    columns = {}
+    if with_fund:
+        codes = np.repeat(np.arange(funds), months)
+        columns[FUND_COLUMN] = pd.Categorical.from_codes(codes, [f"Quỹ {i}" for i in range(1, funds + 1)])
+    if with_month:
+        codes = np.tile(np.arange(months), funds)
+        columns[MONTH_COLUMN] = pd.Categorical.from_codes(codes, [f"Tháng {i}" for i in range(1, months + 1)])
+    return columns
+
+
+def _anomalies(rng, shape, rate):
+    return rng.random(shape) < rate
+
+
+def generate_anomaly(funds=1000, months=12, anomaly_rate=ANOMALY_RATE, seed=0):
+    rng = np.random.default_rng(seed)
+    shape = (funds, months)
+    injected = _anomalies(rng, shape, anomaly_rate)
+    # Tháng đầu không có biến động để so sánh, nên không cài bất thường
+    injected[:, 0] = False
+    growth = 1 + rng.normal(0.01, 0.01, shape) + injected * rng.uniform(0.3, 0.6, shape)
+    loans = rng.lognormal(np.log(150), 0.5, (funds, 1)) * np.cumprod(growth, axis=1)
+    deposits = loans * rng.uniform(0.8, 1.0, (funds, 1)) * np.where(injected, rng.uniform(0.5, 0.7, shape), rng.normal(1, 0.02, shape))
+    overdue = loans * rng.uniform(0.01, 0.03, shape) * np.where(injected, 3.0, 1.0)
+    large_transactions = rng.poisson(8, shape) + injected * rng.poisson(12, shape)
+    frame = pd.DataFrame({
+        **_index_columns(funds, months, with_fund=funds > 1),
+        "Dư nợ": loans.ravel().round(2),
+        "Tiền gửi": deposits.ravel().round(2),
+        "Nợ quá hạn": overdue.ravel().round(2),
+        "Số giao dịch lớn": large_transactions.ravel(),
+    })
+    return frame, injected.ravel()
+
+
+def generate_insolvency(funds=1000, months=1, anomaly_rate=ANOMALY_RATE, seed=0):
+    rng = np.random.default_rng(seed)
+    n = funds * months
+    injected = _anomalies(rng, n, anomaly_rate)
+    frame = pd.DataFrame({
+        **_index_columns(funds, months, with_month=months > 1),
+        "Tiền mặt": (rng.uniform(5, 20, n) * np.where(injected, 0.25, 1.0)).round(2),
+        "Nợ ngắn hạn": (rng.uniform(40, 80, n) * np.where(injected, 1.4, 1.0)).round(2),
+        "Dòng tiền ròng": np.where(injected, -rng.uniform(5, 10, n), rng.normal(1, 3, n)).round(2),
+        "Vốn chủ sở hữu": (rng.uniform(15, 35, n) * np.where(injected, 0.5, 1.0)).round(2),
+        "Nợ quá hạn": (rng.uniform(1, 4, n) * np.where(injected, 3.0, 1.0)).round(2),
+    })
+    return frame, injected
+
+
+# Nhãn rủi ro theo tỷ lệ nợ xấu (dưới 2.5%: thấp, dưới 5%: trung bình), 5% nhãn bị xáo trộn
+def generate_credit_risk(funds=1000, months=1, anomaly_rate=ANOMALY_RATE, seed=0):
+    rng = np.random.default_rng(seed)
+    n = funds * months
+    injected = _anomalies(rng, n, anomaly_rate)
+    loans = rng.lognormal(np.log(170), 0.4, n)
+    bad_debt_ratio = rng.gamma(2.0, 1.2, n) + injected * rng.uniform(4, 10, n)
+    labels = np.digitize(bad_debt_ratio, [2.5, 5.0])
+    noisy = rng.random(n) < 0.05
+    labels[noisy] = rng.integers(0, 3, noisy.sum())
+    frame = pd.DataFrame({
+        **_index_columns(funds, months, with_month=months > 1),
+        "Tổng dư nợ": loans.round(2),
+        "Nợ xấu": (loans * bad_debt_ratio / 100).round(2),
+        "Tổng tiền gửi": (loans * rng.uniform(0.8, 1.3, n) * np.where(injected, 0.7, 1.0)).round(2),
+        "Risk_Label": labels,
+    })
+    return frame, injected
+
+
+def generate_asset_loss(funds=1000, months=12, anomaly_rate=ANOMALY_RATE, seed=0):
+    rng = np.random.default_rng(seed)
+    shape = (funds, months)
+    injected = _anomalies(rng, shape, anomaly_rate)
+    book = rng.lognormal(np.log(250), 0.4, (funds, 1)) * np.cumprod(1 + rng.normal(0.017, 0.005, shape), axis=1)
+    gap = np.clip(rng.normal(0.01, 0.01, shape), 0, None) + injected * rng.uniform(0.05, 0.15, shape)
+    bad_debt = np.clip(rng.uniform(1, 3, (funds, 1)) + np.cumsum(rng.normal(0.1, 0.2, shape), axis=1), 0, None) + injected * 2.0
+    frame = pd.DataFrame({
+        **_index_columns(funds, months, with_fund=funds > 1),
+        "Tài sản sổ sách": book.ravel().round(2),
+        "Tài sản thực tế": (book * (1 - gap)).ravel().round(2),
+        "Chi phí quản lý": (rng.normal(8, 1.5, shape) * np.where(injected, 2.0, 1.0)).ravel().round(2),
+        "Giao dịch bên liên quan": (rng.normal(5, 1.5, shape) * np.where(injected, 2.5, 1.0)).ravel().round(2),
+        "Tỷ lệ nợ khó đòi": bad_debt.ravel().round(2),
+    })
+    return frame, injected.ravel()
+
+
+# Bất thường: vốn chủ sở hữu thấp (CAR dưới 8%) và tỷ lệ nợ xấu cao
+def generate_compliance(funds=1000, months=1, anomaly_rate=ANOMALY_RATE, seed=0):
+    rng = np.random.default_rng(seed)
+    n = funds * months
+    injected = _anomalies(rng, n, anomaly_rate)
+    total_assets = rng.lognormal(np.log(200), 0.3, n)
+    risk_assets = total_assets * rng.uniform(0.6, 0.8, n)
+    loans = total_assets * rng.uniform(0.55, 0.8, n)
+    frame = pd.DataFrame({
+        **_index_columns(funds, months, with_month=months > 1),
+        "Vốn chủ sở hữu": (risk_assets * rng.uniform(0.1, 0.2, n) * np.where(injected, 0.4, 1.0)).round(2),
+        "Tổng tài sản": total_assets.round(2),
+        "Tài sản có rủi ro": risk_assets.round(2),
+        "Nợ xấu": (loans * (rng.gamma(2.0, 0.8, n) + injected * 4.0) / 100).round(2),
+        "Tổng dư nợ": loans.round(2),
+    })
+    return frame, injected
+
+
+# Tên bài toán (giống finguard.analyses.ANALYSES) -> hàm sinh
+GENERATORS = {
+    "anomaly": generate_anomaly,
+    "insolvency": generate_insolvency,
+    "credit_risk": generate_credit_risk,
+    "asset_loss": generate_asset_loss,
+    "compliance": generate_compliance,
+}
+
+
+# Dữ liệu toàn hệ thống (trang cảnh báo sớm): các cột của 4 bài toán trên cùng funds x months dòng.
+# Cột trùng tên giữa các bài toán lấy theo bài toán đứng trước trong NETWORK_SCHEMAS; nhãn đánh dấu
+# dòng được cài bất thường ở bất kỳ bài toán nào.
+NETWORK_SCHEMAS = ("insolvency", "credit_risk", "asset_loss", "compliance")
+
+
+def generate_network(funds=1000, months=12, anomaly_rate=ANOMALY_RATE, seed=0):
+    columns = _index_columns(funds, months)
+    injected = np.zeros(funds * months, dtype=bool)
+    for offset, name in enumerate(NETWORK_SCHEMAS):
+        frame, labels = GENERATORS[name](funds, months, anomaly_rate, seed + offset)
+        for column in frame.columns:
+            columns.setdefault(column, frame[column].to_numpy())
+        injected |= labels
+    return pd.DataFrame(columns), injected
+
+
+# Sinh dữ liệu một bài toán; months chỉ áp dụng cho bài toán theo tháng trừ khi panel=True
+def generate(name, funds, months=12, anomaly_rate=ANOMALY_RATE, seed=0, panel=False):
+    months = months if name in PANEL_SCHEMAS or panel else 1
+    return GENERATORS[name](funds, months, anomaly_rate, seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sinh dữ liệu giả lập cho các trang giám sát Quỹ Tín dụng Nhân dân")
+    parser.add_argument("-n", "--funds", type=int, default=1000, help="Số Quỹ")
+    parser.add_argument("-m", "--months", type=int, default=12, help="Số tháng (bài toán theo tháng)")
+    parser.add_argument("-r", "--anomaly-rate", type=float, default=ANOMALY_RATE, help="Tỷ lệ dòng được cài bất thường")
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("-a", "--analysis", action="append", choices=sorted(GENERATORS), help="Chỉ sinh cho bài toán này (có thể lặp lại)")
+    parser.add_argument("-f", "--format", type=export_format, choices=sorted(EXPORT_FORMATS), default="CSV", help="Định dạng file")
+    parser.add_argument("-o", "--output-dir", default="synthetic", help="Thư mục ghi dữ liệu")
+    parser.add_argument("--network", action="store_true", help="Sinh thêm một file toàn hệ thống cho trang cảnh báo sớm")
+    args = parser.parse_args(argv)
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    suffix, _ = EXPORT_FORMATS[args.format]
+    for name in args.analysis or GENERATORS:
+        frame, injected = generate(name, args.funds, args.months, args.anomaly_rate, args.seed)
+        path = output_dir / f"{name}_{args.funds}{suffix}"
+        path.write_bytes(export_bytes(frame, args.format))
+        print(f"{path}: {len(frame):,} dòng, {int(injected.sum()):,} dòng bất thường")
+    if args.network:
+        frame, injected = generate_network(args.funds, args.months, args.anomaly_rate, args.seed)
+        path = output_dir / f"network_{args.funds}{suffix}"
+        path.write_bytes(export_bytes(frame, args.format))
+        print(f"{path}: {len(frame):,} dòng, {int(injected.sum()):,} dòng bất thường")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+# Nạp trước các thư viện nặng (sklearn, matplotlib, seaborn...) ở một luồng nền.
+#
+# Các trang chỉ import chúng khi huấn luyện hoặc vẽ; Home.py gọi start() một lần cho mỗi tiến trình
+# để lần mở trang đầu tiên sau khi khởi động (ví dụ bản sao mới được tự động mở rộng) không phải chờ.
+# Tắt bằng biến môi trường FINGUARD_WARMUP=0.
+import importlib
+import os
+import threading
+import time
+
+ENABLED = os.environ.get("FINGUARD_WARMUP", "1") != "0"
+
+HEAVY_MODULES = (
+    "joblib",
+    "sklearn.ensemble",
+    "sklearn.linear_model",
+    "sklearn.preprocessing",
+    "sklearn.model_selection",
+    "sklearn.metrics",
+    "matplotlib.figure",
+    "matplotlib.ticker",
+    "seaborn",
+    "pyarrow.parquet",
+)
+
+# Thời gian nạp (giây) của từng module trong lần nạp trước gần nhất
+timings = {}
+
+
+def warm_up(modules=HEAVY_MODULES):
+    for name in modules:
+        started = time.perf_counter()
+        importlib.import_module(name)
+        timings[name] = time.perf_counter() - started
+    # Lần vẽ chữ đầu tiên mới nạp bộ đệm phông chữ của matplotlib
+    started = time.perf_counter()
+    from finguard import plots
+
+    fig, ax = plots._new_axes((1, 1))
+    ax.set_title("FinGuard")
+    plots.to_png(fig, dpi=10)
+    timings["font_cache"] = time.perf_counter() - started
+    return timings
+
+
+def start(modules=HEAVY_MODULES):
+    thread = threading.Thread(target=warm_up, args=(modules,), name="finguard-warmup", daemon=True)
+    thread.start()
+    return thread
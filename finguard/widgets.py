@@ -0,0 +1,252 @@
+# Các thành phần giao diện dùng chung giữa các trang
+import math
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from finguard import incremental, metrics, plots, store
+from finguard.features import FUND_COLUMN, MONTH_COLUMN
+from finguard.ingest import EXPORT_FORMATS, export_bytes, read_table
+from finguard.model_cache import fingerprint
+
+
+PAGE_SIZE = 50
+ALL_VALUES = "Tất cả"
+ORIGINAL_ORDER = "(thứ tự gốc)"
+
+
+def format_bytes(n):
+    if n < 1024 ** 2:
+        return f"{n / 1024:,.1f} KB"
+    return f"{n / 1024 ** 2:,.1f} MB"
+
+
+# Thống kê đọc dữ liệu: bộ nhớ với kiểu gọn so với kiểu mặc định của pandas, và bộ nhớ đỉnh
+def show_ingest_stats(dataset):
+    stats = dataset.stats
+    if not stats:
+        return
+    if stats["format"] == "store":
+        st.caption(f"Đọc {stats['rows']:,} dòng từ kho {dataset.name} trong {stats['seconds']:.2f} giây ({format_bytes(stats['memory'])}).")
+        return
+    text = (
+        f"Đọc {stats['rows']:,} dòng trong {stats['chunks']} khối ({stats['seconds']:.2f} giây). "
+        f"Bộ nhớ: {format_bytes(stats['memory'])} với kiểu gọn, so với {format_bytes(stats['default_memory'])} với kiểu mặc định"
+    )
+    if "peak_memory" in stats:
+        text += f"; đỉnh khi đọc {format_bytes(stats['peak_memory'])}"
+    st.caption(text + ".")
+
+
+# Chọn một lát dữ liệu trong kho (finguard.store) có đủ các cột của trang: các Quỹ và khoảng tháng.
+# Trả về StoreQuery, hoặc None nếu không dùng kho (hoặc kho chưa có bộ dữ liệu phù hợp).
+def store_slice(prefix, required_columns):
+    datasets = []
+    for info in store.list_datasets():
+        columns = {*info.columns, *([FUND_COLUMN] if info.funds else []), *([MONTH_COLUMN] if info.periods else [])}
+        if set(required_columns).issubset(columns):
+            datasets.append(info)
+    if not datasets:
+        return None
+    with st.expander("Đọc từ kho dữ liệu lịch sử"):
+        names = [info.name for info in datasets]
+        name = st.selectbox(
+            "Bộ dữ liệu", [None, *names], format_func=lambda n: "Không dùng kho" if n is None else n, key=f"{prefix}store_dataset"
+        )
+        if name is None:
+            return None
+        info = datasets[names.index(name)]
+        st.caption(f"{info.rows:,} dòng, {info.funds:,} Quỹ, {len(info.periods)} tháng trong kho. Chỉ lát được chọn được đọc.")
+        funds = ()
+        if info.funds:
+            text = st.text_input("Quỹ (cách nhau bởi dấu phẩy, để trống là tất cả)", key=f"{prefix}store_funds")
+            funds = tuple(fund.strip() for fund in text.split(",") if fund.strip())
+        start = end = last_periods = None
+        if info.periods:
+            last_periods = st.number_input(
+                "Số tháng gần nhất (0 là chọn khoảng tháng)", min_value=0, max_value=len(info.periods), value=0, key=f"{prefix}store_last"
+            )
+            if not last_periods and len(info.periods) > 1:
+                start, end = st.select_slider(
+                    "Khoảng tháng", info.periods, value=(info.periods[0], info.periods[-1]), key=f"{prefix}store_periods"
+                )
+    return store.StoreQuery(name, funds=funds, start=start, end=end, last_periods=int(last_periods) if last_periods else None)
+
+
+# Các dòng [start, end) của view sau khi sắp xếp; cột số chỉ chọn phần đầu (nsmallest/nlargest)
+# thay vì sắp xếp toàn bộ. Dòng trống (NaN) đứng sau cùng, như sort_values.
+def _sorted_rows(view, column, descending, start, end):
+    if column == ORIGINAL_ORDER:
+        return view.iloc[start:end]
+    if pd.api.types.is_numeric_dtype(view[column]) and not pd.api.types.is_bool_dtype(view[column]):
+        head = view.nlargest(end, column) if descending else view.nsmallest(end, column)
+        if len(head) < end:
+            # nlargest/nsmallest bỏ qua NaN
+            head = pd.concat([head, view[view[column].isna()].iloc[: end - len(head)]])
+        return head.iloc[start:end]
+    return view.sort_values(column, ascending=not descending, kind="stable").iloc[start:end]
+
+
+# Bảng phân trang: chỉ gửi trang đang xem tới trình duyệt; lọc, tìm Quỹ và sắp xếp làm phía máy chủ.
+# Bảng không quá một trang được hiển thị nguyên như trước.
+# filter_column: cột ít giá trị (ví dụ mức rủi ro) được lọc bằng hộp chọn.
+def table_view(label, frame, key, filter_column=None, page_size=PAGE_SIZE):
+    if len(frame) <= page_size and filter_column is None:
+        st.write(label, frame)
+        return
+    st.write(label)
+    view = frame
+    filter_col, search_col, sort_col, order_col = st.columns(4)
+    if filter_column is not None:
+        values = [v for v in pd.unique(frame[filter_column]) if pd.notna(v)]
+        choice = filter_col.selectbox(f"Lọc theo {filter_column}", [ALL_VALUES, *values], key=f"{key}_filter")
+        if choice != ALL_VALUES:
+            view = view[view[filter_column] == choice]
+    if FUND_COLUMN in frame.columns:
+        search = search_col.text_input("Tìm Quỹ", key=f"{key}_search")
+        if search:
+            view = view[view[FUND_COLUMN].astype(str).str.contains(search, case=False, regex=False)]
+    sort_column = sort_col.selectbox("Sắp xếp theo", [ORIGINAL_ORDER, *frame.columns], key=f"{key}_sort")
+    descending = order_col.toggle("Giảm dần", key=f"{key}_descending")
+
+    pages = max(math.ceil(len(view) / page_size), 1)
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = 1
+    page = st.number_input(f"Trang (trên {pages:,})", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+    start = (page - 1) * page_size
+    end = min(start + page_size, len(view))
+    st.dataframe(_sorted_rows(view, sort_column, descending, start, end), use_container_width=True)
+    st.caption(f"Dòng {start + 1 if end else 0:,}-{end:,} trên {len(view):,} dòng (bảng gốc {len(frame):,} dòng).")
+    if st.checkbox("Xem thống kê tóm tắt", key=f"{key}_summary"):
+        st.dataframe(view.describe(), use_container_width=True)
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _figure_png(draw_name, data_key, params, _draw, _frame):
+    return plots.to_png(_draw(_frame, **dict(params)))
+
+
+# Vẽ biểu đồ bằng một hàm trong finguard.plots; ảnh được ghi nhớ theo dữ liệu và tham số
+# (ngưỡng...), nên chạy lại trang với cùng đầu vào không phải vẽ lại.
+# frame nên chỉ gồm các cột biểu đồ dùng để việc băm dữ liệu nhẹ.
+@metrics.timed("render")
+def show_figure(draw, frame, **params):
+    png = _figure_png(draw.__name__, fingerprint(frame), tuple(sorted(params.items())), draw, frame)
+    st.image(png, use_column_width=True)
+
+
+# Tải xuống kết quả. File chỉ được tạo khi người dùng bấm chuẩn bị, rồi được ghi nhớ
+# cho tới khi kết quả hoặc định dạng thay đổi, nên các lần chạy lại trang không phải mã hóa lại.
+def download_section(frame, prefix, label="Tải xuống kết quả"):
+    format = st.radio("Định dạng file kết quả", list(EXPORT_FORMATS), horizontal=True, key=f"{prefix}download_format")
+    export_key = f"{prefix}export"
+    export = st.session_state.get(export_key)
+    if export is not None and export[0] != (format, fingerprint(frame)):
+        export = None
+    if export is None and st.button(f"Chuẩn bị file {format}", key=f"{prefix}prepare_download"):
+        with metrics.stage("export", format=format, rows=len(frame)):
+            export = ((format, fingerprint(frame)), export_bytes(frame, format))
+        st.session_state[export_key] = export
+    if export is None:
+        return
+    suffix, mime = EXPORT_FORMATS[format]
+    st.download_button(
+        label=f"{label} ({format_bytes(len(export[1]))})",
+        data=export[1],
+        file_name=f"{prefix}result{suffix}",
+        mime=mime,
+        key=f"{prefix}download"
+    )
+
+
+# Mục cập nhật tháng mới: chỉ chấm điểm các dòng vừa thêm, trạng thái lưu trên đĩa giữa các phiên
+# và dùng chung cho mọi phiên (incremental.shared_state)
+def incremental_section(name, make_state, history, result_columns, default_refit_every):
+    shared = incremental.shared_state(name)
+    state = shared.get()
+
+    with st.expander("Cập nhật tháng mới (chấm điểm tăng dần, không xử lý lại toàn bộ lịch sử)"):
+        st.write("""
+- Khởi tạo trạng thái từ dữ liệu lịch sử hiện tại một lần.
+- Sau đó mỗi tháng chỉ cần tải lên file chứa các dòng mới; biến động được tính so với tháng cuối cùng đã lưu của từng Quỹ.
+""")
+        refit_every = st.number_input(
+            "Huấn luyện lại sau mỗi N lần cập nhật", min_value=1, max_value=120,
+            value=state.refit_every if state is not None else default_refit_every, key=f"{name}_refit_every",
+        )
+        if st.button("Khởi tạo từ dữ liệu hiện tại", key=f"{name}_incremental_init"):
+            try:
+                state = shared.reset(make_state(int(refit_every)), history)
+            except (KeyError, ValueError) as e:
+                st.error(f"Không khởi tạo được trạng thái từ dữ liệu hiện tại: {e}")
+            st.session_state.pop(f"{name}_incremental_result", None)
+        if state is None:
+            st.info("Chưa có trạng thái cập nhật tăng dần.")
+            return
+
+        new_file = st.file_uploader("Chọn file CSV hoặc Parquet các dòng mới", type=["csv", "parquet"], key=f"{name}_incremental_upload")
+        if new_file is not None:
+            with metrics.stage("incremental"):
+                new_rows, _, _ = read_table(new_file, new_file.name)
+                try:
+                    scored = shared.update(new_rows, batch_id=new_file.file_id, refit_every=int(refit_every))
+                except (KeyError, ValueError) as e:
+                    scored = None
+                    st.error(f"Không cập nhật được từ {new_file.name}, trạng thái giữ nguyên: {e}")
+            if scored is not None:
+                st.session_state[f"{name}_incremental_result"] = scored
+            state = shared.get()
+        st.caption(
+            f"{state.funds} Quỹ, {state.rows_seen} dòng đã xử lý qua {state.updates} lần cập nhật; "
+            f"{state.updates_since_fit} lần cập nhật kể từ lần huấn luyện gần nhất."
+        )
+        result = st.session_state.get(f"{name}_incremental_result")
+        if result is not None:
+            if result.empty:
+                st.info("Lô vừa thêm chưa có dòng nào đủ dữ liệu để chấm điểm (cần tháng trước của cùng Quỹ).")
+            else:
+                table_view("Kết quả chấm điểm các dòng mới:", result[[c for c in result_columns if c in result.columns]], f"{name}_incremental_table")
+
+
+# Bắt đầu đo từng bước cho lần chạy trang này; các hàm dùng chung tự ghi vào Recorder được kích hoạt.
+# Lựa chọn đo bộ nhớ đỉnh nằm trong bảng ở thanh bên (show_metrics) nên được đọc từ session_state.
+def start_metrics(prefix):
+    ctx = get_script_run_ctx()
+    recorder = metrics.Recorder(
+        prefix.rstrip("_"),
+        session=ctx.session_id if ctx is not None else None,
+        trace_memory=st.session_state.get(f"{prefix}trace_memory", False),
+    )
+    return metrics.activate(recorder)
+
+
+# Bảng thời gian và bộ nhớ từng bước ở thanh bên, gọi ở cuối trang
+def show_metrics(recorder, prefix):
+    metrics.activate(None)
+    with st.sidebar.expander("Thời gian và bộ nhớ từng bước"):
+        st.toggle("Đo bộ nhớ đỉnh từng bước (chậm hơn)", key=f"{prefix}trace_memory")
+        if not recorder.records:
+            return
+        records = pd.DataFrame(recorder.records)
+        # Lần lấy từ bộ nhớ đệm mô hình tính riêng, không gộp vào thời gian huấn luyện
+        if "cached" in records:
+            records["stage"] = records["stage"].mask(records["cached"].eq(True), records["stage"] + " (bộ nhớ đệm)")
+        summary = records.groupby("stage", sort=False).agg(
+            calls=("stage", "size"), wall=("wall_seconds", "sum"), cpu=("cpu_seconds", "sum")
+        )
+        table = pd.DataFrame({
+            "Số lần": summary["calls"],
+            "Thời gian (s)": summary["wall"].round(3),
+            "CPU của luồng (s)": summary["cpu"].round(3),
+        })
+        if "peak_memory_bytes" in records:
+            table["Bộ nhớ đỉnh (MB)"] = (records.groupby("stage", sort=False)["peak_memory_bytes"].max() / 1024 ** 2).round(1)
+        table.index.name = "Bước"
+        st.dataframe(table, use_container_width=True)
+        text = f"Tổng: {records['wall_seconds'].sum():.2f} giây"
+        if records["max_rss_bytes"].notna().any():
+            text += f"; bộ nhớ tối đa của tiến trình: {format_bytes(records['max_rss_bytes'].max())}"
+        if recorder.log_path is not None:
+            text += f". Nhật ký: {recorder.log_path}"
+        st.caption(text + ".")
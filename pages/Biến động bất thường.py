@@ -1,7 +1,28 @@
 import streamlit as st
 import pandas as pd
-from sklearn.ensemble import IsolationForest
-import matplotlib.pyplot as plt
+from finguard import plots
+from finguard.analyses import (
+    ANOMALY_COLUMNS,
+    ANOMALY_FEATURES,
+    EWMA_SPAN,
+    FIT_SAMPLE_ROWS,
+    ROLLING_WINDOW,
+    anomaly_rolling_features,
+    score_isolation_forest,
+)
+from finguard.dataset import resolve_dataset
+from finguard.features import FUND_COLUMN
+from finguard.incremental import IncrementalAnomaly
+from finguard.model_cache import (
+    fingerprint,
+    fit_isolation_forest,
+    fit_isolation_forest_per_fund,
+    save_model_button,
+    score_saved_model,
+    select_saved_model,
+    show_cache_stats,
+)
+from finguard.widgets import download_section, incremental_section, show_figure, show_ingest_stats, show_metrics, start_metrics, store_slice, table_view
 
 st.set_page_config(page_title="Giám sát Quỹ Tín dụng Nhân dân", layout="wide")
 st.title("Phát hiện biến động bất thường")
@@ -9,6 +30,9 @@ st.title("Phát hiện biến động bất thường")
 # Tiền tố cho bài toán 1
 prefix = "anomaly_"
 
+# Đo thời gian và bộ nhớ từng bước của lần chạy này
+anomaly_metrics = start_metrics(prefix)
+
 # Hàm tải dữ liệu mẫu
 def load_anomaly_sample_data():
     return pd.DataFrame({
@@ -21,13 +45,17 @@ def load_anomaly_sample_data():
 
 # Tải dữ liệu
 st.header("Tải dữ liệu")
-anomaly_uploaded_file = st.file_uploader("Chọn file CSV cho biến động bất thường", type="csv", key=f"{prefix}upload")
-if anomaly_uploaded_file is not None:
-    anomaly_data = pd.read_csv(anomaly_uploaded_file)
-    st.write("Dữ liệu đã tải lên:", anomaly_data)
+anomaly_uploaded_file = st.file_uploader("Chọn file CSV hoặc Parquet cho biến động bất thường", type=["csv", "parquet"], key=f"{prefix}upload")
+anomaly_store_query = store_slice(prefix, ANOMALY_COLUMNS)
+anomaly_dataset = resolve_dataset(anomaly_uploaded_file, ANOMALY_COLUMNS, prefix, load_anomaly_sample_data, store_query=anomaly_store_query)
+if anomaly_dataset.source == "upload":
+    table_view("Dữ liệu đã tải lên:", anomaly_dataset.frame, f"{prefix}raw_table")
+    show_ingest_stats(anomaly_dataset)
+elif anomaly_dataset.source == "store":
+    table_view("Dữ liệu từ kho:", anomaly_dataset.frame, f"{prefix}raw_table")
+    show_ingest_stats(anomaly_dataset)
 else:
-    anomaly_data = load_anomaly_sample_data()
-    st.write("Dữ liệu mẫu:", anomaly_data)
+    table_view("Dữ liệu mẫu:", anomaly_dataset.frame, f"{prefix}raw_table")
 
 # Tính toán đặc trưng
 st.subheader("Cách tính toán đặc trưng")
@@ -36,46 +64,106 @@ st.write("""
 - **Biến động tiền gửi (%)**: (Tiền gửi tháng này - Tiền gửi tháng trước) / Tiền gửi tháng trước * 100. Đo lường thay đổi tiền gửi từ thành viên.
 - **Tỷ lệ nợ quá hạn (%)**: Nợ quá hạn / Dư nợ * 100. Cho biết phần trăm khoản vay không được trả đúng hạn.
 - **Tỷ lệ sử dụng vốn huy động (%)**: Dư nợ / Tiền gửi * 100. Đo lường mức độ Quỹ dùng tiền gửi để cho vay.
+
+Nếu dữ liệu có cột **Quỹ** (nhiều Quỹ, mỗi Quỹ nhiều tháng), biến động được tính so với tháng trước của chính Quỹ đó.
+
+Với dữ liệu nhiều năm, biến động một kỳ rất nhiễu; có thể thêm các đặc trưng cửa sổ trượt (tính riêng từng Quỹ):
+- **Z-score dư nợ / tiền gửi**: (Giá trị tháng này - Trung bình N tháng gần nhất) / Độ lệch chuẩn N tháng gần nhất.
+- **EWMA biến động dư nợ / tiền gửi**: Trung bình trượt hàm mũ của biến động (%), chu kỳ M tháng.
 """)
 
-anomaly_data[f"{prefix}Biến động dư nợ"] = anomaly_data["Dư nợ"].pct_change() * 100
-anomaly_data[f"{prefix}Biến động tiền gửi"] = anomaly_data["Tiền gửi"].pct_change() * 100
-anomaly_data[f"{prefix}Tỷ lệ nợ quá hạn"] = anomaly_data["Nợ quá hạn"] / anomaly_data["Dư nợ"] * 100
-anomaly_data[f"{prefix}Tỷ lệ sử dụng vốn huy động"] = anomaly_data["Dư nợ"] / anomaly_data["Tiền gửi"] * 100
+# Chế độ nhiều Quỹ: dữ liệu có cột Quỹ
+anomaly_panel_mode = FUND_COLUMN in anomaly_dataset.frame.columns
+
+# Đặc trưng cửa sổ trượt: mỗi độ dài cửa sổ chỉ tính một lần trên dữ liệu đã tải
+anomaly_window_features = []
+if st.checkbox("Thêm đặc trưng cửa sổ trượt", key=f"{prefix}rolling"):
+    anomaly_rolling_columns = st.columns(2)
+    anomaly_zscore_window = anomaly_rolling_columns[0].number_input(
+        "Cửa sổ z-score (tháng)", min_value=2, max_value=120, value=ROLLING_WINDOW, key=f"{prefix}zscore_window"
+    )
+    anomaly_ewma_span = anomaly_rolling_columns[1].number_input(
+        "Chu kỳ EWMA (tháng)", min_value=1, max_value=120, value=EWMA_SPAN, key=f"{prefix}ewma_span"
+    )
+    anomaly_window_features = anomaly_rolling_features(int(anomaly_zscore_window), int(anomaly_ewma_span))
+
+anomaly_data = anomaly_dataset.with_features(prefix, ANOMALY_FEATURES + anomaly_window_features)
 anomaly_data = anomaly_data.dropna()
 
-st.write("Dữ liệu sau khi tính toán đặc trưng:", anomaly_data)
+table_view("Dữ liệu sau khi tính toán đặc trưng:", anomaly_data, f"{prefix}features_table")
 
 # Chọn đặc trưng
 anomaly_features = [f"{prefix}Biến động dư nợ", f"{prefix}Biến động tiền gửi", f"{prefix}Tỷ lệ nợ quá hạn", f"{prefix}Tỷ lệ sử dụng vốn huy động"]
+anomaly_features += [f"{prefix}{feature.name}" for feature in anomaly_window_features]
 anomaly_X = anomaly_data[anomaly_features]
 
 # Huấn luyện mô hình
 anomaly_contamination = st.slider("Tỷ lệ bất thường (contamination)", 0.05, 0.5, 0.2, key=f"{prefix}contamination")
-anomaly_model = IsolationForest(contamination=anomaly_contamination, random_state=42)
-anomaly_model.fit(anomaly_X)
-anomaly_data[f"{prefix}Anomaly"] = anomaly_model.predict(anomaly_X)
+anomaly_max_fit_rows = st.number_input(
+    "Số dòng tối đa dùng để huấn luyện",
+    min_value=1_000, max_value=10_000_000, value=FIT_SAMPLE_ROWS, step=50_000,
+    help="Dữ liệu lớn hơn được huấn luyện trên một mẫu ngẫu nhiên cố định (random_state=42) rồi chấm điểm toàn bộ theo từng khối.",
+    key=f"{prefix}max_fit_rows",
+)
+anomaly_model_mode = "Gộp tất cả Quỹ"
+if anomaly_panel_mode:
+    anomaly_model_mode = st.radio(
+        "Cách huấn luyện mô hình",
+        ["Gộp tất cả Quỹ", "Riêng từng Quỹ"],
+        horizontal=True,
+        help="Gộp: một mô hình cho toàn bộ các Quỹ. Riêng từng Quỹ: mỗi Quỹ một mô hình, huấn luyện song song trên nhiều tiến trình.",
+        key=f"{prefix}model_mode",
+    )
+if anomaly_model_mode == "Riêng từng Quỹ":
+    _, anomaly_predictions = fit_isolation_forest_per_fund(anomaly_X, anomaly_data[FUND_COLUMN], anomaly_contamination, random_state=42)
+else:
+    # Mô hình gộp có thể lưu vào kho và nạp lại thay vì huấn luyện
+    anomaly_data_key = fingerprint(anomaly_X)
+    anomaly_params = {"contamination": anomaly_contamination, "random_state": 42, "max_fit_rows": anomaly_max_fit_rows}
+    anomaly_saved = select_saved_model("anomaly", anomaly_data_key, anomaly_params, anomaly_features)
+    if anomaly_saved is not None:
+        anomaly_model = anomaly_saved[0]["model"]
+        _, anomaly_predictions = score_saved_model(anomaly_saved, anomaly_X, lambda: score_isolation_forest(anomaly_model, anomaly_X))
+    else:
+        anomaly_model, _, anomaly_predictions = fit_isolation_forest(anomaly_X, anomaly_contamination, random_state=42, max_fit_rows=anomaly_max_fit_rows)
+        save_model_button(
+            "anomaly", {"model": anomaly_model}, anomaly_features, anomaly_data_key, anomaly_params,
+            {"anomaly_rate": float((anomaly_predictions == -1).mean())},
+        )
+anomaly_data[f"{prefix}Anomaly"] = anomaly_predictions
+show_cache_stats()
 
 # Hiển thị kết quả
 anomaly_results = anomaly_data[anomaly_data[f"{prefix}Anomaly"] == -1]
-st.write("Các tháng bất thường:", anomaly_results) #[["Tháng"] + anomaly_features])
-
-# Trực quan hóa
-fig, ax = plt.subplots(figsize=(10, 6))
-ax.scatter(anomaly_data.index, anomaly_data[f"{prefix}Biến động dư nợ"], c=anomaly_data[f"{prefix}Anomaly"], cmap="coolwarm", s=100)
-ax.set_xticks(anomaly_data.index)
-ax.set_xticklabels(anomaly_data["Tháng"], rotation=45)
-ax.set_xlabel("Tháng")
-ax.set_ylabel("Biến động dư nợ (%)")
-ax.set_title("Phát hiện biến động bất thường")
-st.pyplot(fig)
+table_view("Các tháng bất thường:", anomaly_results, f"{prefix}results_table") #[["Tháng"] + anomaly_features])
+
+# Trực quan hóa (dữ liệu nhiều Quỹ: vẽ từng Quỹ được chọn)
+anomaly_plot_data = anomaly_data
+if anomaly_panel_mode:
+    anomaly_plot_fund = st.selectbox("Chọn Quỹ để hiển thị biểu đồ", anomaly_data[FUND_COLUMN].unique(), key=f"{prefix}plot_fund")
+    anomaly_plot_data = anomaly_data[anomaly_data[FUND_COLUMN] == anomaly_plot_fund]
+show_figure(
+    plots.timeline_scatter,
+    anomaly_plot_data[["Tháng", f"{prefix}Biến động dư nợ", f"{prefix}Anomaly"]],
+    y=f"{prefix}Biến động dư nợ",
+    flag_column=f"{prefix}Anomaly",
+    tick_column="Tháng",
+    title="Phát hiện biến động bất thường",
+    xlabel="Tháng",
+    ylabel="Biến động dư nợ (%)",
+)
+
+# Cập nhật tháng mới mà không xử lý lại toàn bộ lịch sử
+incremental_section(
+    "anomaly",
+    lambda refit_every: IncrementalAnomaly(contamination=anomaly_contamination, refit_every=refit_every),
+    anomaly_dataset.frame,
+    [FUND_COLUMN, "Tháng"] + anomaly_features + [f"{prefix}Anomaly_Score", f"{prefix}Anomaly"],
+    default_refit_every=12,
+)
 
 # Tải xuống kết quả
-csv = anomaly_data.to_csv(index=False)
-st.download_button(
-    label="Tải xuống kết quả",
-    data=csv,
-    file_name=f"{prefix}result.csv",
-    mime="text/csv",
-    key=f"{prefix}download"
-)
\ No newline at end of file
+download_section(anomaly_data, prefix)
+
+# Bảng thời gian và bộ nhớ từng bước
+show_metrics(anomaly_metrics, prefix)
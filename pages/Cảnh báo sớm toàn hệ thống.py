@@ -0,0 +1,145 @@
+import streamlit as st
+from finguard.dataset import resolve_dataset
+from finguard.early_warning import (
+    ALERTS,
+    ASSET_LOSS_THRESHOLD,
+    COMPOSITE,
+    INSOLVENCY_THRESHOLD,
+    RANK,
+    SIGNAL_COLUMNS,
+    SIGNALS,
+    SWEEP_SLA,
+    WEIGHTS,
+    EarlyWarning,
+    rank,
+    saved_artifacts,
+)
+from finguard.features import FUND_COLUMN
+from finguard.model_cache import show_cache_stats, sweep_early_warning
+from finguard.synthetic import generate_network
+from finguard.widgets import download_section, show_ingest_stats, show_metrics, start_metrics, store_slice, table_view
+
+st.set_page_config(page_title="Giám sát Quỹ Tín dụng Nhân dân", layout="wide")
+st.title("Cảnh báo sớm toàn hệ thống")
+
+# Tiền tố cho trang cảnh báo sớm
+prefix = "early_warning_"
+
+# Đo thời gian và bộ nhớ từng bước của lần chạy này
+early_warning_metrics = start_metrics(prefix)
+
+# Hàm tải dữ liệu mẫu: 30 Quỹ x 3 tháng có đủ cột của 4 bài toán
+def load_early_warning_sample_data():
+    return generate_network(30, 3)[0]
+
+# Cột của mọi tín hiệu (thiếu cột nào thì tín hiệu đó được bỏ qua) và nhãn để huấn luyện mô hình tín dụng
+early_warning_columns = list(dict.fromkeys(c for columns in SIGNAL_COLUMNS.values() for c in columns)) + ["Risk_Label"]
+
+# Tải dữ liệu
+st.header("Tải dữ liệu")
+early_warning_uploaded_file = st.file_uploader("Chọn file CSV hoặc Parquet dữ liệu toàn hệ thống", type=["csv", "parquet"], key=f"{prefix}upload")
+early_warning_store_query = store_slice(prefix, [FUND_COLUMN])
+early_warning_dataset = resolve_dataset(
+    early_warning_uploaded_file, [FUND_COLUMN], prefix, load_early_warning_sample_data,
+    optional_columns=early_warning_columns, store_query=early_warning_store_query,
+)
+if early_warning_dataset.source == "upload":
+    table_view("Dữ liệu đã tải lên:", early_warning_dataset.frame, f"{prefix}raw_table")
+    show_ingest_stats(early_warning_dataset)
+elif early_warning_dataset.source == "store":
+    table_view("Dữ liệu từ kho:", early_warning_dataset.frame, f"{prefix}raw_table")
+    show_ingest_stats(early_warning_dataset)
+else:
+    table_view("Dữ liệu mẫu:", early_warning_dataset.frame, f"{prefix}raw_table")
+
+st.subheader("Cách quét")
+st.write("""
+- Mỗi Quỹ được đánh giá trên tháng gần nhất; tháng trước đó chỉ dùng để tính biến động tiền mặt.
+- Các tỷ lệ (thanh khoản, nợ xấu, CAR, sai lệch tài sản...) được tính một lần và dùng chung cho cả 4 tín hiệu.
+- Mô hình được huấn luyện ở lần quét đầu trên mỗi bộ dữ liệu (hoặc lấy từ kho mô hình) rồi giữ nguyên; khi có dữ liệu mới chỉ các Quỹ có hai tháng cuối thay đổi được tính lại.
+- **Điểm rủi ro tổng hợp**: trung bình có trọng số của các tín hiệu, mỗi tín hiệu quy về khoảng 0-1 (điểm mất thanh khoản và dự đoán sai lệch theo thứ hạng trong toàn hệ thống, rủi ro tín dụng theo xác suất, tuân thủ theo số quy tắc vi phạm).
+""")
+
+# Tham số của mô hình: đổi tham số là bắt đầu một trạng thái quét mới
+early_warning_contamination = st.slider("Tỷ lệ bất thường (contamination) của mô hình mất thanh khoản", 0.05, 0.5, 0.1, key=f"{prefix}contamination")
+early_warning_car_col, early_warning_npl_col = st.columns(2)
+with early_warning_car_col:
+    early_warning_car = st.slider("Ngưỡng CAR tối thiểu (%)", 0.0, 20.0, 8.0, key=f"{prefix}car")
+with early_warning_npl_col:
+    early_warning_npl = st.slider("Ngưỡng nợ xấu tối đa (%)", 0.0, 10.0, 3.0, key=f"{prefix}npl")
+early_warning_use_saved = st.checkbox(
+    "Dùng mô hình mới nhất trong kho mô hình", key=f"{prefix}use_saved",
+    help="Chỉ dùng mô hình được lưu trên đúng các đặc trưng của trang tương ứng; tín hiệu chưa có mô hình sẽ được huấn luyện.",
+)
+
+
+# Một trạng thái quét cho mỗi bộ dữ liệu (file tải lên, bộ dữ liệu trong kho hoặc dữ liệu mẫu) và bộ tham số,
+# dùng chung giữa các phiên; lần quét sau chỉ tính lại Quỹ thay đổi. Mô hình huấn luyện trên một bộ dữ liệu
+# không bao giờ được dùng để chấm điểm bộ dữ liệu khác.
+@st.cache_resource(show_spinner=False)
+def get_early_warning(dataset_key, contamination, car_threshold, bad_debt_threshold, use_saved):
+    artifacts = saved_artifacts() if use_saved else None
+    return EarlyWarning(contamination, car_threshold, bad_debt_threshold, artifacts=artifacts)
+
+
+early_warning_params = {
+    "contamination": early_warning_contamination,
+    "car_threshold": early_warning_car,
+    "bad_debt_threshold": early_warning_npl,
+    "use_saved": early_warning_use_saved,
+}
+early_warning_state = get_early_warning(early_warning_dataset.key, **early_warning_params)
+early_warning_result = sweep_early_warning(
+    early_warning_state, early_warning_dataset.frame, {"dataset_key": early_warning_dataset.key, **early_warning_params}
+)
+show_cache_stats()
+
+early_warning_time_col, early_warning_funds_col = st.columns(2)
+early_warning_time_col.metric("Thời gian quét (giây)", f"{early_warning_result.seconds:.2f}", help=f"Giới hạn: {SWEEP_SLA:.0f} giây")
+early_warning_funds_col.metric("Quỹ được tính lại", f"{early_warning_result.changed} / {early_warning_result.funds}")
+if early_warning_result.seconds > SWEEP_SLA:
+    st.warning(f"Lần quét mất {early_warning_result.seconds:.1f} giây, vượt giới hạn {SWEEP_SLA:.0f} giây.")
+for early_warning_signal, early_warning_reason in early_warning_result.skipped.items():
+    st.info(f"Bỏ qua tín hiệu {SIGNALS[early_warning_signal]}: {early_warning_reason}")
+
+if early_warning_result.signals is None:
+    st.info("Dữ liệu không có Quỹ nào để quét.")
+    st.stop()
+
+# Trọng số và ngưỡng cờ chỉ xếp hạng lại, không cần quét lại
+st.subheader("Xếp hạng rủi ro")
+early_warning_weights = {}
+for early_warning_col, (early_warning_signal, early_warning_label) in zip(st.columns(len(SIGNALS)), SIGNALS.items()):
+    with early_warning_col:
+        early_warning_weights[early_warning_signal] = st.number_input(
+            f"Trọng số {early_warning_label.lower()}", 0.0, 1.0, WEIGHTS[early_warning_signal], step=0.05,
+            key=f"{prefix}weight_{early_warning_signal}",
+        )
+early_warning_insolvency_col, early_warning_asset_loss_col = st.columns(2)
+with early_warning_insolvency_col:
+    early_warning_insolvency_threshold = st.slider(
+        "Ngưỡng điểm mất thanh khoản", -0.5, 0.0, INSOLVENCY_THRESHOLD, key=f"{prefix}insolvency_threshold"
+    )
+with early_warning_asset_loss_col:
+    early_warning_asset_loss_threshold = st.slider(
+        "Ngưỡng dự đoán sai lệch tài sản", -20.0, 0.0, ASSET_LOSS_THRESHOLD, key=f"{prefix}asset_loss_threshold"
+    )
+early_warning_table = rank(
+    early_warning_result.signals, early_warning_weights, early_warning_insolvency_threshold, early_warning_asset_loss_threshold
+)
+
+early_warning_alerts = early_warning_table[ALERTS]
+st.metric("Số Quỹ có cảnh báo", f"{int((early_warning_alerts > 0).sum())} / {len(early_warning_table)}")
+st.bar_chart(early_warning_alerts.value_counts().sort_index().rename_axis(ALERTS).rename("Số Quỹ"), height=200)
+table_view("Bảng rủi ro toàn hệ thống (Quỹ rủi ro nhất trước):", early_warning_table, f"{prefix}rank_table")
+table_view(
+    "Các Quỹ có từ hai cảnh báo trở lên:",
+    early_warning_table[early_warning_alerts >= 2][[RANK, FUND_COLUMN, COMPOSITE, ALERTS]],
+    f"{prefix}alerts_table",
+)
+
+# Tải xuống kết quả
+download_section(early_warning_table, prefix)
+
+# Bảng thời gian và bộ nhớ từng bước
+show_metrics(early_warning_metrics, prefix)
@@ -1,9 +1,19 @@
 import streamlit as st
 import pandas as pd
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
-import matplotlib.pyplot as plt
-import seaborn as sns
+from finguard import plots
+from finguard.analyses import FIT_SAMPLE_ROWS, INSOLVENCY_COLUMNS, INSOLVENCY_FEATURES, score_isolation_forest
+from finguard.dataset import resolve_dataset
+from finguard.model_cache import (
+    fingerprint,
+    fit_isolation_forest,
+    fit_standard_scaler,
+    save_model_button,
+    score_index,
+    score_saved_model,
+    select_saved_model,
+    show_cache_stats,
+)
+from finguard.widgets import download_section, show_figure, show_ingest_stats, show_metrics, start_metrics, store_slice, table_view
 
 st.set_page_config(page_title="Giám sát Quỹ Tín dụng Nhân dân", layout="wide")
 st.title("Phát hiện mất khả năng thanh toán")
@@ -11,6 +21,9 @@ st.title("Phát hiện mất khả năng thanh toán")
 # Tiền tố cho bài toán 2
 prefix = "insolvency_"
 
+# Đo thời gian và bộ nhớ từng bước của lần chạy này
+insolvency_metrics = start_metrics(prefix)
+
 # Hàm tải dữ liệu mẫu
 def load_insolvency_sample_data():
     return pd.DataFrame({
@@ -24,13 +37,17 @@ def load_insolvency_sample_data():
 
 # Tải dữ liệu
 st.header("Tải dữ liệu")
-insolvency_uploaded_file = st.file_uploader("Chọn file CSV cho mất thanh khoản", type="csv", key=f"{prefix}upload")
-if insolvency_uploaded_file is not None:
-    insolvency_data = pd.read_csv(insolvency_uploaded_file)
-    st.write("Dữ liệu đã tải lên:", insolvency_data)
+insolvency_uploaded_file = st.file_uploader("Chọn file CSV hoặc Parquet cho mất thanh khoản", type=["csv", "parquet"], key=f"{prefix}upload")
+insolvency_store_query = store_slice(prefix, INSOLVENCY_COLUMNS)
+insolvency_dataset = resolve_dataset(insolvency_uploaded_file, INSOLVENCY_COLUMNS, prefix, load_insolvency_sample_data, store_query=insolvency_store_query)
+if insolvency_dataset.source == "upload":
+    table_view("Dữ liệu đã tải lên:", insolvency_dataset.frame, f"{prefix}raw_table")
+    show_ingest_stats(insolvency_dataset)
+elif insolvency_dataset.source == "store":
+    table_view("Dữ liệu từ kho:", insolvency_dataset.frame, f"{prefix}raw_table")
+    show_ingest_stats(insolvency_dataset)
 else:
-    insolvency_data = load_insolvency_sample_data()
-    st.write("Dữ liệu mẫu:", insolvency_data)
+    table_view("Dữ liệu mẫu:", insolvency_dataset.frame, f"{prefix}raw_table")
 
 # Tính toán đặc trưng
 st.subheader("Cách tính toán đặc trưng")
@@ -41,30 +58,46 @@ st.write("""
 - **Tỷ lệ nợ quá hạn (%)**: Nợ quá hạn / Nợ ngắn hạn * 100. Cho biết phần trăm nợ ngắn hạn không được trả đúng hạn.
 """)
 
-insolvency_data[f"{prefix}Tỷ lệ thanh khoản"] = insolvency_data["Tiền mặt"] / insolvency_data["Nợ ngắn hạn"] * 100
-insolvency_data[f"{prefix}Tỷ lệ nợ/vốn"] = insolvency_data["Nợ ngắn hạn"] / insolvency_data["Vốn chủ sở hữu"] * 100
-insolvency_data[f"{prefix}Tỷ lệ tài sản thanh khoản"] = insolvency_data["Tiền mặt"] / (insolvency_data["Tiền mặt"] + insolvency_data["Nợ ngắn hạn"]) * 100
-insolvency_data[f"{prefix}Tỷ lệ nợ quá hạn"] = insolvency_data["Nợ quá hạn"] / insolvency_data["Nợ ngắn hạn"] * 100
+insolvency_data = insolvency_dataset.with_features(prefix, INSOLVENCY_FEATURES)
 
-st.write("Dữ liệu sau khi tính toán đặc trưng:", insolvency_data)
+table_view("Dữ liệu sau khi tính toán đặc trưng:", insolvency_data, f"{prefix}features_table")
 
 # Chọn đặc trưng
 insolvency_features = [f"{prefix}Tỷ lệ thanh khoản", f"{prefix}Tỷ lệ nợ/vốn", f"{prefix}Tỷ lệ tài sản thanh khoản", "Dòng tiền ròng", f"{prefix}Tỷ lệ nợ quá hạn"]
 insolvency_X = insolvency_data[insolvency_features]
 
-# Chuẩn hóa dữ liệu
-insolvency_scaler = StandardScaler()
-insolvency_X_scaled = insolvency_scaler.fit_transform(insolvency_X)
-
-# Huấn luyện mô hình
 insolvency_contamination = st.slider("Tỷ lệ bất thường (contamination)", 0.05, 0.5, 0.2, key=f"{prefix}contamination")
-insolvency_model = IsolationForest(contamination=insolvency_contamination, random_state=42)
-insolvency_model.fit(insolvency_X_scaled)
-insolvency_data[f"{prefix}Anomaly_Score"] = insolvency_model.decision_function(insolvency_X_scaled)
+insolvency_max_fit_rows = st.number_input(
+    "Số dòng tối đa dùng để huấn luyện",
+    min_value=1_000, max_value=10_000_000, value=FIT_SAMPLE_ROWS, step=50_000,
+    help="Dữ liệu lớn hơn được huấn luyện trên một mẫu ngẫu nhiên cố định (random_state=42) rồi chấm điểm toàn bộ theo từng khối.",
+    key=f"{prefix}max_fit_rows",
+)
+insolvency_data_key = fingerprint(insolvency_X)
+insolvency_params = {"contamination": insolvency_contamination, "random_state": 42, "max_fit_rows": insolvency_max_fit_rows}
+insolvency_saved = select_saved_model("insolvency", insolvency_data_key, insolvency_params)
+if insolvency_saved is not None:
+    # Nạp scaler và mô hình đã lưu thay vì huấn luyện lại
+    insolvency_scaler, insolvency_model = insolvency_saved[0]["scaler"], insolvency_saved[0]["model"]
+    insolvency_scores, _ = score_saved_model(
+        insolvency_saved, insolvency_X, lambda: score_isolation_forest(insolvency_model, insolvency_scaler.transform(insolvency_X))
+    )
+else:
+    # Chuẩn hóa dữ liệu
+    insolvency_scaler, insolvency_X_scaled = fit_standard_scaler(insolvency_X)
+
+    # Huấn luyện mô hình
+    insolvency_model, insolvency_scores, _ = fit_isolation_forest(insolvency_X_scaled, insolvency_contamination, random_state=42, max_fit_rows=insolvency_max_fit_rows)
+    save_model_button(
+        "insolvency", {"scaler": insolvency_scaler, "model": insolvency_model}, insolvency_features, insolvency_data_key,
+        insolvency_params, {"anomaly_rate": float((insolvency_scores < 0).mean())},
+    )
+insolvency_data[f"{prefix}Anomaly_Score"] = insolvency_scores
+show_cache_stats()
 
 # In dữ liệu sau khi huấn luyện mô hình
 st.subheader("Dữ liệu sau khi huấn luyện mô hình")
-st.write("Dữ liệu bao gồm điểm bất thường (Anomaly Score) cho từng Quỹ:", insolvency_data[["Quỹ"] + insolvency_features + [f"{prefix}Anomaly_Score"]])
+table_view("Dữ liệu bao gồm điểm bất thường (Anomaly Score) cho từng Quỹ:", insolvency_data[["Quỹ"] + insolvency_features + [f"{prefix}Anomaly_Score"]], f"{prefix}scores_table")
 
 # Giải thích điểm ngưỡng bất thường trước khi chọn
 st.subheader("Điểm ngưỡng bất thường")
@@ -84,36 +117,40 @@ st.write("""
 """)
 
 # Chọn ngưỡng bất thường
-insolvency_threshold_score = st.slider("Chọn ngưỡng điểm bất thường", -0.5, 0.0, -0.1, key=f"{prefix}threshold")
-insolvency_data[f"{prefix}Risk"] = (insolvency_data[f"{prefix}Anomaly_Score"] < insolvency_threshold_score).astype(int)
-
-# Hiển thị kết quả
-insolvency_results = insolvency_data[insolvency_data[f"{prefix}Risk"] == 1]
-st.write("Các Quỹ có nguy cơ mất thanh khoản:", insolvency_results[["Quỹ"] + insolvency_features + [f"{prefix}Anomaly_Score"]])
+# Điểm được sắp xếp một lần; thanh trượt chỉ tìm kiếm nhị phân trên chỉ mục
+insolvency_index = score_index(insolvency_scores)
+insolvency_slider_col, insolvency_curve_col = st.columns(2)
+with insolvency_slider_col:
+    insolvency_threshold_score = st.slider("Chọn ngưỡng điểm bất thường", -0.5, 0.0, -0.1, key=f"{prefix}threshold")
+    st.metric("Số Quỹ bị gắn cờ", f"{insolvency_index.count_below(insolvency_threshold_score)} / {insolvency_index.size}")
+with insolvency_curve_col:
+    st.caption("Số Quỹ bị gắn cờ theo ngưỡng")
+    st.line_chart(insolvency_index.curve(-0.5, 0.0), height=200)
+insolvency_data[f"{prefix}Risk"] = insolvency_index.flags(insolvency_threshold_score)
+
+# Hiển thị kết quả (Quỹ bất thường nhất trước)
+insolvency_results = insolvency_data.iloc[insolvency_index.below(insolvency_threshold_score)]
+table_view("Các Quỹ có nguy cơ mất thanh khoản:", insolvency_results[["Quỹ"] + insolvency_features + [f"{prefix}Anomaly_Score"]], f"{prefix}results_table")
 
 # Trực quan hóa
-fig, ax = plt.subplots(figsize=(10, 6))
-sns.scatterplot(
+# Nhiều Quỹ: nền mật độ, chỉ tô các Quỹ bị gắn cờ và ghi tên các Quỹ có điểm thấp nhất
+show_figure(
+    plots.risk_scatter,
+    insolvency_data[["Quỹ", f"{prefix}Tỷ lệ thanh khoản", "Dòng tiền ròng", f"{prefix}Risk", f"{prefix}Anomaly_Score"]],
     x=f"{prefix}Tỷ lệ thanh khoản",
     y="Dòng tiền ròng",
     hue=f"{prefix}Risk",
     size=f"{prefix}Anomaly_Score",
-    sizes=(50, 200),
-    data=insolvency_data,
-    palette="coolwarm",
-    ax=ax
+    label="Quỹ",
+    flag_column=f"{prefix}Risk",
+    flag_value=1,
+    priority_column=f"{prefix}Anomaly_Score",
+    lowest_first=True,
+    title="Phát hiện nguy cơ mất thanh khoản",
 )
-for i, row in insolvency_data.iterrows():
-    ax.text(row[f"{prefix}Tỷ lệ thanh khoản"] + 0.5, row["Dòng tiền ròng"], row["Quỹ"], fontsize=9)
-ax.set_title("Phát hiện nguy cơ mất thanh khoản")
-st.pyplot(fig)
 
 # Tải xuống kết quả
-csv = insolvency_data.to_csv(index=False)
-st.download_button(
-    label="Tải xuống kết quả",
-    data=csv,
-    file_name=f"{prefix}result.csv",
-    mime="text/csv",
-    key=f"{prefix}download"
-)
\ No newline at end of file
+download_section(insolvency_data, prefix)
+
+# Bảng thời gian và bộ nhớ từng bước
+show_metrics(insolvency_metrics, prefix)
@@ -1,18 +1,31 @@
 import streamlit as st
 import pandas as pd
-from sklearn.linear_model import LogisticRegression
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
+import tempfile
+from pathlib import Path
+from finguard import plots
+from finguard.analyses import C_GRID, CREDIT_RISK_COLUMNS, CREDIT_RISK_FEATURES, CV_FOLDS, TUNING_BUDGET, score_credit_risk_chunks
+from finguard.dataset import resolve_dataset
+from finguard.metrics import stage
+from finguard.model_cache import (
+    fingerprint,
+    fit_logistic_regression,
+    fit_standard_scaler,
+    save_model_button,
+    select_saved_model,
+    show_cache_stats,
+    tune_logistic_regression,
+)
+from finguard.widgets import download_section, show_figure, show_ingest_stats, show_metrics, start_metrics, store_slice, table_view
 
 st.title("Đánh giá mức độ rủi ro tín dụng")
 
 # Tiền tố cho bài toán
 prefix = "credit_risk_"
 
+# Đo thời gian và bộ nhớ từng bước của lần chạy này
+credit_risk_metrics = start_metrics(prefix)
+
 # Hàm tải dữ liệu mẫu (điều chỉnh để phân bố đều hơn)
 def load_credit_risk_sample_data():
     return pd.DataFrame({
@@ -26,13 +39,17 @@ def load_credit_risk_sample_data():
 
 # Tải dữ liệu
 st.header("Tải dữ liệu")
-credit_risk_uploaded_file = st.file_uploader("Chọn file CSV cho đánh giá rủi ro tín dụng", type="csv", key=f"{prefix}upload")
-if credit_risk_uploaded_file is not None:
-    credit_risk_data = pd.read_csv(credit_risk_uploaded_file)
-    st.write("Dữ liệu đã tải lên:", credit_risk_data)
+credit_risk_uploaded_file = st.file_uploader("Chọn file CSV hoặc Parquet cho đánh giá rủi ro tín dụng", type=["csv", "parquet"], key=f"{prefix}upload")
+credit_risk_store_query = store_slice(prefix, CREDIT_RISK_COLUMNS)
+credit_risk_dataset = resolve_dataset(credit_risk_uploaded_file, CREDIT_RISK_COLUMNS, prefix, load_credit_risk_sample_data, store_query=credit_risk_store_query)
+if credit_risk_dataset.source == "upload":
+    table_view("Dữ liệu đã tải lên:", credit_risk_dataset.frame, f"{prefix}raw_table")
+    show_ingest_stats(credit_risk_dataset)
+elif credit_risk_dataset.source == "store":
+    table_view("Dữ liệu từ kho:", credit_risk_dataset.frame, f"{prefix}raw_table")
+    show_ingest_stats(credit_risk_dataset)
 else:
-    credit_risk_data = load_credit_risk_sample_data()
-    st.write("Dữ liệu mẫu:", credit_risk_data)
+    table_view("Dữ liệu mẫu:", credit_risk_dataset.frame, f"{prefix}raw_table")
 
 # Tính toán đặc trưng
 st.subheader("Cách tính toán đặc trưng")
@@ -41,48 +58,70 @@ st.write("""
 - **Tỷ lệ sử dụng vốn (%)**: Tổng dư nợ / Tổng tiền gửi * 100. Đo lường mức độ sử dụng vốn huy động để cho vay.
 """)
 
-credit_risk_data[f"{prefix}Tỷ lệ nợ xấu"] = credit_risk_data["Nợ xấu"] / credit_risk_data["Tổng dư nợ"] * 100
-credit_risk_data[f"{prefix}Tỷ lệ sử dụng vốn"] = credit_risk_data["Tổng dư nợ"] / credit_risk_data["Tổng tiền gửi"] * 100
+credit_risk_data = credit_risk_dataset.with_features(prefix, CREDIT_RISK_FEATURES)
 
-st.write("Dữ liệu sau khi tính toán đặc trưng:", credit_risk_data)
+table_view("Dữ liệu sau khi tính toán đặc trưng:", credit_risk_data, f"{prefix}features_table")
 
 # Chọn đặc trưng để huấn luyện
 features = [f"{prefix}Tỷ lệ nợ xấu", f"{prefix}Tỷ lệ sử dụng vốn"]
 X = credit_risk_data[features]
 y = credit_risk_data["Risk_Label"]
 
-# Chuẩn hóa dữ liệu
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
+credit_risk_C = st.select_slider(
+    "Hệ số điều chuẩn C (nhỏ hơn: điều chuẩn mạnh hơn)", options=list(C_GRID), value=1.0,
+    help="Có thể chọn theo kết quả kiểm định chéo ở phần Đánh giá mô hình.", key=f"{prefix}C",
+)
+credit_risk_data_key = fingerprint(X, y)
+credit_risk_params = {"multi_class": "multinomial", "max_iter": 1000, "C": credit_risk_C, "test_size": 0.3, "random_state": 42}
+credit_risk_saved = select_saved_model("credit_risk", credit_risk_data_key, credit_risk_params)
+
+# Chuẩn hóa dữ liệu (dùng scaler đã lưu nếu chọn mô hình trong kho)
+if credit_risk_saved is not None:
+    scaler = credit_risk_saved[0]["scaler"]
+    X_scaled = scaler.transform(X)
+else:
+    scaler, X_scaled = fit_standard_scaler(X)
+
+# Chia dữ liệu để huấn luyện và kiểm tra (sklearn chỉ được nạp từ đây, sau khi bảng dữ liệu đã hiển thị)
+from sklearn.model_selection import train_test_split
 
-# Chia dữ liệu để huấn luyện và kiểm tra
 X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.3, random_state=42)
 
 # Huấn luyện mô hình
-model = LogisticRegression(multi_class="multinomial", max_iter=1000)
-model.fit(X_train, y_train)
+if credit_risk_saved is not None:
+    model = credit_risk_saved[0]["model"]
+else:
+    model = fit_logistic_regression(X_train, y_train, multi_class="multinomial", max_iter=1000, C=credit_risk_C)
+    save_model_button(
+        "credit_risk", {"scaler": scaler, "model": model}, features, credit_risk_data_key, credit_risk_params,
+        {"test_accuracy": float(model.score(X_test, y_test))},
+    )
+show_cache_stats()
 
 # Dự đoán và đánh giá
-y_pred = model.predict(X_scaled)
+with stage("score", rows=len(X_scaled)):
+    y_pred = model.predict(X_scaled)
 credit_risk_data[f"{prefix}Risk_Prediction"] = y_pred
 credit_risk_data[f"{prefix}Risk_Level"] = credit_risk_data[f"{prefix}Risk_Prediction"].map({0: "Thấp", 1: "Trung bình", 2: "Cao"})
 
 # Hiển thị kết quả
 st.subheader("Kết quả đánh giá rủi ro tín dụng")
-st.write("Dữ liệu sau khi dự đoán:", credit_risk_data[["Quỹ"] + features + [f"{prefix}Risk_Level"]])
+table_view(
+    "Dữ liệu sau khi dự đoán (chọn mức rủi ro để xem từng nhóm Quỹ):",
+    credit_risk_data[["Quỹ"] + features + [f"{prefix}Risk_Level"]],
+    f"{prefix}predictions_table",
+    filter_column=f"{prefix}Risk_Level",
+)
 
 # Phân loại theo mức rủi ro
 st.subheader("Phân loại Quỹ theo mức rủi ro")
-low_risk = credit_risk_data[credit_risk_data[f"{prefix}Risk_Prediction"] == 0]
-medium_risk = credit_risk_data[credit_risk_data[f"{prefix}Risk_Prediction"] == 1]
-high_risk = credit_risk_data[credit_risk_data[f"{prefix}Risk_Prediction"] == 2]
-
-st.write("1. Quỹ có rủi ro thấp:", low_risk[["Quỹ"] + features + [f"{prefix}Risk_Level"]])
-st.write("2. Quỹ có rủi ro trung bình:", medium_risk[["Quỹ"] + features + [f"{prefix}Risk_Level"]])
-st.write("3. Quỹ có rủi ro cao:", high_risk[["Quỹ"] + features + [f"{prefix}Risk_Level"]])
+risk_counts = credit_risk_data[f"{prefix}Risk_Level"].value_counts().reindex(["Thấp", "Trung bình", "Cao"], fill_value=0)
+st.write("Số Quỹ theo mức rủi ro:", risk_counts.rename("Số Quỹ"))
 
 # Báo cáo đánh giá mô hình
 st.subheader("Đánh giá mô hình")
+from sklearn.metrics import classification_report
+
 try:
     report = classification_report(y_test, model.predict(X_test), labels=[0, 1, 2], target_names=["Thấp", "Trung bình", "Cao"])
     st.text("Báo cáo phân loại:\n" + report)
@@ -94,26 +133,57 @@ except ValueError as e:
         report = classification_report(y_test, model.predict(X_test), labels=unique_classes, target_names=[{0: "Thấp", 1: "Trung bình", 2: "Cao"}[i] for i in unique_classes])
         st.text("Báo cáo phân loại (chỉ với các lớp có dữ liệu):\n" + report)
 
+# Kiểm định chéo phân tầng trên lưới C: ổn định hơn một lần chia 70/30 khi có lớp ít mẫu
+if st.checkbox("Kiểm định chéo phân tầng trên lưới hệ số C", key=f"{prefix}cross_validation"):
+    credit_risk_cv_columns = st.columns(2)
+    credit_risk_n_splits = credit_risk_cv_columns[0].number_input("Số fold", 2, 10, CV_FOLDS, key=f"{prefix}cv_folds")
+    credit_risk_budget = credit_risk_cv_columns[1].number_input(
+        "Giới hạn thời gian (giây)", 1, 600, int(TUNING_BUDGET), key=f"{prefix}cv_budget",
+        help="Hết thời gian thì các fold dừng ở giá trị C đang có; C được thử từ nhỏ đến lớn.",
+    )
+    try:
+        credit_risk_cv = tune_logistic_regression(
+            X, y, C_GRID, int(credit_risk_n_splits), float(credit_risk_budget), multi_class="multinomial", max_iter=1000
+        )
+    except ValueError as e:
+        st.warning(f"Không thể kiểm định chéo: {e}")
+    else:
+        st.dataframe(
+            credit_risk_cv.table.rename(columns={
+                "folds": "Số fold",
+                "accuracy_mean": "Accuracy (TB)",
+                "accuracy_std": "Accuracy (độ lệch chuẩn)",
+                "f1_macro_mean": "F1 macro (TB)",
+                "f1_macro_std": "F1 macro (độ lệch chuẩn)",
+                "seconds": "Thời gian huấn luyện (s)",
+            }),
+            hide_index=True,
+            use_container_width=True,
+        )
+        st.write(f"C tốt nhất theo F1 macro trung bình qua {credit_risk_cv.n_splits} fold: **{credit_risk_cv.best_C}**")
+        if not credit_risk_cv.complete:
+            st.caption("Đã hết giới hạn thời gian trước khi thử hết lưới C; tăng giới hạn để thử các giá trị C lớn hơn.")
+
 # Trực quan hóa
 st.subheader("Biểu đồ đánh giá rủi ro tín dụng")
-fig, ax = plt.subplots(figsize=(10, 6))
-sns.scatterplot(
+# Nhiều Quỹ: nền mật độ, chỉ tô các Quỹ rủi ro cao và ghi tên các Quỹ có tỷ lệ nợ xấu lớn nhất
+show_figure(
+    plots.risk_scatter,
+    credit_risk_data[["Quỹ", f"{prefix}Tỷ lệ nợ xấu", f"{prefix}Tỷ lệ sử dụng vốn", f"{prefix}Risk_Level"]],
     x=f"{prefix}Tỷ lệ nợ xấu",
     y=f"{prefix}Tỷ lệ sử dụng vốn",
     hue=f"{prefix}Risk_Level",
-    data=credit_risk_data,
+    label="Quỹ",
+    flag_column=f"{prefix}Risk_Level",
+    flag_value="Cao",
+    priority_column=f"{prefix}Tỷ lệ nợ xấu",
     palette="deep",
-    s=100,
-    alpha=1.0,
-    ax=ax
+    title="Phân loại rủi ro tín dụng",
+    xlabel="Tỷ lệ nợ xấu (%)",
+    ylabel="Tỷ lệ sử dụng vốn (%)",
+    legend_title="Mức rủi ro",
+    label_offset=0.1,
 )
-for i, row in credit_risk_data.iterrows():
-    ax.text(row[f"{prefix}Tỷ lệ nợ xấu"] + 0.1, row[f"{prefix}Tỷ lệ sử dụng vốn"], row["Quỹ"], fontsize=9)
-ax.set_title("Phân loại rủi ro tín dụng")
-ax.set_xlabel("Tỷ lệ nợ xấu (%)")
-ax.set_ylabel("Tỷ lệ sử dụng vốn (%)")
-ax.legend(title="Mức rủi ro")
-st.pyplot(fig)
 
 # Phần nhập liệu để dự đoán
 st.subheader("Dự đoán rủi ro tín dụng cho Quỹ mới")
@@ -148,12 +218,57 @@ if submit_button:
     st.write("**Thông tin đầu vào:**")
     st.write(input_data[features])
 
+# Chấm điểm hàng loạt từ file CSV/Parquet bằng scaler và mô hình đã huấn luyện ở trên (không huấn luyện lại).
+# Kết quả được ghi dần ra file tạm trên đĩa; session_state chỉ giữ đường dẫn, số đếm và 100 dòng đầu.
+st.subheader("Chấm điểm hàng loạt từ file")
+st.write("File cần có các cột: Quỹ, Tổng dư nợ, Nợ xấu, Tổng tiền gửi. File lớn được đọc và chấm điểm theo từng khối; Quỹ thiếu số liệu hoặc có mẫu số bằng 0 không được chấm điểm.")
+batch_uploaded_file = st.file_uploader("Chọn file CSV hoặc Parquet các Quỹ cần chấm điểm", type=["csv", "parquet"], key=f"{prefix}batch_upload")
+if batch_uploaded_file is not None:
+    batch_key = (batch_uploaded_file.file_id, fingerprint(scaler.mean_, scaler.scale_, model.coef_, model.intercept_))
+    if st.session_state.get(f"{prefix}batch_key") != batch_key:
+        batch_previous = st.session_state.pop(f"{prefix}batch_result", None)
+        st.session_state.pop(f"{prefix}batch_key", None)
+        if batch_previous is not None:
+            Path(batch_previous[0]).unlink(missing_ok=True)
+        batch_counts = pd.Series(0, index=["Thấp", "Trung bình", "Cao"])
+        batch_preview = None
+        batch_rows = 0
+        batch_output = tempfile.NamedTemporaryFile("w", suffix=".csv", prefix="finguard_batch_", delete=False, encoding="utf-8")
+        try:
+            with batch_output, stage("batch_score"):
+                batch_chunks = score_credit_risk_chunks(batch_uploaded_file, scaler, model, name=batch_uploaded_file.name)
+                batch_progress = st.progress(0.0, text="Đang chấm điểm...")
+                for batch_chunk in batch_chunks:
+                    batch_chunk.to_csv(batch_output, index=False, header=batch_rows == 0)
+                    batch_counts = batch_counts.add(batch_chunk[f"{prefix}Risk_Level"].value_counts(), fill_value=0)
+                    if batch_preview is None:
+                        batch_preview = batch_chunk.head(100)
+                    batch_rows += len(batch_chunk)
+                    batch_progress.progress(min(batch_uploaded_file.tell() / max(batch_uploaded_file.size, 1), 1.0), text=f"Đã chấm điểm {batch_rows} Quỹ")
+                batch_progress.empty()
+        except ValueError as e:
+            Path(batch_output.name).unlink(missing_ok=True)
+            st.error(f"Không thể chấm điểm file {batch_uploaded_file.name}: {e}")
+        else:
+            st.session_state[f"{prefix}batch_key"] = batch_key
+            st.session_state[f"{prefix}batch_result"] = (batch_output.name, batch_counts.astype(int), batch_preview, batch_rows)
+    if f"{prefix}batch_result" in st.session_state:
+        batch_path, batch_counts, batch_preview, batch_rows = st.session_state[f"{prefix}batch_result"]
+        st.write(f"Đã chấm điểm {int(batch_counts.sum())} / {batch_rows} Quỹ. Số Quỹ theo mức rủi ro:", batch_counts.rename("Số Quỹ"))
+        if batch_rows > batch_counts.sum():
+            st.info(f"{batch_rows - int(batch_counts.sum())} Quỹ không được chấm điểm (thiếu số liệu hoặc mẫu số bằng 0); mức rủi ro để trống trong file kết quả.")
+        st.write("100 dòng đầu của kết quả:", batch_preview)
+        with open(batch_path, "rb") as batch_file:
+            st.download_button(
+                label="Tải xuống kết quả chấm điểm",
+                data=batch_file,
+                file_name=f"{prefix}batch_result.csv",
+                mime="text/csv",
+                key=f"{prefix}batch_download"
+            )
+
 # Tải xuống kết quả
-csv = credit_risk_data.to_csv(index=False)
-st.download_button(
-    label="Tải xuống kết quả",
-    data=csv,
-    file_name=f"{prefix}result.csv",
-    mime="text/csv",
-    key=f"{prefix}download"
-)
\ No newline at end of file
+download_section(credit_risk_data, prefix)
+
+# Bảng thời gian và bộ nhớ từng bước
+show_metrics(credit_risk_metrics, prefix)
@@ -1,8 +1,21 @@
 import streamlit as st
 import pandas as pd
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import mean_squared_error
-import matplotlib.pyplot as plt
+from finguard import plots
+from finguard.analyses import ASSET_LOSS_COLUMNS, ASSET_LOSS_FEATURES, ROLLING_WINDOW, asset_loss_rolling_features
+from finguard.dataset import resolve_dataset
+from finguard.features import FUND_COLUMN
+from finguard.incremental import IncrementalAssetLoss
+from finguard.model_cache import (
+    fingerprint,
+    fit_linear_regression,
+    fit_linear_regression_per_fund,
+    save_model_button,
+    score_index,
+    score_saved_model,
+    select_saved_model,
+    show_cache_stats,
+)
+from finguard.widgets import download_section, incremental_section, show_figure, show_ingest_stats, show_metrics, start_metrics, store_slice, table_view
 
 st.set_page_config(page_title="Giám sát Quỹ Tín dụng Nhân dân", layout="wide")
 st.title("Phát hiện thất thoát tài sản")
@@ -10,6 +23,9 @@ st.title("Phát hiện thất thoát tài sản")
 # Tiền tố cho bài toán 3
 prefix = "asset_loss_"
 
+# Đo thời gian và bộ nhớ từng bước của lần chạy này
+asset_loss_metrics = start_metrics(prefix)
+
 # Hàm tải dữ liệu mẫu
 def load_asset_loss_sample_data():
     return pd.DataFrame({
@@ -23,37 +39,73 @@ def load_asset_loss_sample_data():
 
 # Tải dữ liệu
 st.header("Tải dữ liệu")
-asset_loss_uploaded_file = st.file_uploader("Chọn file CSV cho thất thoát tài sản", type="csv", key=f"{prefix}upload")
-if asset_loss_uploaded_file is not None:
-    asset_loss_data = pd.read_csv(asset_loss_uploaded_file)
-    st.write("Dữ liệu đã tải lên:", asset_loss_data)
+asset_loss_uploaded_file = st.file_uploader("Chọn file CSV hoặc Parquet cho thất thoát tài sản", type=["csv", "parquet"], key=f"{prefix}upload")
+asset_loss_store_query = store_slice(prefix, ASSET_LOSS_COLUMNS)
+asset_loss_dataset = resolve_dataset(asset_loss_uploaded_file, ASSET_LOSS_COLUMNS, prefix, load_asset_loss_sample_data, store_query=asset_loss_store_query)
+if asset_loss_dataset.source == "upload":
+    table_view("Dữ liệu đã tải lên:", asset_loss_dataset.frame, f"{prefix}raw_table")
+    show_ingest_stats(asset_loss_dataset)
+elif asset_loss_dataset.source == "store":
+    table_view("Dữ liệu từ kho:", asset_loss_dataset.frame, f"{prefix}raw_table")
+    show_ingest_stats(asset_loss_dataset)
 else:
-    asset_loss_data = load_asset_loss_sample_data()
-    st.write("Dữ liệu mẫu:", asset_loss_data)
+    table_view("Dữ liệu mẫu:", asset_loss_dataset.frame, f"{prefix}raw_table")
 
 # Tính toán đặc trưng
 st.subheader("Cách tính toán đặc trưng")
 st.write("""
 - **Sai lệch tài sản (%)**: (Tài sản thực tế - Tài sản sổ sách) / Tài sản sổ sách * 100. Đo lường mức độ mất mát tài sản so với sổ sách.
 - **Biến động tiền mặt (%)**: (Tài sản thực tế tháng này - Tài sản thực tế tháng trước) / Tài sản thực tế tháng trước * 100. Đo lường thay đổi tài sản thực tế qua các tháng.
+- **Độ biến động tài sản thực tế (%)** (tùy chọn): Độ lệch chuẩn của biến động tiền mặt trong N tháng gần nhất của từng Quỹ. Ít nhiễu hơn biến động một tháng trên dữ liệu nhiều năm.
 """)
 
-asset_loss_data[f"{prefix}Sai lệch tài sản"] = (asset_loss_data["Tài sản thực tế"] - asset_loss_data["Tài sản sổ sách"]) / asset_loss_data["Tài sản sổ sách"] * 100
-asset_loss_data[f"{prefix}Biến động tiền mặt"] = asset_loss_data["Tài sản thực tế"].pct_change() * 100
+# Đặc trưng cửa sổ trượt: mỗi độ dài cửa sổ chỉ tính một lần trên dữ liệu đã tải
+asset_loss_window_features = []
+if st.checkbox("Thêm độ biến động tài sản thực tế theo cửa sổ trượt", key=f"{prefix}rolling"):
+    asset_loss_volatility_window = st.number_input(
+        "Cửa sổ độ biến động (tháng)", min_value=2, max_value=120, value=ROLLING_WINDOW, key=f"{prefix}volatility_window"
+    )
+    asset_loss_window_features = asset_loss_rolling_features(int(asset_loss_volatility_window))
+
+asset_loss_data = asset_loss_dataset.with_features(prefix, ASSET_LOSS_FEATURES + asset_loss_window_features)
 asset_loss_data = asset_loss_data.dropna()
 
-st.write("Dữ liệu sau khi tính toán đặc trưng:", asset_loss_data)
+table_view("Dữ liệu sau khi tính toán đặc trưng:", asset_loss_data, f"{prefix}features_table")
 
 # Chọn đặc trưng
 asset_loss_features = ["Chi phí quản lý", "Giao dịch bên liên quan", "Tỷ lệ nợ khó đòi", f"{prefix}Biến động tiền mặt"]
+asset_loss_features += [f"{prefix}{feature.name}" for feature in asset_loss_window_features]
 asset_loss_X = asset_loss_data[asset_loss_features]
 asset_loss_y = asset_loss_data[f"{prefix}Sai lệch tài sản"]
 
-# Huấn luyện mô hình
-asset_loss_model = LinearRegression()
-asset_loss_model.fit(asset_loss_X, asset_loss_y)
-asset_loss_data[f"{prefix}Dự đoán sai lệch"] = asset_loss_model.predict(asset_loss_X)
-asset_loss_mse = mean_squared_error(asset_loss_y, asset_loss_data[f"{prefix}Dự đoán sai lệch"])
+# Huấn luyện mô hình (dữ liệu nhiều Quỹ: có thể hồi quy riêng từng Quỹ, giải theo lô)
+asset_loss_model_mode = "Một mô hình chung"
+if FUND_COLUMN in asset_loss_data.columns:
+    asset_loss_model_mode = st.radio(
+        "Cách huấn luyện mô hình",
+        ["Một mô hình chung", "Riêng từng Quỹ"],
+        horizontal=True,
+        help="Riêng từng Quỹ: mỗi Quỹ một hồi quy tuyến tính, tất cả được giải cùng lúc trong một lần tính toán.",
+        key=f"{prefix}model_mode",
+    )
+asset_loss_per_fund = None
+asset_loss_saved = None
+if asset_loss_model_mode == "Riêng từng Quỹ":
+    asset_loss_per_fund = fit_linear_regression_per_fund(asset_loss_X, asset_loss_y, asset_loss_data[FUND_COLUMN])
+    asset_loss_predictions = asset_loss_per_fund.predictions
+else:
+    asset_loss_data_key = fingerprint(asset_loss_X, asset_loss_y)
+    asset_loss_saved = select_saved_model("asset_loss", asset_loss_data_key, {}, asset_loss_features)
+    if asset_loss_saved is not None:
+        asset_loss_model = asset_loss_saved[0]["model"]
+        asset_loss_predictions = score_saved_model(asset_loss_saved, asset_loss_X, lambda: asset_loss_model.predict(asset_loss_X))
+    else:
+        asset_loss_model, asset_loss_predictions = fit_linear_regression(asset_loss_X, asset_loss_y)
+asset_loss_data[f"{prefix}Dự đoán sai lệch"] = asset_loss_predictions
+show_cache_stats()
+asset_loss_mse = float(((asset_loss_y - asset_loss_data[f"{prefix}Dự đoán sai lệch"]) ** 2).mean())
+if asset_loss_model_mode == "Một mô hình chung" and asset_loss_saved is None:
+    save_model_button("asset_loss", {"model": asset_loss_model}, asset_loss_features, asset_loss_data_key, {}, {"mse": asset_loss_mse})
 
 # Thêm phần giải thích ngưỡng thất thoát trước khi chọn
 st.subheader("Ngưỡng thất thoát")
@@ -66,31 +118,48 @@ st.write("""
 """)
 
 # Ngưỡng thất thoát
-asset_loss_threshold = st.slider("Ngưỡng thất thoát (%)", -10.0, 0.0, -5.0, key=f"{prefix}threshold")
-asset_loss_results = asset_loss_data[asset_loss_data[f"{prefix}Dự đoán sai lệch"] < asset_loss_threshold]
+# Dự đoán được sắp xếp một lần; thanh trượt chỉ tìm kiếm nhị phân trên chỉ mục
+asset_loss_index = score_index(asset_loss_predictions)
+asset_loss_slider_col, asset_loss_curve_col = st.columns(2)
+with asset_loss_slider_col:
+    asset_loss_threshold = st.slider("Ngưỡng thất thoát (%)", -10.0, 0.0, -5.0, key=f"{prefix}threshold")
+    st.metric("Số tháng bị gắn cờ", f"{asset_loss_index.count_below(asset_loss_threshold)} / {asset_loss_index.size}")
+with asset_loss_curve_col:
+    st.caption("Số tháng bị gắn cờ theo ngưỡng")
+    st.line_chart(asset_loss_index.curve(-10.0, 0.0), height=200)
+asset_loss_results = asset_loss_data.iloc[asset_loss_index.below(asset_loss_threshold)]
 
 # Hiển thị kết quả
 st.write(f"Mean Squared Error: {asset_loss_mse:.2f}")
-st.write("Các tháng có nguy cơ thất thoát:", asset_loss_results[["Tháng"] + asset_loss_features + [f"{prefix}Sai lệch tài sản", f"{prefix}Dự đoán sai lệch"]])
-
-# Trực quan hóa
-fig, ax = plt.subplots(figsize=(10, 6))
-ax.plot(asset_loss_data["Tháng"], asset_loss_data[f"{prefix}Sai lệch tài sản"], "b-o", label="Thực tế")
-ax.plot(asset_loss_data["Tháng"], asset_loss_data[f"{prefix}Dự đoán sai lệch"], "g--o", label="Dự đoán")
-ax.axhline(y=asset_loss_threshold, color="r", linestyle="--", label=f"Ngưỡng ({asset_loss_threshold}%)")
-ax.legend()
-ax.set_title("Phát hiện thất thoát tài sản")
-ax.set_xlabel("Tháng")
-ax.set_ylabel("Sai lệch tài sản (%)")
-plt.xticks(rotation=45)
-st.pyplot(fig)
+if asset_loss_per_fund is not None:
+    table_view("Hệ số hồi quy và MSE của từng Quỹ:", pd.DataFrame(
+        asset_loss_per_fund.coef, columns=["Hệ số chặn"] + asset_loss_features, index=pd.Index(asset_loss_per_fund.funds, name=FUND_COLUMN)
+    ).assign(MSE=asset_loss_per_fund.mse).reset_index(), f"{prefix}coef_table")
+table_view("Các tháng có nguy cơ thất thoát:", asset_loss_results[["Tháng"] + asset_loss_features + [f"{prefix}Sai lệch tài sản", f"{prefix}Dự đoán sai lệch"]], f"{prefix}results_table")
 
+# Trực quan hóa (nhiều Quỹ: trung bình theo tháng kèm dải phân vị)
+show_figure(
+    plots.actual_vs_predicted,
+    asset_loss_data[["Tháng", f"{prefix}Sai lệch tài sản", f"{prefix}Dự đoán sai lệch"]],
+    x="Tháng",
+    actual=f"{prefix}Sai lệch tài sản",
+    predicted=f"{prefix}Dự đoán sai lệch",
+    threshold=asset_loss_threshold,
+    title="Phát hiện thất thoát tài sản",
+    xlabel="Tháng",
+    ylabel="Sai lệch tài sản (%)",
+)
+
+# Cập nhật tháng mới mà không xử lý lại toàn bộ lịch sử
+incremental_section(
+    "asset_loss",
+    lambda refit_every: IncrementalAssetLoss(refit_every=refit_every),
+    asset_loss_dataset.frame,
+    [FUND_COLUMN, "Tháng"] + asset_loss_features + [f"{prefix}Sai lệch tài sản", f"{prefix}Dự đoán sai lệch"],
+    default_refit_every=1,
+)
 # Tải xuống kết quả
-csv = asset_loss_data.to_csv(index=False)
-st.download_button(
-    label="Tải xuống kết quả",
-    data=csv,
-    file_name=f"{prefix}result.csv",
-    mime="text/csv",
-    key=f"{prefix}download"
-)
\ No newline at end of file
+download_section(asset_loss_data, prefix)
+
+# Bảng thời gian và bộ nhớ từng bước
+show_metrics(asset_loss_metrics, prefix)
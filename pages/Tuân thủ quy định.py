@@ -1,7 +1,11 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+from finguard import plots
+from finguard.analyses import COMPLIANCE_COLUMNS, COMPLIANCE_FEATURES, apply_compliance_rules
+from finguard.dataset import resolve_dataset
+from finguard.metrics import stage
+from finguard.rules import DEFAULT_RULES, rule_columns, rules_to_frame, with_thresholds
+from finguard.widgets import download_section, show_figure, show_ingest_stats, show_metrics, start_metrics, store_slice, table_view
 
 st.set_page_config(page_title="Giám sát Quỹ Tín dụng Nhân dân", layout="wide")
 st.title("Kiểm tra tuân thủ an toàn vốn và nợ xấu")
@@ -9,6 +13,9 @@ st.title("Kiểm tra tuân thủ an toàn vốn và nợ xấu")
 # Tiền tố cho bài toán
 prefix = "compliance_"
 
+# Đo thời gian và bộ nhớ từng bước của lần chạy này
+compliance_metrics = start_metrics(prefix)
+
 # Hàm tải dữ liệu mẫu
 def load_compliance_sample_data():
     return pd.DataFrame({
@@ -22,13 +29,17 @@ def load_compliance_sample_data():
 
 # Tải dữ liệu
 st.header("Tải dữ liệu")
-compliance_uploaded_file = st.file_uploader("Chọn file CSV cho kiểm tra tuân thủ", type="csv", key=f"{prefix}upload")
-if compliance_uploaded_file is not None:
-    compliance_data = pd.read_csv(compliance_uploaded_file)
-    st.write("Dữ liệu đã tải lên:", compliance_data)
+compliance_uploaded_file = st.file_uploader("Chọn file CSV hoặc Parquet cho kiểm tra tuân thủ", type=["csv", "parquet"], key=f"{prefix}upload")
+compliance_store_query = store_slice(prefix, COMPLIANCE_COLUMNS)
+compliance_dataset = resolve_dataset(compliance_uploaded_file, COMPLIANCE_COLUMNS, prefix, load_compliance_sample_data, rule_columns(DEFAULT_RULES), store_query=compliance_store_query)
+if compliance_dataset.source == "upload":
+    table_view("Dữ liệu đã tải lên:", compliance_dataset.frame, f"{prefix}raw_table")
+    show_ingest_stats(compliance_dataset)
+elif compliance_dataset.source == "store":
+    table_view("Dữ liệu từ kho:", compliance_dataset.frame, f"{prefix}raw_table")
+    show_ingest_stats(compliance_dataset)
 else:
-    compliance_data = load_compliance_sample_data()
-    st.write("Dữ liệu mẫu:", compliance_data)
+    table_view("Dữ liệu mẫu:", compliance_dataset.frame, f"{prefix}raw_table")
 
 # Tính toán đặc trưng
 st.subheader("Cách tính toán đặc trưng")
@@ -37,10 +48,9 @@ st.write("""
 - **Tỷ lệ nợ xấu (%)**: Nợ xấu / Tổng dư nợ * 100. Đo lường mức độ rủi ro từ các khoản vay không thu hồi được.
 """)
 
-compliance_data[f"{prefix}CAR"] = compliance_data["Vốn chủ sở hữu"] / compliance_data["Tài sản có rủi ro"] * 100
-compliance_data[f"{prefix}Tỷ lệ nợ xấu"] = compliance_data["Nợ xấu"] / compliance_data["Tổng dư nợ"] * 100
+compliance_data = compliance_dataset.with_features(prefix, COMPLIANCE_FEATURES)
 
-st.write("Dữ liệu sau khi tính toán đặc trưng:", compliance_data)
+table_view("Dữ liệu sau khi tính toán đặc trưng:", compliance_data, f"{prefix}features_table")
 
 # Định nghĩa ngưỡng tuân thủ
 st.subheader("Ngưỡng tuân thủ")
@@ -52,66 +62,67 @@ st.write("""
 car_threshold = st.slider("Ngưỡng tỷ lệ an toàn vốn tối thiểu (%)", 5.0, 15.0, 8.0, key=f"{prefix}car_threshold")
 bad_debt_threshold = st.slider("Ngưỡng tỷ lệ nợ xấu tối đa (%)", 1.0, 10.0, 3.0, key=f"{prefix}bad_debt_threshold")
 
-# Kiểm tra tuân thủ
-compliance_data[f"{prefix}CAR_Compliance"] = compliance_data[f"{prefix}CAR"] >= car_threshold
-compliance_data[f"{prefix}Bad_Debt_Compliance"] = compliance_data[f"{prefix}Tỷ lệ nợ xấu"] <= bad_debt_threshold
-compliance_data[f"{prefix}Overall_Compliance"] = compliance_data[f"{prefix}CAR_Compliance"] & compliance_data[f"{prefix}Bad_Debt_Compliance"]
+# Các tỷ lệ an toàn khác: chỉ đánh giá những quy tắc mà dữ liệu có đủ cột
+with st.expander("Các tỷ lệ an toàn khác"):
+    st.write("Quy tắc được khai báo dạng bảng; có thể sửa ngưỡng trực tiếp. Quy tắc thiếu cột dữ liệu sẽ được bỏ qua.")
+    compliance_other_rules = [rule for rule in DEFAULT_RULES if rule.code not in ("CAR", "NPL")]
+    compliance_rules_table = st.data_editor(
+        rules_to_frame(compliance_other_rules),
+        disabled=["Mã", "Quy tắc", "Điều kiện"],
+        hide_index=True,
+        key=f"{prefix}rules",
+    )
+compliance_thresholds = dict(zip(compliance_rules_table["Mã"], compliance_rules_table["Ngưỡng (%)"]))
+compliance_thresholds.update({"CAR": car_threshold, "NPL": bad_debt_threshold})
+compliance_rule_set = with_thresholds(DEFAULT_RULES, compliance_thresholds)
+
+# Kiểm tra tuân thủ: toàn bộ quy tắc được đánh giá trong một lượt vector hóa
+with stage("rules", rows=len(compliance_data)):
+    compliance_data, compliance_rule_result = apply_compliance_rules(compliance_data, compliance_rule_set, prefix)
 
 # Hiển thị kết quả
 st.subheader("Kết quả kiểm tra tuân thủ")
-st.write("Dữ liệu sau khi kiểm tra tuân thủ:", compliance_data[["Quỹ", f"{prefix}CAR", f"{prefix}Tỷ lệ nợ xấu", f"{prefix}CAR_Compliance", f"{prefix}Bad_Debt_Compliance", f"{prefix}Overall_Compliance"]])
+table_view("Dữ liệu sau khi kiểm tra tuân thủ:", compliance_data[["Quỹ", f"{prefix}CAR", f"{prefix}Tỷ lệ nợ xấu", f"{prefix}CAR_Compliance", f"{prefix}Bad_Debt_Compliance", f"{prefix}Overall_Compliance"]], f"{prefix}checked_table")
+
+st.write("Số vi phạm theo quy tắc (cột Violations là mặt nạ bit, bit i ứng với quy tắc i):", compliance_rule_result.counts)
+if compliance_rule_result.skipped:
+    st.caption("Bỏ qua do thiếu cột dữ liệu: " + ", ".join(rule.name for rule in compliance_rule_result.skipped))
 
 # Các Quỹ vi phạm
 non_compliant = compliance_data[compliance_data[f"{prefix}Overall_Compliance"] == False]
-st.write("Các Quỹ không tuân thủ:", non_compliant[["Quỹ", f"{prefix}CAR", f"{prefix}Tỷ lệ nợ xấu"]])
+table_view("Các Quỹ không tuân thủ:", non_compliant[["Quỹ", f"{prefix}CAR", f"{prefix}Tỷ lệ nợ xấu", f"{prefix}Violations"]], f"{prefix}violations_table")
 
 # Trực quan hóa
 st.subheader("Biểu đồ kiểm tra tuân thủ")
 
-# Biểu đồ CAR
-fig1, ax1 = plt.subplots(figsize=(10, 5))
-sns.scatterplot(
-    x="Quỹ", 
-    y=f"{prefix}CAR", 
-    hue=f"{prefix}CAR_Compliance", 
-    data=compliance_data, 
-    ax=ax1, 
-    palette="coolwarm", 
-    s=100,  # Tăng kích thước điểm
-    alpha=1.0  # Độ đậm tối đa (không trong suốt)
+# Biểu đồ CAR (nhiều Quỹ: phân phối CAR thay vì một cột mỗi Quỹ)
+show_figure(
+    plots.threshold_chart,
+    compliance_data[["Quỹ", f"{prefix}CAR", f"{prefix}CAR_Compliance"]],
+    x="Quỹ",
+    y=f"{prefix}CAR",
+    hue=f"{prefix}CAR_Compliance",
+    threshold=car_threshold,
+    threshold_label=f"Ngưỡng CAR ({car_threshold}%)",
+    title="Tỷ lệ an toàn vốn (CAR)",
+    ylabel="CAR (%)",
 )
-ax1.axhline(y=car_threshold, color="r", linestyle="--", label=f"Ngưỡng CAR ({car_threshold}%)")
-ax1.set_title("Tỷ lệ an toàn vốn (CAR)")
-ax1.set_ylabel("CAR (%)")
-ax1.set_xticklabels(compliance_data["Quỹ"], rotation=45)
-ax1.legend()
-st.pyplot(fig1)
 
 # Biểu đồ tỷ lệ nợ xấu
-fig2, ax2 = plt.subplots(figsize=(10, 5))
-sns.scatterplot(
-    x="Quỹ", 
-    y=f"{prefix}Tỷ lệ nợ xấu", 
-    hue=f"{prefix}Bad_Debt_Compliance", 
-    data=compliance_data, 
-    ax=ax2, 
-    palette="coolwarm", 
-    s=100,  # Tăng kích thước điểm
-    alpha=1.0  # Độ đậm tối đa (không trong suốt)
+show_figure(
+    plots.threshold_chart,
+    compliance_data[["Quỹ", f"{prefix}Tỷ lệ nợ xấu", f"{prefix}Bad_Debt_Compliance"]],
+    x="Quỹ",
+    y=f"{prefix}Tỷ lệ nợ xấu",
+    hue=f"{prefix}Bad_Debt_Compliance",
+    threshold=bad_debt_threshold,
+    threshold_label=f"Ngưỡng nợ xấu ({bad_debt_threshold}%)",
+    title="Tỷ lệ nợ xấu",
+    ylabel="Tỷ lệ nợ xấu (%)",
 )
-ax2.axhline(y=bad_debt_threshold, color="r", linestyle="--", label=f"Ngưỡng nợ xấu ({bad_debt_threshold}%)")
-ax2.set_title("Tỷ lệ nợ xấu")
-ax2.set_ylabel("Tỷ lệ nợ xấu (%)")
-ax2.set_xticklabels(compliance_data["Quỹ"], rotation=45)
-ax2.legend()
-st.pyplot(fig2)
 
 # Tải xuống kết quả
-csv = compliance_data.to_csv(index=False)
-st.download_button(
-    label="Tải xuống kết quả",
-    data=csv,
-    file_name=f"{prefix}result.csv",
-    mime="text/csv",
-    key=f"{prefix}download"
-)
+download_section(compliance_data, prefix)
+
+# Bảng thời gian và bộ nhớ từng bước
+show_metrics(compliance_metrics, prefix)